@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from config import DASHBOARD_RECONCILE_INTERVAL, SUBSCRIPTION_PRICE
+
+logger = logging.getLogger(__name__)
+
+# Сколько дней хранить в счетчике предсказаний по дням
+DAYS_KEPT = 7
+
+# События, которые нельзя точно применить без прежнего состояния записи:
+# после них снимок сверяется с базой вне очереди
+RECONCILE_EVENTS = ('ticket_status_changed', 'promo_deactivated')
+
+
+class AdminDashboard:
+    """Снимок статистики админ-панели в памяти.
+
+    Полный снимок берется из rpc/admin_stats при запуске и затем каждые
+    reconcile_interval секунд. Между сверками счетчики обновляются по событиям
+    записи AsyncDatabaseManager, поэтому админ-панель не ходит в базу. Сверка
+    исправляет то, чего события не видят: истекшие подписки и записи, сделанные
+    в обход бота. Расхождение последней сверки сохраняется в drift.
+    """
+
+    def __init__(self, database, reconcile_interval: float = DASHBOARD_RECONCILE_INTERVAL, clock=time.time):
+        self.database = database
+        self.reconcile_interval = reconcile_interval
+        self._clock = clock
+
+        self.stats = None
+        self.reconciled_at = None
+        self.events_applied = 0
+        self.drift = 0
+
+        self._task = None
+        self._wakeup = None
+
+        database.add_listener(self.on_event)
+
+    async def start(self):
+        """Загружает первый снимок и запускает периодическую сверку"""
+        if self._task is not None:
+            return
+
+        self._wakeup = asyncio.Event()
+        await self.reconcile()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.reconcile_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.reconcile()
+
+    async def reconcile(self) -> bool:
+        """Заменяет снимок свежими агрегатами из базы"""
+        fresh = await self.database.get_admin_stats()
+        if fresh is None:
+            logger.warning("⚠️ Не удалось сверить статистику админ-панели, остается прежний снимок")
+            return False
+
+        if self.stats is not None:
+            self.drift = sum(
+                abs((fresh[field] or 0) - (self.stats[field] or 0))
+                for field in fresh if field != 'predictions_by_day'
+            )
+            if self.drift:
+                logger.info(f"🔄 Сверка статистики: расхождение {self.drift}")
+
+        self.stats = fresh
+        self.reconciled_at = self._clock()
+        return True
+
+    def on_event(self, event: str, **data):
+        """Применяет событие записи к снимку"""
+        stats = self.stats
+        if stats is None:
+            return
+
+        if event == 'user_created':
+            stats['total_users'] += 1
+        elif event == 'prediction_saved':
+            stats['total_predictions'] += 1
+            stats['predictions_sum'] += 1
+            today = datetime.utcnow().date().isoformat()
+            stats['predictions_by_day'][today] = stats['predictions_by_day'].get(today, 0) + 1
+        elif event == 'subscription_activated':
+            if not data.get('was_premium'):
+                stats['premium_users'] += 1
+            if not data.get('was_active'):
+                stats['active_subscriptions'] += 1
+        elif event == 'payment_created':
+            stats['total_income'] += data.get('amount', 0)
+        elif event == 'ticket_created':
+            stats['open_tickets'] += 1
+        elif event == 'promo_created':
+            stats['promo_total'] += data.get('count', 1)
+            stats['promo_active'] += data.get('count', 1)
+        elif event == 'promo_used':
+            stats['promo_uses'] += 1
+            if data.get('first_use'):
+                stats['promo_used'] += 1
+            if data.get('deactivated'):
+                stats['promo_active'] -= 1
+        elif event in RECONCILE_EVENTS:
+            if self._wakeup is not None:
+                self._wakeup.set()
+        else:
+            return
+
+        self.events_applied += 1
+
+    def snapshot(self) -> dict:
+        """Копия снимка с производными показателями, без обращения к базе"""
+        if self.stats is None:
+            return None
+
+        stats = dict(self.stats)
+        total_users = stats['total_users']
+
+        stats['mrr'] = stats['active_subscriptions'] * SUBSCRIPTION_PRICE
+        stats['conversion'] = stats['premium_users'] / total_users * 100 if total_users else 0.0
+
+        today = datetime.utcnow().date()
+        stats['predictions_by_day'] = [
+            ((today - timedelta(days=offset)).isoformat(),
+             self.stats['predictions_by_day'].get((today - timedelta(days=offset)).isoformat(), 0))
+            for offset in range(DAYS_KEPT - 1, -1, -1)
+        ]
+        stats['predictions_today'] = stats['predictions_by_day'][-1][1]
+
+        stats['age'] = self._clock() - self.reconciled_at
+        stats['events_applied'] = self.events_applied
+        stats['drift'] = self.drift
+        return stats
\ No newline at end of file
@@ -1,7 +1,8 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from promo_manager import PromoCodeManager
+from promo_manager import PromoCodeManager, PROMO_CODES_SHOWN
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -11,7 +12,7 @@ async def promo_management(update: Update, context: ContextTypes.DEFAULT_TYPE, d
     user = update.effective_user
 
     promo_manager = PromoCodeManager(database)
-    stats = promo_manager.get_promo_stats()
+    stats = await promo_manager.get_promo_stats()
 
     stats_text = f"""
 🎫 *УПРАВЛЕНИЕ ПРОМОКОДАМИ*
@@ -64,16 +65,31 @@ async def create_promo_command(update: Update, context: ContextTypes.DEFAULT_TYP
         max_uses = int(context.args[2]) if len(context.args) > 2 else 1
 
         promo_manager = PromoCodeManager(database)
-        codes = promo_manager.create_promo_batch(count, days, max_uses, user.id)
+        started = time.perf_counter()
+        codes = await promo_manager.create_promo_batch(count, days, max_uses, user.id)
+        elapsed = time.perf_counter() - started
 
-        if codes:
-            codes_text = "\n".join([f"• `{code}`" for code in codes])
+        # Большая партия не помещается в одно сообщение Telegram
+        codes_text = "\n".join([f"• `{code}`" for code in codes[:PROMO_CODES_SHOWN]])
+        if len(codes) > PROMO_CODES_SHOWN:
+            codes_text += f"\n… и еще {len(codes) - PROMO_CODES_SHOWN}"
+
+        if codes and len(codes) == count:
             await update.message.reply_text(
                 f"✅ *Создано {len(codes)} промокодов*\n\n"
                 f"*Коды:*\n{codes_text}\n\n"
                 f"*Параметры:*\n"
                 f"• Дней: {days}\n"
-                f"• Использований: {max_uses}",
+                f"• Использований: {max_uses}\n\n"
+                f"⏱ {elapsed:.2f} с, {len(codes) / elapsed if elapsed else 0:.0f} кодов/с",
+                parse_mode='Markdown'
+            )
+        elif codes:
+            # Часть кодов уже действует: админ должен их увидеть
+            await update.message.reply_text(
+                f"❌ *Создано только {len(codes)} из {count} промокодов*\n\n"
+                f"Остальные не созданы, создайте недостающие повторно\n\n"
+                f"*Созданные коды:*\n{codes_text}",
                 parse_mode='Markdown'
             )
         else:
@@ -85,7 +101,7 @@ async def create_promo_command(update: Update, context: ContextTypes.DEFAULT_TYP
 
 async def list_promos_command(update: Update, context: ContextTypes.DEFAULT_TYPE, database):
     """Список промокодов"""
-    promos = database.get_all_promo_codes()
+    promos = await database.get_all_promo_codes()
 
     if not promos:
         await update.message.reply_text("📭 Промокоды не найдены")
@@ -1,9 +1,12 @@
 import aiohttp
+import json
 import random
 from datetime import datetime
 from typing import List
 import logging
 
+from llm_session import LLMSession
+
 logger = logging.getLogger(__name__)
 
 
@@ -12,6 +15,9 @@ class OllamaAssistant:
         self.ollama_url = ollama_url
         self.model = model
 
+        # Пул соединений к Ollama живет все время работы бота
+        self.http = LLMSession("Ollama")
+
         self.tarot_cards = [
             "Шут", "Маг", "Верховная Жрица", "Императрица", "Император",
             "Иерофант", "Влюбленные", "Колесница", "Сила", "Отшельник",
@@ -28,6 +34,16 @@ class OllamaAssistant:
             (12, 31): "Козерог"
         }
 
+    async def start(self):
+        """Открывает общую сессию к Ollama"""
+        await self.http.start()
+
+    async def close(self):
+        await self.http.close()
+
+    def get_connection_stats(self) -> dict:
+        return self.http.get_stats()
+
     def get_zodiac_sign(self, birth_date: datetime) -> str:
         day = birth_date.day
         month = birth_date.month
@@ -40,8 +56,13 @@ class OllamaAssistant:
     def draw_cards(self, count: int = 3) -> List[str]:
         return random.sample(self.tarot_cards, count)
 
-    async def generate_tarot_prediction(self, name: str, birth_date: str, zodiac_sign: str, cards: List[str]) -> str:
-        """Генерация основного предсказания"""
+    async def generate_tarot_prediction(self, name: str, birth_date: str, zodiac_sign: str, cards: List[str],
+                                        on_partial=None) -> str:
+        """Генерация основного предсказания.
+
+        Если передан on_partial, ответ /api/generate читается потоком, и накопленный
+        текст передается в корутину on_partial по мере поступления.
+        """
 
         prompt = f"""
 ТЫ ТАРОЛОГ. ОТВЕЧАЙ СТРОГО НА РУССКОМ. НЕ ИСПОЛЬЗУЙ АНГЛИЙСКИЙ.
@@ -63,43 +84,48 @@ class OllamaAssistant:
         try:
             logger.info(f"🔮 Запрос основного предсказания для {name}")
 
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20)) as session:
-                data = {
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "num_predict": 250,
-                        "top_k": 20,
-                        "top_p": 0.8
-                    }
+            session = await self.http.get_session()
+
+            data = {
+                "model": self.model,
+                "prompt": prompt,
+                "stream": on_partial is not None,
+                "options": {
+                    "temperature": 0.7,
+                    "num_predict": 250,
+                    "top_k": 20,
+                    "top_p": 0.8
                 }
+            }
 
-                async with session.post(f"{self.ollama_url}/api/generate", json=data) as response:
+            async with session.post(f"{self.ollama_url}/api/generate", json=data,
+                                    timeout=aiohttp.ClientTimeout(total=20)) as response:
 
-                    if response.status == 200:
+                if response.status == 200:
+                    if on_partial:
+                        response_text = (await self._read_stream(response, on_partial)).strip()
+                    else:
                         result = await response.json()
                         response_text = result.get("response", "").strip()
 
-                        if response_text:
-                            cleaned_text = self._force_russian(response_text)
-                            if self._is_russian(cleaned_text):
-                                logger.info(f"✅ Основное предсказание для {name}")
-                                return cleaned_text
-                            else:
-                                return self._get_russian_prediction(name, cards, zodiac_sign)
+                    if response_text:
+                        cleaned_text = self._force_russian(response_text)
+                        if self._is_russian(cleaned_text):
+                            logger.info(f"✅ Основное предсказание для {name}")
+                            return cleaned_text
                         else:
                             return self._get_russian_prediction(name, cards, zodiac_sign)
                     else:
                         return self._get_russian_prediction(name, cards, zodiac_sign)
+                else:
+                    return self._get_russian_prediction(name, cards, zodiac_sign)
 
         except Exception as e:
             logger.error(f"❌ Ошибка основного предсказания: {e}")
             return self._get_russian_prediction(name, cards, zodiac_sign)
 
     async def generate_detailed_explanation(self, name: str, birth_date: str, zodiac_sign: str, cards: List[str],
-                                            original_prediction: str) -> str:
+                                            original_prediction: str, on_partial=None) -> str:
         """Генерация расширенного обоснования предсказания"""
 
         prompt = f"""
@@ -124,37 +150,59 @@ class OllamaAssistant:
         try:
             logger.info(f"📖 Запрос расширенного обоснования для {name}")
 
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=25)) as session:
-                data = {
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.8,
-                        "num_predict": 400,  # Больше токенов для детального объяснения
-                        "top_k": 30,
-                        "top_p": 0.85
-                    }
+            session = await self.http.get_session()
+
+            data = {
+                "model": self.model,
+                "prompt": prompt,
+                "stream": on_partial is not None,
+                "options": {
+                    "temperature": 0.8,
+                    "num_predict": 400,  # Больше токенов для детального объяснения
+                    "top_k": 30,
+                    "top_p": 0.85
                 }
+            }
 
-                async with session.post(f"{self.ollama_url}/api/generate", json=data) as response:
+            async with session.post(f"{self.ollama_url}/api/generate", json=data,
+                                    timeout=aiohttp.ClientTimeout(total=25)) as response:
 
-                    if response.status == 200:
+                if response.status == 200:
+                    if on_partial:
+                        response_text = (await self._read_stream(response, on_partial)).strip()
+                    else:
                         result = await response.json()
                         response_text = result.get("response", "").strip()
 
-                        if response_text and self._is_russian(response_text):
-                            logger.info(f"✅ Расширенное обоснование для {name}")
-                            return self._clean_explanation(response_text)
-                        else:
-                            return self._get_detailed_fallback(name, cards, zodiac_sign, original_prediction)
+                    if response_text and self._is_russian(response_text):
+                        logger.info(f"✅ Расширенное обоснование для {name}")
+                        return self._clean_explanation(response_text)
                     else:
                         return self._get_detailed_fallback(name, cards, zodiac_sign, original_prediction)
+                else:
+                    return self._get_detailed_fallback(name, cards, zodiac_sign, original_prediction)
 
         except Exception as e:
             logger.error(f"❌ Ошибка расширенного обоснования: {e}")
             return self._get_detailed_fallback(name, cards, zodiac_sign, original_prediction)
 
+    async def _read_stream(self, response, on_partial) -> str:
+        """Читает потоковый ответ Ollama (JSON на строку), передавая накопленный текст в on_partial"""
+        text = ""
+
+        async for raw_line in response.content:
+            if not raw_line.strip():
+                continue
+
+            chunk = json.loads(raw_line)
+            if chunk.get("response"):
+                text += chunk["response"]
+                await on_partial(text)
+            if chunk.get("done"):
+                break
+
+        return text
+
     def _clean_explanation(self, text: str) -> str:
         """Очищает расширенное обоснование"""
         lines = text.split('\n')
@@ -0,0 +1,635 @@
+import asyncio
+import logging
+
+from config import (
+    SUPABASE_POOL_MAXSIZE, SUPABASE_MAX_RETRIES, SUPABASE_TIMEOUT, BROADCAST_CHUNK_SIZE, STORAGE_BACKEND,
+    PROMO_INSERT_CHUNK, PROMO_INDEX_PAGE, FREE_PREDICTIONS_LIMIT, HISTORY_PAGE_SIZE
+)
+from history_cache import RecentHistoryCache
+from database_manager import (
+    DatabaseManager, PROMO_BATCH_HEADERS, USER_UPSERT_HEADERS, RETURN_MINIMAL_HEADERS, TICKET_MESSAGE_COLUMNS, PROMO_LIST_COLUMNS
+)
+from prediction_queue import PredictionWriteQueue
+from storage_backends import PostgrestBackend, SQLiteBackend, ReplicaBackend
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabaseManager(DatabaseManager):
+    """Асинхронный слой данных бота.
+
+    Публичные методы совпадают с DatabaseManager, но являются корутинами.
+    Запросы в формате PostgREST выполняет хранилище backend: Supabase через
+    общую aiohttp-сессию (PostgrestBackend), локальная SQLite-база
+    (SQLiteBackend) или Supabase с локальной репликой для чтения
+    (ReplicaBackend). По умолчанию хранилище выбирается настройкой STORAGE_BACKEND.
+    """
+
+    def __init__(self, base_url: str = None, backend=None, pool_limit: int = SUPABASE_POOL_MAXSIZE,
+                 pool_limit_per_host: int = SUPABASE_POOL_MAXSIZE, keepalive_timeout: float = 30.0,
+                 request_timeout: float = SUPABASE_TIMEOUT, max_retries: int = SUPABASE_MAX_RETRIES):
+        super().__init__(base_url)
+
+        if backend is None and STORAGE_BACKEND == 'sqlite':
+            backend = SQLiteBackend()
+        elif backend is None:
+            backend = PostgrestBackend(self.supabase_url, self.headers, pool_limit, pool_limit_per_host,
+                                       keepalive_timeout, request_timeout, max_retries)
+            if STORAGE_BACKEND == 'replica':
+                backend = ReplicaBackend(backend, SQLiteBackend())
+        self.backend = backend
+
+        # telegram_id -> загрузка сессии в процессе, общая для одновременных апдейтов
+        self._pending_sessions = {}
+
+        # Предсказания пишутся в базу пакетами в фоне
+        self.prediction_queue = PredictionWriteQueue(self)
+
+        # Последние предсказания пользователей для /history без запросов к базе
+        self.history_cache = RecentHistoryCache()
+
+    async def start(self):
+        """Дописывает предсказания, оставшиеся в журнале после прошлого запуска"""
+        await self.backend.start()
+        await self.prediction_queue.start()
+
+    async def close(self):
+        """Сбрасывает очередь предсказаний и закрывает хранилище"""
+        await self.prediction_queue.close()
+        await self.backend.close()
+
+    def get_transport_stats(self):
+        """Счетчики хранилища"""
+        return self.backend.get_stats()
+
+    def get_history_cache_stats(self):
+        """Счетчики кэша истории предсказаний"""
+        return self.history_cache.get_stats()
+
+    def get_traffic_stats(self):
+        """Байты запросов к Supabase по обработчикам бота (см. TrafficStats)"""
+        return self.backend.traffic.snapshot()
+
+    async def _make_request(self, endpoint, method='GET', data=None, params=None, headers=None):
+        """Универсальный метод для выполнения запросов"""
+        return await self.backend.request(endpoint, method, data, params, headers)
+
+    async def get_or_create_user(self, telegram_user):
+        """Получить или создать пользователя (см. get_session)"""
+        session = await self.get_session(telegram_user)
+        return session['user'] if session else None
+
+    async def get_session(self, telegram_user):
+        """Пользователь и его статистика для обработки апдейта: {'user': запись, 'stats': статистика}.
+
+        Из кэша - без запросов, иначе один вызов rpc/session_bootstrap, который
+        заодно создает нового пользователя. Одновременные вызовы для одного
+        telegram_id ждут один и тот же запрос.
+        """
+        user = self.users_cache.get(telegram_user.id)
+        if user:
+            return {'user': user, 'stats': self._build_user_stats(user)}
+
+        pending = self._pending_sessions.get(telegram_user.id)
+        if pending is None:
+            pending = asyncio.ensure_future(self._bootstrap_session(telegram_user))
+            self._pending_sessions[telegram_user.id] = pending
+            pending.add_done_callback(lambda _: self._pending_sessions.pop(telegram_user.id, None))
+
+        # shield: отмена одного обработчика не отменяет запрос для остальных
+        return await asyncio.shield(pending)
+
+    async def _bootstrap_session(self, telegram_user):
+        result = await self._make_request('rpc/session_bootstrap', method='POST', data={
+            'p_user': self._build_new_user_data(telegram_user),
+            'p_free_limit': FREE_PREDICTIONS_LIMIT
+        })
+        session = self._parse_session(result)
+
+        if session is None:
+            # Функция session_bootstrap недоступна: upsert и статистика на стороне бота
+            logger.warning(f"⚠️ rpc/session_bootstrap не ответил для {telegram_user.id}, создаю пользователя через upsert")
+            user = await self._upsert_user(telegram_user)
+            return {'user': user, 'stats': self._build_user_stats(user)} if user else None
+
+        self.users_cache.put(session['user'])
+        if result.get('created'):
+            logger.info(f"✅ Создан новый пользователь: {session['user']['first_name']}")
+            self._emit('user_created')
+        return session
+
+    async def _upsert_user(self, telegram_user):
+        new_user = await self._make_request(
+            'users', method='POST', data=self._build_new_user_data(telegram_user),
+            params=self._build_user_upsert_params(), headers=USER_UPSERT_HEADERS
+        )
+
+        if new_user and len(new_user) > 0:
+            user = new_user[0]
+            logger.info(f"✅ Создан новый пользователь: {user['first_name']}")
+            self.users_cache.put(user)
+            self._emit('user_created')
+            return user
+
+        user = await self.get_user_by_telegram_id(telegram_user.id)
+        if user is None:
+            logger.error(f"❌ Не удалось создать пользователя для {telegram_user.id}")
+        return user
+
+    async def get_user_by_telegram_id(self, telegram_id: int):
+        """Получить запись пользователя по Telegram ID (через кэш)"""
+        user = self.users_cache.get(telegram_id)
+        if user:
+            return user
+
+        users = await self._make_request('users', params={'telegram_id': f'eq.{telegram_id}'})
+        if users and len(users) > 0:
+            self.users_cache.put(users[0])
+            return users[0]
+
+        return None
+
+    async def get_user_stats(self, telegram_id: int):
+        """Получить статистику пользователя"""
+        try:
+            user = await self.get_user_by_telegram_id(telegram_id)
+            if not user:
+                return None
+
+            return self._build_user_stats(user)
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения статистики: {e}")
+            return None
+
+    async def save_prediction(self, telegram_id: int, prediction_type: str, user_name: str,
+                              partner_name: str, birth_date: str, zodiac_sign: str,
+                              cards: list, prediction: str) -> bool:
+        """Сохранить предсказание"""
+        try:
+            prediction_data = self._build_prediction_data(
+                None, prediction_type, user_name, partner_name, birth_date, zodiac_sign, cards, prediction
+            )
+
+            # Строка уйдет в базу пакетом в фоне, ответ пользователю не ждет вставки
+            await self.prediction_queue.enqueue(self._build_queued_prediction(telegram_id, prediction_data))
+            self.users_cache.increment(telegram_id, 'predictions_count')
+            self.history_cache.append(
+                telegram_id, self._format_predictions([{**prediction_data, 'id': None, 'prediction_text': None}])[0]
+            )
+            self._emit('prediction_saved', telegram_id=telegram_id)
+
+            logger.info(f"✅ Предсказание поставлено в очередь для пользователя {telegram_id}")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения предсказания: {e}")
+            return False
+
+    async def is_reachable(self) -> bool:
+        """Отвечает ли база: дешевое чтение таблицы, которой нет в локальной реплике"""
+        return await self._make_request('promo_codes', params={'select': 'id', 'limit': '1'}) is not None
+
+    async def record_predictions(self, rows: list):
+        """Записать пакет предсказаний одним запросом, вернуть обновленных пользователей"""
+        result = await self._make_request('rpc/record_predictions', method='POST', data={'p_rows': rows})
+        return result if isinstance(result, list) else None
+
+    async def get_user_predictions(self, telegram_id: int, limit: int = 5):
+        """Получить историю предсказаний"""
+        return (await self.get_prediction_history(telegram_id, limit))['predictions']
+
+    async def get_prediction_history(self, telegram_id: int, limit: int = HISTORY_PAGE_SIZE,
+                                     before: tuple = None, after: tuple = None):
+        """Страница истории предсказаний из кэша или одним запросом (см. DatabaseManager).
+
+        Первая страница, которой нет в кэше, загружает в него сразу depth последних
+        предсказаний пользователя.
+        """
+        try:
+            page = self.history_cache.page(telegram_id, limit, before, after)
+            if page is not None:
+                return page
+
+            # История должна включать только что сделанные предсказания; пока запись
+            # не проходит, повтор остается фоновой задаче, а история читается как есть
+            if self.prediction_queue.has_pending(telegram_id) and not self.prediction_queue.failing:
+                await self.prediction_queue.flush()
+
+            first_page = before is None and after is None
+            depth = max(limit, self.history_cache.depth) if first_page else limit
+            predictions = await self._make_request(
+                'predictions', params=self._build_history_params(telegram_id, depth, before, after)
+            )
+
+            # Предсказание, сохраненное во время запроса, в ответ могло не попасть
+            if first_page and isinstance(predictions, list) and not self.prediction_queue.has_pending(telegram_id):
+                self.history_cache.load(telegram_id, self._format_predictions(predictions), len(predictions) <= depth)
+
+            return self._parse_history_page((predictions or [])[:limit + 1], limit, before, after)
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения истории: {e}")
+            return self._parse_history_page([], limit)
+
+    async def can_user_make_prediction(self, telegram_id: int) -> bool:
+        """Проверить может ли пользователь сделать предсказание"""
+        stats = await self.get_user_stats(telegram_id)
+        if not stats:
+            return True  # Новый пользователь может сделать предсказание
+
+        return stats['remaining_predictions'] > 0
+
+    async def activate_subscription(self, telegram_id: int, subscription_type: str, days: int) -> bool:
+        """Активировать подписку"""
+        try:
+            logger.info(f"🔧 Активация подписки: user={telegram_id}, type={subscription_type}, days={days}")
+
+            user = await self.get_user_by_telegram_id(telegram_id)
+            if not user:
+                logger.error(f"❌ Пользователь {telegram_id} не найден")
+                return False
+
+            user_id = user['id']
+            was_active = self._is_subscription_active(user)
+
+            update_data, subscription_end = self._build_subscription_update(subscription_type, days)
+
+            result = await self._make_request(f'users?id=eq.{user_id}', method='PATCH', data=update_data)
+
+            if result:
+                logger.info(f"✅ Подписка успешно активирована для {telegram_id} до {subscription_end}")
+
+                # Обновляем кэш
+                self._apply_user_update(telegram_id, update_data, result)
+                self._emit('subscription_activated', telegram_id=telegram_id, was_active=was_active,
+                           was_premium=user.get('subscription_type', 'free') != 'free')
+
+                return True
+            else:
+                logger.error(f"❌ Не удалось обновить данные пользователя {telegram_id}")
+                return False
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка активации подписки для {telegram_id}: {e}")
+            return False
+
+    async def create_payment(self, telegram_id: int, amount: float, payment_system: str,
+                             payment_id: str, subscription_type: str, subscription_days: int) -> bool:
+        """Создать запись о платеже"""
+        try:
+            payment_data = self._build_payment_data(
+                None, amount, payment_system, payment_id, subscription_type, subscription_days
+            )
+
+            # Вставка платежа и увеличение total_spent одним атомарным запросом
+            result = await self._make_request(
+                'rpc/record_payment', method='POST', data=self._build_rpc_row_params(telegram_id, payment_data)
+            )
+
+            if self._apply_rpc_user(telegram_id, result):
+                logger.info(f"✅ Платеж сохранен для {telegram_id}")
+                self._emit('payment_created', telegram_id=telegram_id, amount=amount)
+                return True
+
+            return False
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания платежа: {e}")
+            return False
+
+    # МЕТОДЫ ДЛЯ РАБОТЫ С ПОЛЬЗОВАТЕЛЯМИ
+    async def get_all_users(self, limit: int = 100, offset: int = 0):
+        """Получить список всех пользователей"""
+        try:
+            users = await self._make_request('users', params=self._build_users_list_params(limit, offset))
+            return users or []
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения пользователей: {e}")
+            return []
+
+    async def get_users_count(self):
+        """Получить общее количество пользователей"""
+        try:
+            return await self.backend.count('users')
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения количества пользователей: {e}")
+            return 0
+
+    async def get_admin_stats(self):
+        """Счетчики для админ-панели одним запросом rpc/admin_stats"""
+        try:
+            return self._parse_admin_stats(await self._make_request('rpc/admin_stats', method='POST', data={}))
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения статистики: {e}")
+            return None
+
+    async def count_broadcast_recipients(self, target: str):
+        """Количество получателей рассылки"""
+        try:
+            return await self.backend.count('users', self._build_recipient_filter(target))
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка подсчета получателей рассылки: {e}")
+            return 0
+
+    async def iter_broadcast_recipients(self, target: str, after_id: int = 0, chunk_size: int = BROADCAST_CHUNK_SIZE):
+        """Получатели рассылки пачками в порядке users.id (см. DatabaseManager)"""
+        while True:
+            users = await self._make_request(
+                'users', params=self._build_recipients_page_params(target, after_id, chunk_size)
+            )
+            if users is None:
+                raise ConnectionError(f"Не удалось загрузить получателей после id={after_id}")
+            if not users:
+                return
+
+            yield users
+            if len(users) < chunk_size:
+                return
+            after_id = users[-1]['id']
+
+    async def get_users_with_subscription(self, subscription_type: str = None):
+        """Получить пользователей с подпиской"""
+        try:
+            users = await self._make_request('users', params=self._build_subscription_filter(subscription_type))
+            return users or []
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения пользователей с подпиской: {e}")
+            return []
+
+    async def search_users(self, query: str):
+        """Поиск пользователей по имени, username или ID"""
+        try:
+            # Поиск по telegram_id если query число
+            if query.isdigit():
+                user_by_id = await self.get_user_by_telegram_id(int(query))
+                if user_by_id:
+                    return [user_by_id]
+
+            # Поиск по имени и username
+            users = await self._make_request('users', params=self._build_search_params(query))
+            return users or []
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка поиска пользователей: {e}")
+            return []
+
+    # МЕТОДЫ ДЛЯ ПОДДЕРЖКИ
+    async def create_support_ticket(self, user_id: int, user_name: str, message: str,
+                                    message_type: str = 'question') -> int:
+        """Создать тикет поддержки"""
+        try:
+            ticket_data = self._build_ticket_data(user_id, user_name, message, message_type)
+
+            result = await self._make_request('support_tickets', method='POST', data=ticket_data, params={'select': 'id'})
+
+            if result and len(result) > 0:
+                ticket_id = result[0]['id']
+                logger.info(f"✅ Создан тикет поддержки #{ticket_id}")
+                self._emit('ticket_created', ticket_id=ticket_id)
+                return ticket_id
+
+            return None
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания тикета: {e}")
+            return None
+
+    async def add_support_message(self, ticket_id: int, user_id: int, user_name: str, message: str,
+                                  is_admin: bool = False):
+        """Добавить сообщение в тикет"""
+        try:
+            # Для админов нужно найти или создать запись пользователя в таблице users
+            if is_admin:
+                admin_user = await self.get_user_by_telegram_id(user_id)
+                if not admin_user:
+                    admin_data = self._build_admin_user_data(user_id, user_name)
+                    admin_user = await self._make_request('users', method='POST', data=admin_data)
+                    if admin_user and len(admin_user) > 0:
+                        actual_user_id = admin_user[0]['id']
+                        self.users_cache.put(admin_user[0])
+                    else:
+                        logger.error(f"❌ Не удалось создать запись админа в users")
+                        return False
+                else:
+                    actual_user_id = admin_user['id']
+            else:
+                actual_user_id = user_id  # Для обычных пользователей используем переданный user_id
+
+            message_data = self._build_support_message_data(ticket_id, actual_user_id, user_name, message, is_admin)
+
+            result = await self._make_request(
+                'support_messages', method='POST', data=message_data, headers=RETURN_MINIMAL_HEADERS
+            )
+
+            if result:
+                logger.info(f"✅ Добавлено сообщение в тикет #{ticket_id}")
+                return True
+
+            return False
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка добавления сообщения: {e}")
+            return False
+
+    async def get_support_tickets(self, status: str = None, user_id: int = None):
+        """Получить список тикетов"""
+        try:
+            tickets = await self._make_request('support_tickets', params=self._build_tickets_params(status, user_id))
+            return tickets or []
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения тикетов: {e}")
+            return []
+
+    async def get_ticket_messages(self, ticket_id: int):
+        """Получить сообщения тикета"""
+        try:
+            messages = await self._make_request(
+                'support_messages',
+                params={
+                    'select': TICKET_MESSAGE_COLUMNS,
+                    'ticket_id': f'eq.{ticket_id}',
+                    'order': 'created_at.asc'
+                }
+            )
+            return messages or []
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения сообщений: {e}")
+            return []
+
+    async def update_ticket_status(self, ticket_id: int, status: str):
+        """Обновить статус тикета"""
+        try:
+            update_data = self._build_ticket_status_update(status)
+
+            result = await self._make_request(
+                f'support_tickets?id=eq.{ticket_id}&select=id', method='PATCH', data=update_data
+            )
+
+            if result:
+                logger.info(f"✅ Статус тикета #{ticket_id} изменен на {status}")
+                self._emit('ticket_status_changed', ticket_id=ticket_id, status=status)
+                return True
+
+            return False
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка обновления статуса: {e}")
+            return False
+
+    async def get_user_by_id(self, user_id: int):
+        """Получить пользователя по ID"""
+        try:
+            users = await self._make_request('users', params={'id': f'eq.{user_id}'})
+            return users[0] if users and len(users) > 0 else None
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения пользователя: {e}")
+            return None
+
+    # МЕТОДЫ ДЛЯ РАБОТЫ С ПРОМОКОДАМИ
+    async def create_promo_code(self, code: str, days: int, max_uses: int, created_by: int,
+                                description: str = "", subscription_type: str = "premium") -> bool:
+        """Создать промокод"""
+        try:
+            promo_data = self._build_promo_data(code, days, max_uses, created_by, description, subscription_type)
+
+            result = await self._make_request('promo_codes', method='POST', data=promo_data, headers=RETURN_MINIMAL_HEADERS)
+
+            if result is None:
+                logger.error(f"❌ Не удалось создать промокод {code}")
+                return False
+
+            logger.info(f"✅ Промокод создан: {code}")
+            self._emit('promo_created', code=code)
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания промокода {code}: {e}")
+            return False
+
+    async def create_promo_codes(self, codes: dict, days: int, max_uses: int, created_by: int,
+                                 subscription_type: str = "premium", chunk_size: int = PROMO_INSERT_CHUNK) -> list:
+        """Создать пачку промокодов {код: описание} массивами по chunk_size строк (см. DatabaseManager)"""
+        promos = [
+            self._build_promo_data(code, days, max_uses, created_by, description, subscription_type)
+            for code, description in codes.items()
+        ]
+        created = []
+        failed = False
+
+        for start in range(0, len(promos), chunk_size):
+            result = await self._make_request(
+                'promo_codes', method='POST', data=promos[start:start + chunk_size],
+                params=self._build_promo_batch_params(), headers=PROMO_BATCH_HEADERS
+            )
+            if not isinstance(result, list):
+                logger.error(f"❌ Не удалось создать пачку промокодов с {start + 1} по {start + chunk_size}")
+                failed = True
+                break
+            created.extend(row['code'] for row in result)
+
+        # Коды предыдущих пачек уже в базе, индекс промокодов должен о них знать
+        if created:
+            self._emit('promo_created', count=len(created), codes=created)
+        return None if failed else created
+
+    async def get_promo_code(self, code: str):
+        """Получить промокод по коду"""
+        try:
+            promos = await self._make_request('promo_codes', params={'code': f'eq.{code.upper()}'})
+            return promos[0] if promos and len(promos) > 0 else None
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения промокода: {e}")
+            return None
+
+    async def use_promo_code(self, code: str, user_id: int) -> bool:
+        """Использовать промокод: проверка, учет и подписка одной транзакцией в rpc/redeem_promo"""
+        return await self.redeem_promo_code(code, user_id) == 'ok'
+
+    async def redeem_promo_code(self, code: str, user_id: int) -> str:
+        """Как use_promo_code, но возвращает статус rpc/redeem_promo (ok, not_found, ...) или error"""
+        try:
+            logger.info(f"🔑 Попытка активации промокода: {code} для пользователя {user_id}")
+
+            result = await self._make_request(
+                'rpc/redeem_promo', method='POST', data={'p_code': code.upper(), 'p_telegram_id': user_id}
+            )
+            if not self._apply_redeem_result(user_id, code, result):
+                return result.get('status') or 'error' if isinstance(result, dict) else 'error'
+
+            promo = result['promo']
+            self._emit('subscription_activated', telegram_id=user_id, was_active=result['was_active'],
+                       was_premium=result['was_premium'])
+            self._emit('promo_used', code=code.upper(), first_use=promo['used_count'] == 1,
+                       deactivated=not promo['is_active'])
+            return 'ok'
+
+        except Exception as e:
+            logger.error(f"❌ Критическая ошибка использования промокода {code}: {e}")
+            return 'error'
+
+    async def iter_promo_index(self, updated_since: str = None, chunk_size: int = PROMO_INDEX_PAGE):
+        """Промокоды для локального индекса пачками в порядке promo_codes.id.
+
+        Без updated_since отдает только активные коды, с ним - все коды с
+        updated_at не раньше updated_since, в том числе деактивированные.
+        """
+        after_id = 0
+        while True:
+            promos = await self._make_request(
+                'promo_codes', params=self._build_promo_index_params(updated_since, after_id, chunk_size)
+            )
+            if promos is None:
+                raise ConnectionError(f"Не удалось загрузить промокоды после id={after_id}")
+            if not promos:
+                return
+
+            yield promos
+            if len(promos) < chunk_size:
+                return
+            after_id = promos[-1]['id']
+
+    async def get_all_promo_codes(self):
+        """Получить все промокоды"""
+        try:
+            promos = await self._make_request('promo_codes', params={'select': PROMO_LIST_COLUMNS, 'order': 'created_at.desc'})
+            return promos or []
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения промокодов: {e}")
+            return []
+
+    async def deactivate_promo_code(self, code_id: int) -> bool:
+        """Деактивировать промокод"""
+        try:
+            # updated_at, по которому изменения дочитывает индекс промокодов, ставит база
+            update_data = {'is_active': False}
+            result = await self._make_request(
+                f'promo_codes?id=eq.{code_id}', method='PATCH', data=update_data, headers=RETURN_MINIMAL_HEADERS
+            )
+            if result is not None:
+                self._emit('promo_deactivated', code_id=code_id)
+            return result is not None
+        except Exception as e:
+            logger.error(f"❌ Ошибка деактивации промокода: {e}")
+            return False
+
+    async def get_promo_stats(self):
+        """Получить статистику по промокодам"""
+        try:
+            promos = await self.get_all_promo_codes()
+            return self._build_promo_stats(promos)
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения статистики промокодов: {e}")
+            return {
+                'total_codes': 0,
+                'active_codes': 0,
+                'used_codes': 0,
+                'total_uses': 0
+            }
\ No newline at end of file
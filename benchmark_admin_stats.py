@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+
+import aiohttp
+
+from async_database_manager import AsyncDatabaseManager
+from postgrest_stub import PostgrestStub
+from sqlite_database import SQLiteDatabase
+
+USERS = 10000
+
+
+def build_sqlite_fixture(path: str, predictions: int) -> SQLiteDatabase:
+    """SQLite с USERS пользователями и predictions предсказаниями"""
+    db = SQLiteDatabase(path)
+    with db._transaction() as conn:
+        conn.executemany(
+            "INSERT INTO users (telegram_id, first_name, subscription_type, subscription_end, predictions_count, total_spent) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (100000 + i, f"User{i}", 'premium' if i % 10 == 0 else 'free',
+                 '2099-01-01T00:00:00Z' if i % 10 == 0 else None, predictions // USERS, 199 if i % 10 == 0 else 0)
+                for i in range(USERS)
+            )
+        )
+        conn.executemany(
+            "INSERT INTO predictions (user_id, prediction_type, user_name, cards_drawn, prediction_text) "
+            "VALUES (?, 'personal', 'Анна', 'Маг, Шут, Мир', 'Карты говорят, что впереди перемены')",
+            ((i % USERS + 1,) for i in range(predictions))
+        )
+        conn.executemany(
+            "INSERT INTO support_tickets (user_id, message, status) VALUES (?, 'вопрос', ?)",
+            ((i, 'open' if i % 2 else 'closed') for i in range(100))
+        )
+    return db
+
+
+def bench_sqlite(predictions: int):
+    path = os.path.join(tempfile.mkdtemp(), "admin_stats.db")
+    print(f"1. SQLite: {predictions} предсказаний, {USERS} пользователей")
+    db = build_sqlite_fixture(path, predictions)
+    conn = db._connect()
+
+    started = time.perf_counter()
+    rows = conn.execute("SELECT * FROM predictions").fetchall()
+    users = conn.execute("SELECT * FROM users").fetchall()
+    old = {'total_predictions': len(rows), 'total_users': len(users)}
+    old_time = time.perf_counter() - started
+    del rows, users
+
+    started = time.perf_counter()
+    new = db.get_admin_stats()
+    new_time = time.perf_counter() - started
+
+    same = old['total_predictions'] == new['total_predictions'] and old['total_users'] == new['total_users']
+    print(f"   выгрузка строк:   {old_time * 1000:>9.1f} мс")
+    print(f"   агрегаты в SQL:   {new_time * 1000:>9.1f} мс   {'✅' if same else '❌'} {new}")
+    db.close()
+
+
+async def bench_postgrest(predictions: int):
+    print(f"2. PostgREST: {predictions} предсказаний через локальный стаб")
+    stub = PostgrestStub(latency=0).start()
+    for i in range(1, USERS + 1):
+        stub.insert('users', {'telegram_id': 100000 + i, 'subscription_type': 'free', 'predictions_count': 0})
+    stub.tables['predictions'] = [
+        {'id': i, 'user_id': i % USERS + 1, 'prediction_type': 'personal', 'prediction_text': 'Карты говорят...'}
+        for i in range(1, predictions + 1)
+    ]
+
+    async with aiohttp.ClientSession() as session:
+        started = time.perf_counter()
+        async with session.get(f"{stub.base_url}/predictions") as response:
+            old_body = await response.read()
+        old_time = time.perf_counter() - started
+        old_count = len(json.loads(old_body))
+
+    db = AsyncDatabaseManager(base_url=stub.base_url)
+    started = time.perf_counter()
+    stats = await db.get_admin_stats()
+    new_time = time.perf_counter() - started
+    new_body = json.dumps(stats).encode()
+    await db.close()
+    stub.stop()
+
+    print(f"   GET /predictions: {old_time * 1000:>9.1f} мс, {len(old_body):>12} байт")
+    print(f"   rpc/admin_stats:  {new_time * 1000:>9.1f} мс, {len(new_body):>12} байт   "
+          f"{'✅' if old_count == stats['total_predictions'] else '❌'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк статистики админ-панели")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="предсказаний в SQLite")
+    parser.add_argument('--stub-rows', type=int, default=200_000, help="предсказаний в стабе PostgREST (хранится в памяти)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    print("🧪 БЕНЧМАРК СТАТИСТИКИ АДМИН-ПАНЕЛИ")
+    print("=" * 60)
+
+    bench_sqlite(args.rows)
+    asyncio.run(bench_postgrest(args.stub_rows))
\ No newline at end of file
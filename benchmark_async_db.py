@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from postgrest_stub import PostgrestStub
+from database_manager import DatabaseManager
+from async_database_manager import AsyncDatabaseManager
+from storage_backends import SQLiteBackend
+
+
+class BlockingDatabase:
+    """Адаптер, повторяющий старое поведение: синхронные запросы прямо в event loop"""
+
+    def __init__(self, database: DatabaseManager):
+        self._database = database
+
+    def __getattr__(self, name):
+        attr = getattr(self._database, name)
+        if not callable(attr) or name.startswith('_') or name == 'is_admin':
+            return attr
+
+        async def call(*args, **kwargs):
+            return attr(*args, **kwargs)
+
+        return call
+
+    async def close(self):
+        pass
+
+
+class FakeUser:
+    def __init__(self, telegram_id: int):
+        self.id = telegram_id
+        self.username = f"bench_{telegram_id}"
+        self.first_name = f"User{telegram_id}"
+        self.last_name = ""
+        self.language_code = "ru"
+
+
+class FakeMessage:
+    def __init__(self, text: str = ""):
+        self.text = text
+
+    async def reply_text(self, *args, **kwargs):
+        return self
+
+
+class FakeUpdate:
+    def __init__(self, user: FakeUser, text: str = ""):
+        self.effective_user = user
+        self.message = FakeMessage(text)
+        self.effective_message = self.message
+        self.callback_query = None
+
+
+class FakeContext:
+    def __init__(self):
+        self.user_data = {}
+        self.args = []
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def simulate_user(bot, telegram_id: int, arrived: float, latencies: list):
+    """Один пользователь: /start, профиль и история.
+
+    Задержка считается от момента прихода апдейта, а не от начала работы
+    обработчика, чтобы учитывать время ожидания заблокированного event loop.
+    """
+    user = FakeUser(telegram_id)
+    context = FakeContext()
+
+    for handler in (bot.start, bot.profile, bot.history):
+        await handler(FakeUpdate(user), context)
+        finished = time.perf_counter()
+        latencies.append(finished - arrived)
+        arrived = finished
+
+
+async def run_scenario(bot, users: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(simulate_user(bot, 100000 + i, started, latencies) for i in range(users)))
+    total = time.perf_counter() - started
+
+    return {
+        'handlers': len(latencies),
+        'total': total,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+    }
+
+
+async def main(users: int, latency: float):
+    from main import TarotBot
+
+    stub = PostgrestStub(latency=latency).start()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"🧪 Бенчмарк обработчиков: {users} одновременных пользователей, задержка Supabase {latency * 1000:.0f} мс")
+    print("=" * 70)
+
+    bot = TarotBot(os.getenv("TELEGRAM_TOKEN") or "123456:BENCHMARK", "", "")
+    results = {}
+
+    for name, database in (
+            ('requests (блокирующий)', BlockingDatabase(DatabaseManager(base_url=stub.base_url))),
+            ('aiohttp (асинхронный)', AsyncDatabaseManager(base_url=stub.base_url)),
+            ('SQLite (без сети)', AsyncDatabaseManager(
+                backend=SQLiteBackend(os.path.join(tempfile.mkdtemp(), "benchmark.db"))
+            )),
+    ):
+        stub.tables.clear()
+        bot.database = database
+        results[name] = await run_scenario(bot, users)
+        await database.close()
+
+    stub.stop()
+
+    print(f"{'Клиент':<26}{'вызовов':>9}{'всего, с':>11}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+    for name, r in results.items():
+        print(f"{name:<26}{r['handlers']:>9}{r['total']:>11.2f}"
+              f"{r['p50'] * 1000:>10.1f}{r['p95'] * 1000:>10.1f}{r['p99'] * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк задержки обработчиков TarotBot")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.02, help="задержка ответа Supabase, с")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.users, args.latency))
\ No newline at end of file
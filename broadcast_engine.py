@@ -0,0 +1,269 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+
+from telegram.error import RetryAfter, Forbidden, BadRequest, TelegramError
+
+from config import BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_MAX_ATTEMPTS, BROADCAST_CHECKPOINT_PATH
+
+logger = logging.getLogger(__name__)
+
+# Telegram не принимает больше одного сообщения в секунду в один чат
+PER_CHAT_INTERVAL = 1.0
+# Как часто обновлять сообщение с прогрессом и сохранять контрольную точку
+PROGRESS_INTERVAL = 3.0
+
+
+class TokenBucket:
+    """Ограничитель частоты: rate отправок в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float = 1, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Останавливает выдачу на seconds секунд и сбрасывает накопленный запас"""
+        self._tokens = 0
+        self._updated = max(self._updated, self._clock() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = self._clock()
+                if now < self._updated:
+                    await asyncio.sleep(self._updated - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class BroadcastJob:
+    """Состояние рассылки, которое сохраняется в контрольной точке"""
+
+    def __init__(self, message: str, target: str, total: int, chat_id: int = None, message_id: int = None,
+                 job_id: str = None, cursor: int = 0, pending: list = None, successful: int = 0, failed: int = 0,
+                 retry_after_hits: int = 0, error: str = None, started_at: float = None):
+        self.job_id = job_id or uuid.uuid4().hex[:8]
+        self.message = message
+        self.target = target
+        self.total = total
+        self.chat_id = chat_id
+        self.message_id = message_id
+
+        # cursor - users.id последнего получателя, переданного отправителям,
+        # pending - переданные, но еще не обработанные telegram_id
+        self.cursor = cursor
+        self.pending = list(pending or [])
+        self.successful = successful
+        self.failed = failed
+        self.retry_after_hits = retry_after_hits
+        self.error = error
+        self.started_at = started_at or time.time()
+
+    @property
+    def processed(self) -> int:
+        return self.successful + self.failed
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.job_id,
+            'message': self.message,
+            'target': self.target,
+            'total': self.total,
+            'chat_id': self.chat_id,
+            'message_id': self.message_id,
+            'cursor': self.cursor,
+            'pending': self.pending,
+            'successful': self.successful,
+            'failed': self.failed,
+            'retry_after_hits': self.retry_after_hits,
+            'error': self.error,
+            'started_at': self.started_at
+        }
+
+
+class BroadcastEngine:
+    """Фоновая рассылка с учетом лимитов Telegram.
+
+    Отправку ведут concurrency параллельных отправителей, а общий TokenBucket
+    держит частоту ниже глобального лимита бота. RetryAfter останавливает всех
+    отправителей на указанное время, сетевые ошибки повторяются до max_attempts
+    раз не чаще лимита на один чат. Получатели читаются из базы пачками по
+    возрастанию users.id, и в памяти держится не больше одной пачки. Повторы
+    отправки не обращаются к базе, а в контрольной точке хранится последний
+    переданный id, так что после перезапуска рассылка продолжается с него.
+    """
+
+    def __init__(self, bot, database, rate: float = BROADCAST_RATE, concurrency: int = BROADCAST_CONCURRENCY,
+                 max_attempts: int = BROADCAST_MAX_ATTEMPTS, checkpoint_path: str = BROADCAST_CHECKPOINT_PATH):
+        self.bot = bot
+        self.database = database
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.checkpoint_path = checkpoint_path
+
+        self.job = None
+        self._task = None
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, job: BroadcastJob, on_progress=None):
+        """Запускает рассылку в фоне. on_progress(job, finished) вызывается периодически и в конце"""
+        if self.is_running():
+            raise RuntimeError("Рассылка уже выполняется")
+
+        self.job = job
+        self._save_checkpoint()
+        self._task = asyncio.create_task(self._run(job, on_progress))
+        return self._task
+
+    def resume(self, on_progress=None) -> bool:
+        """Продолжает рассылку из контрольной точки, если прошлый запуск ее не закончил"""
+        if self.is_running() or not os.path.exists(self.checkpoint_path):
+            return False
+
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                job = BroadcastJob(**json.load(f))
+            job.error = None
+        except Exception as e:
+            logger.error(f"❌ Не удалось прочитать контрольную точку рассылки: {e}")
+            return False
+
+        logger.warning(f"⚠️ Продолжаем рассылку {job.job_id}: обработано {job.processed}/{job.total}")
+        self.start(job, on_progress)
+        return True
+
+    async def close(self):
+        """Останавливает рассылку, оставляя контрольную точку для продолжения"""
+        if not self.is_running():
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._save_checkpoint()
+        logger.info(f"✅ Рассылка {self.job.job_id} приостановлена на {self.job.processed}/{self.job.total}")
+
+    async def _run(self, job: BroadcastJob, on_progress):
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        async def produce():
+            # Получатели, которые были в работе при остановке, отправляются первыми
+            for telegram_id in list(job.pending):
+                await queue.put(telegram_id)
+
+            async for chunk in self.database.iter_broadcast_recipients(job.target, after_id=job.cursor):
+                for user in chunk:
+                    await queue.put(user['telegram_id'])
+                    job.pending.append(user['telegram_id'])
+                    job.cursor = user['id']
+
+        async def send_all():
+            while True:
+                telegram_id = await queue.get()
+                try:
+                    try:
+                        delivered = await self._deliver(job, telegram_id)
+                    except Exception as e:
+                        logger.error(f"❌ Ошибка отправки рассылки пользователю {telegram_id}: {e}")
+                        delivered = False
+
+                    if delivered:
+                        job.successful += 1
+                    else:
+                        job.failed += 1
+                    # При отмене получатель остается в pending и будет отправлен после продолжения
+                    job.pending.remove(telegram_id)
+                finally:
+                    # Иначе queue.join() ждет этого получателя вечно
+                    queue.task_done()
+
+        async def report():
+            while True:
+                await asyncio.sleep(PROGRESS_INTERVAL)
+                self._save_checkpoint()
+                await self._notify(on_progress, job, False)
+
+        workers = [asyncio.create_task(send_all()) for _ in range(self.concurrency)]
+        reporter = asyncio.create_task(report())
+        try:
+            await produce()
+            await queue.join()
+        except ConnectionError as e:
+            # База недоступна - оставляем контрольную точку до следующего запуска
+            job.error = str(e)
+            logger.error(f"❌ Рассылка {job.job_id} приостановлена: {e}")
+        finally:
+            for task in workers + [reporter]:
+                task.cancel()
+            await asyncio.gather(*workers, reporter, return_exceptions=True)
+
+        if job.error:
+            self._save_checkpoint()
+            await self._notify(on_progress, job, False)
+            return
+
+        self._remove_checkpoint()
+        logger.info(f"✅ Рассылка {job.job_id} завершена: {job.successful} успешно, {job.failed} ошибок")
+        await self._notify(on_progress, job, True)
+
+    async def _deliver(self, job: BroadcastJob, telegram_id: int) -> bool:
+        for attempt in range(1, self.max_attempts + 1):
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=telegram_id, text=job.message, parse_mode='Markdown')
+                return True
+
+            except RetryAfter as e:
+                # Лимит превышен для всего бота - останавливаем всех отправителей
+                job.retry_after_hits += 1
+                logger.warning(f"⚠️ Telegram просит подождать {e.retry_after} с")
+                self.bucket.pause(e.retry_after)
+
+            except (Forbidden, BadRequest) as e:
+                # Бот заблокирован или чат недоступен - повтор не поможет
+                logger.debug(f"Получатель {telegram_id} недоступен: {e}")
+                return False
+
+            except TelegramError as e:
+                logger.warning(f"⚠️ Ошибка отправки {telegram_id} (попытка {attempt}): {e}")
+                await asyncio.sleep(PER_CHAT_INTERVAL * 2 ** (attempt - 1))
+
+        logger.error(f"❌ Не удалось отправить сообщение {telegram_id} за {self.max_attempts} попыток")
+        return False
+
+    async def _notify(self, on_progress, job: BroadcastJob, finished: bool):
+        if on_progress is None:
+            return
+        try:
+            await on_progress(job, finished)
+        except Exception as e:
+            logger.debug(f"Не удалось обновить прогресс рассылки: {e}")
+
+    def _save_checkpoint(self):
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.job.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _remove_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
\ No newline at end of file
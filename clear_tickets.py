@@ -1,5 +1,5 @@
 import os
-import requests
+from supabase_transport import get_transport, format_stats
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,14 +15,15 @@ def clear_all_tickets():
 
     # Сначала удаляем сообщения
     url = f"{supabase_url}/support_messages"
-    response = requests.delete(url, headers=headers)
+    response = get_transport().delete(url, headers=headers)
     print(f"🗑️ Удалено сообщений: {response.status_code}")
 
     # Затем удаляем тикеты
     url = f"{supabase_url}/support_tickets"
-    response = requests.delete(url, headers=headers)
+    response = get_transport().delete(url, headers=headers)
     print(f"🗑️ Удалено тикетов: {response.status_code}")
 
 
 if __name__ == "__main__":
-    clear_all_tickets()
\ No newline at end of file
+    clear_all_tickets()
+    print(f"🔌 Соединения Supabase: {format_stats(get_transport().get_stats())}")
\ No newline at end of file
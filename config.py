@@ -14,6 +14,87 @@ OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "huggingfaceh4/zephyr-7b-beta:f
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
+# Пул соединений к Supabase REST API
+SUPABASE_POOL_CONNECTIONS = int(os.getenv("SUPABASE_POOL_CONNECTIONS", "4"))  # число хостов в пуле
+SUPABASE_POOL_MAXSIZE = int(os.getenv("SUPABASE_POOL_MAXSIZE", "100"))  # соединений на хост
+SUPABASE_MAX_RETRIES = int(os.getenv("SUPABASE_MAX_RETRIES", "3"))
+SUPABASE_BACKOFF_FACTOR = float(os.getenv("SUPABASE_BACKOFF_FACTOR", "0.3"))
+SUPABASE_BACKOFF_JITTER = float(os.getenv("SUPABASE_BACKOFF_JITTER", "0.2"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+
+# Пул соединений к LLM API (OpenRouter, Ollama)
+LLM_POOL_LIMIT = int(os.getenv("LLM_POOL_LIMIT", "50"))
+LLM_POOL_LIMIT_PER_HOST = int(os.getenv("LLM_POOL_LIMIT_PER_HOST", "20"))
+LLM_KEEPALIVE_TIMEOUT = float(os.getenv("LLM_KEEPALIVE_TIMEOUT", "60"))
+LLM_DNS_CACHE_TTL = int(os.getenv("LLM_DNS_CACHE_TTL", "300"))
+
+# Потоковый вывод ответов LLM
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") == "1"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))  # секунд между правками сообщения
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "8"))  # одновременных запросов к LLM
+
+# Упреждающая генерация расширенного обоснования для подписчиков
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+PREFETCH_TTL = int(os.getenv("PREFETCH_TTL", "900"))  # секунд
+PREFETCH_MAX_USERS = int(os.getenv("PREFETCH_MAX_USERS", "1000"))
+PREFETCH_MAX_INFLIGHT = int(os.getenv("PREFETCH_MAX_INFLIGHT", "2"))  # одновременных фоновых генераций
+
+# Рассылки (Telegram допускает около 30 сообщений в секунду на бота)
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))  # сообщений в секунду
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+BROADCAST_MAX_ATTEMPTS = int(os.getenv("BROADCAST_MAX_ATTEMPTS", "3"))
+BROADCAST_CHECKPOINT_PATH = os.getenv("BROADCAST_CHECKPOINT_PATH", "broadcast_checkpoint.json")
+BROADCAST_CHUNK_SIZE = int(os.getenv("BROADCAST_CHUNK_SIZE", "500"))  # получателей на страницу из базы
+
+# Пакетное создание промокодов
+PROMO_INSERT_CHUNK = int(os.getenv("PROMO_INSERT_CHUNK", "1000"))  # строк в одном POST
+
+# Выгрузка промокодов в файл
+PROMO_EXPORT_PAGE = int(os.getenv("PROMO_EXPORT_PAGE", "5000"))  # строк на страницу выгрузки
+
+# Локальный индекс промокодов
+PROMO_INDEX_REFRESH_INTERVAL = float(os.getenv("PROMO_INDEX_REFRESH_INTERVAL", "60"))  # секунд между дочитываниями
+PROMO_INDEX_PAGE = int(os.getenv("PROMO_INDEX_PAGE", "1000"))  # кодов на страницу загрузки
+PROMO_NEGATIVE_TTL = float(os.getenv("PROMO_NEGATIVE_TTL", "60"))  # секунд помнить отвергнутый базой код
+PROMO_NEGATIVE_MAX_SIZE = int(os.getenv("PROMO_NEGATIVE_MAX_SIZE", "10000"))
+PROMO_ATTEMPTS_LIMIT = int(os.getenv("PROMO_ATTEMPTS_LIMIT", "5"))  # попыток ввода кода на пользователя
+PROMO_ATTEMPTS_WINDOW = float(os.getenv("PROMO_ATTEMPTS_WINDOW", "60"))  # за столько секунд
+
+# Снимок статистики админ-панели
+DASHBOARD_RECONCILE_INTERVAL = int(os.getenv("DASHBOARD_RECONCILE_INTERVAL", "300"))  # секунд между сверками с базой
+
+# Кэш записей пользователей
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "120"))  # секунд, допустимая устарелость
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+USER_CACHE_MAX_BYTES = int(os.getenv("USER_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))  # ~16 МБ
+
+# Отложенная пакетная запись предсказаний
+PREDICTION_BATCH_SIZE = int(os.getenv("PREDICTION_BATCH_SIZE", "50"))
+PREDICTION_FLUSH_INTERVAL_MS = int(os.getenv("PREDICTION_FLUSH_INTERVAL_MS", "500"))
+PREDICTION_SPILL_PATH = os.getenv("PREDICTION_SPILL_PATH", "pending_predictions.jsonl")
+PREDICTION_MAX_ATTEMPTS = int(os.getenv("PREDICTION_MAX_ATTEMPTS", "5"))  # неудачных отправок пакета до деления
+PREDICTION_RETRY_MAX_DELAY = float(os.getenv("PREDICTION_RETRY_MAX_DELAY", "60"))  # секунд, предел паузы между повторами
+PREDICTION_DEAD_LETTER_PATH = os.getenv("PREDICTION_DEAD_LETTER_PATH", "failed_predictions.jsonl")
+
+# История предсказаний
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "5"))  # предсказаний на страницу /history
+HISTORY_CACHE_DEPTH = int(os.getenv("HISTORY_CACHE_DEPTH", "20"))  # последних предсказаний в кэше на пользователя
+HISTORY_CACHE_MAX_USERS = int(os.getenv("HISTORY_CACHE_MAX_USERS", "5000"))
+
+# Хранилище данных: supabase (PostgREST), sqlite (локальная база)
+# или replica (Supabase с локальной SQLite-репликой для чтения)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+
+# Локальная реплика Supabase
+REPLICA_SYNC_INTERVAL = float(os.getenv("REPLICA_SYNC_INTERVAL", "30"))  # секунд между синхронизациями
+REPLICA_SYNC_BATCH = int(os.getenv("REPLICA_SYNC_BATCH", "1000"))  # строк на страницу синхронизации
+REPLICA_USERS_MAX_AGE = float(os.getenv("REPLICA_USERS_MAX_AGE", "120"))  # секунд, допустимая устарелость
+REPLICA_PREDICTIONS_MAX_AGE = float(os.getenv("REPLICA_PREDICTIONS_MAX_AGE", "300"))
+
+# Локальная SQLite-база
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "tarot_bot.db")
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))  # подготовленных выражений на соединение
+
 # Настройки
 SUBSCRIPTION_PRICE = 199
 FREE_PREDICTIONS_LIMIT = 2
@@ -4,46 +4,94 @@ import json
 import logging
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from config import ADMIN_IDS
+from config import ADMIN_IDS, BROADCAST_CHUNK_SIZE, PROMO_INSERT_CHUNK, HISTORY_PAGE_SIZE
+from supabase_transport import ACCEPT_ENCODING, get_transport
+from user_cache import UserCache
 
 # Загружаем переменные окружения
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Счетчики, которые возвращает rpc/admin_stats
+ADMIN_STATS_FIELDS = (
+    'total_users', 'premium_users', 'active_subscriptions', 'total_predictions',
+    'predictions_sum', 'total_income', 'open_tickets',
+    'promo_total', 'promo_active', 'promo_used', 'promo_uses'
+)
+
+# Причины отказа rpc/redeem_promo
+PROMO_REDEEM_ERRORS = {
+    'not_found': 'промокод не найден',
+    'inactive': 'промокод не активен',
+    'expired': 'срок действия истек',
+    'exhausted': 'достигнут лимит использований',
+    'no_user': 'пользователь не найден',
+    'already_used': 'пользователь уже активировал этот код'
+}
+
+# Пакетная вставка промокодов: уже существующие коды пропускаются, в ответе только вставленные
+PROMO_BATCH_HEADERS = {'Prefer': 'resolution=ignore-duplicates,return=representation'}
+
+# Создание пользователя: если telegram_id уже есть, запись не меняется и ответ пустой
+USER_UPSERT_HEADERS = {'Prefer': 'resolution=ignore-duplicates,return=representation'}
+
+# Колонки, которые читают экраны бота: остальные поля PostgREST не отдает.
+# Строки users, попадающие в users_cache, по-прежнему читаются целиком
+PREDICTION_HISTORY_COLUMNS = 'id,prediction_type,user_name,partner_name,birth_date,zodiac_sign,cards_drawn,created_at'
+USER_LIST_COLUMNS = (
+    'id,telegram_id,username,first_name,predictions_count,total_spent,'
+    'subscription_type,subscription_end,created_at'
+)
+TICKET_LIST_COLUMNS = 'id,user_id,user_name,message,status,created_at'
+TICKET_MESSAGE_COLUMNS = 'id,user_name,message,is_admin,created_at'
+PROMO_LIST_COLUMNS = 'id,code,days,max_uses,used_count,is_active,description,created_at'
+
+# Записи, тело ответа на которые не читается: PostgREST отвечает без строк
+RETURN_MINIMAL_HEADERS = {'Prefer': 'return=minimal'}
+
 
 class DatabaseManager:
-    def __init__(self):
-        self.supabase_url = f"https://{os.getenv('SUPABASE_URL')}/rest/v1"
+    def __init__(self, base_url: str = None):
+        self.supabase_url = base_url or f"https://{os.getenv('SUPABASE_URL')}/rest/v1"
         self.headers = {
             'apikey': os.getenv('SUPABASE_KEY'),
             'Authorization': f"Bearer {os.getenv('SUPABASE_KEY')}",
             'Content-Type': 'application/json',
+            'Accept-Encoding': ACCEPT_ENCODING,
             'Prefer': 'return=representation'
         }
 
-        # Кэш для пользователей
-        self.users_cache = {}
+        # Общий пул keep-alive соединений
+        self.transport = get_transport()
+
+        # Подписчики на события записи (см. add_listener)
+        self.listeners = []
+
+        # Кэш записей пользователей с TTL и LRU
+        self.users_cache = UserCache()
 
         logger.info("✅ Supabase REST API клиент инициализирован")
 
-    def _make_request(self, endpoint, method='GET', data=None, params=None):
+    def _make_request(self, endpoint, method='GET', data=None, params=None, headers=None):
         """Универсальный метод для выполнения запросов"""
         url = f"{self.supabase_url}/{endpoint}"
+        headers = {**self.headers, **headers} if headers else self.headers
 
         try:
             if method == 'GET':
-                response = requests.get(url, headers=self.headers, params=params, timeout=10)
+                response = self.transport.get(url, headers=headers, params=params)
             elif method == 'POST':
-                response = requests.post(url, headers=self.headers, json=data, timeout=10)
+                response = self.transport.post(url, headers=headers, params=params, json=data)
             elif method == 'PATCH':
-                response = requests.patch(url, headers=self.headers, json=data, timeout=10)
+                response = self.transport.patch(url, headers=headers, json=data)
             elif method == 'DELETE':
-                response = requests.delete(url, headers=self.headers, timeout=10)
+                response = self.transport.delete(url, headers=headers)
             else:
                 raise ValueError(f"Неизвестный метод: {method}")
 
-            if response.status_code in [200, 201]:
+            # 204 - запись с Prefer: return=minimal
+            if response.status_code in [200, 201, 204]:
                 return response.json() if response.content else True
             else:
                 logger.error(f"❌ HTTP {response.status_code}: {response.text}")
@@ -56,6 +104,10 @@ class DatabaseManager:
             logger.error(f"❌ Ошибка запроса к {endpoint}: {e}")
             return None
 
+    def get_transport_stats(self):
+        """Счетчики переиспользования соединений к Supabase"""
+        return self.transport.get_stats()
+
     def _parse_supabase_date(self, date_string):
         """Парсит дату из Supabase в datetime объект"""
         if not date_string:
@@ -135,24 +187,10 @@ class DatabaseManager:
             logger.error(f"❌ Ошибка проверки подписки: {e}")
             return False
 
-    def get_or_create_user(self, telegram_user):
-        """Получить или создать пользователя"""
-        # Проверяем кэш
-        cache_key = str(telegram_user.id)
-        if cache_key in self.users_cache:
-            return self.users_cache[cache_key]
-
-        # Ищем существующего пользователя
-        users = self._make_request('users', params={'telegram_id': f'eq.{telegram_user.id}'})
-
-        if users and len(users) > 0:
-            user = users[0]
-            logger.info(f"✅ Пользователь найден: {user['first_name']}")
-            self.users_cache[cache_key] = user
-            return user
-
-        # Создаем нового пользователя
-        user_data = {
+    # ПОСТРОЕНИЕ ДАННЫХ ДЛЯ ЗАПРОСОВ (общие для синхронного и асинхронного клиента)
+    def _build_new_user_data(self, telegram_user):
+        """Данные для создания нового пользователя"""
+        return {
             'telegram_id': telegram_user.id,
             'username': telegram_user.username or '',
             'first_name': telegram_user.first_name or '',
@@ -165,59 +203,447 @@ class DatabaseManager:
             'created_at': datetime.utcnow().isoformat() + 'Z'
         }
 
-        new_user = self._make_request('users', method='POST', data=user_data)
+    def _parse_session(self, result):
+        """Ответ rpc/session_bootstrap как {'user': запись, 'stats': статистика в формате _build_user_stats}"""
+        if not isinstance(result, dict) or not result.get('user'):
+            return None
+
+        user = result['user']
+        remaining = result.get('remaining_predictions')
+        return {
+            'user': user,
+            'stats': {
+                'predictions_count': user['predictions_count'],
+                'remaining_predictions': float('inf') if remaining is None else remaining,
+                'has_subscription': bool(result.get('has_subscription')),
+                'subscription_type': user.get('subscription_type', 'free'),
+                'subscription_end': result.get('subscription_end') or "неизвестно",
+                'total_spent': user.get('total_spent', 0)
+            }
+        }
+
+    def _build_user_upsert_params(self):
+        """Параметры идемпотентного создания пользователя: конфликт по telegram_id"""
+        return {'on_conflict': 'telegram_id'}
+
+    def _build_user_stats(self, user_data):
+        """Собирает статистику из записи пользователя"""
+        from config import FREE_PREDICTIONS_LIMIT
+
+        # Проверяем активна ли подписка
+        has_subscription = self._is_subscription_active(user_data)
+
+        remaining_predictions = (
+            float('inf') if has_subscription
+            else max(0, FREE_PREDICTIONS_LIMIT - user_data['predictions_count'])
+        )
+
+        # Форматируем дату для красивого отображения
+        subscription_end = user_data.get('subscription_end')
+        subscription_end_formatted = "неизвестно"
+
+        if subscription_end:
+            try:
+                end_date = self._parse_supabase_date(subscription_end)
+                if end_date:
+                    subscription_end_formatted = end_date.strftime('%d.%m.%Y')
+                else:
+                    subscription_end_formatted = "ошибка даты"
+            except Exception as e:
+                logger.error(f"❌ Ошибка форматирования даты: {e}")
+                subscription_end_formatted = "ошибка"
+
+        return {
+            'predictions_count': user_data['predictions_count'],
+            'remaining_predictions': remaining_predictions,
+            'has_subscription': has_subscription,
+            'subscription_type': user_data.get('subscription_type', 'free'),
+            'subscription_end': subscription_end_formatted,
+            'total_spent': user_data.get('total_spent', 0)
+        }
+
+    def _build_prediction_data(self, user_id: int, prediction_type: str, user_name: str, partner_name: str,
+                               birth_date: str, zodiac_sign: str, cards: list, prediction: str):
+        """Данные для записи предсказания"""
+        return {
+            'user_id': user_id,
+            'prediction_type': prediction_type,
+            'user_name': user_name,
+            'partner_name': partner_name or '',
+            'birth_date': birth_date,
+            'zodiac_sign': zodiac_sign,
+            'cards_drawn': json.dumps(cards, ensure_ascii=False),
+            'prediction_text': prediction,
+            'is_ai_generated': True,
+            'created_at': datetime.utcnow().isoformat() + 'Z'
+        }
+
+    def _format_predictions(self, predictions):
+        """Преобразует записи предсказаний для отображения"""
+        result = []
+        for pred in predictions:
+            result.append({
+                'id': pred['id'],
+                'prediction_type': pred['prediction_type'],
+                'user_name': pred['user_name'],
+                'partner_name': pred['partner_name'],
+                'birth_date': pred['birth_date'],
+                'zodiac_sign': pred['zodiac_sign'],
+                'cards_drawn': json.loads(pred['cards_drawn']),
+                'prediction_text': pred.get('prediction_text'),
+                'created_at': pred['created_at']
+            })
+
+        return result
+
+    def _build_history_params(self, telegram_id: int, limit: int, before: tuple = None, after: tuple = None):
+        """Параметры страницы истории: предсказания с users!inner() по users.telegram_id одним запросом.
+
+        before и after - курсор (created_at, id) крайней записи соседней страницы:
+        before листает к старым записям, after - к новым. Берется limit + 1 строка,
+        чтобы узнать, есть ли записи дальше.
+        """
+        params = {
+            'select': f'{PREDICTION_HISTORY_COLUMNS},users!inner()',
+            'users.telegram_id': f'eq.{telegram_id}',
+            'order': 'created_at.desc,id.desc',
+            'limit': str(limit + 1)
+        }
+
+        cursor, operator = (after, 'gt') if after else (before, 'lt')
+        if cursor:
+            created_at, prediction_id = cursor
+            # (created_at, id) < курсора; граница по created_at держит запрос в индексе (user_id, created_at, id)
+            params['created_at'] = f'{operator}e."{created_at}"'
+            params['or'] = f'(created_at.{operator}."{created_at}",id.{operator}.{prediction_id})'
+            if after:
+                params['order'] = 'created_at.asc,id.asc'
+        return params
+
+    def _parse_history_page(self, rows, limit: int, before: tuple = None, after: tuple = None):
+        """Страница истории от новых к старым и курсоры соседних страниц (None - страницы нет)"""
+        rows = list(rows or [])
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if after:
+            rows.reverse()
+
+        has_older = more if not after else True
+        has_newer = more if after else before is not None
+        return {
+            'predictions': self._format_predictions(rows),
+            'older': (rows[-1]['created_at'], rows[-1]['id']) if rows and has_older else None,
+            'newer': (rows[0]['created_at'], rows[0]['id']) if rows and has_newer else None
+        }
+
+    def _build_subscription_update(self, subscription_type: str, days: int):
+        """Данные для активации подписки и дата ее окончания"""
+        subscription_start = datetime.utcnow()
+        subscription_end = subscription_start + timedelta(days=days)
+
+        update_data = {
+            'subscription_type': subscription_type,
+            'subscription_start': subscription_start.isoformat() + 'Z',
+            'subscription_end': subscription_end.isoformat() + 'Z',
+            'is_active': True,
+            'updated_at': datetime.utcnow().isoformat() + 'Z'
+        }
+
+        return update_data, subscription_end
+
+    def _build_payment_data(self, user_id: int, amount: float, payment_system: str, payment_id: str,
+                            subscription_type: str, subscription_days: int):
+        """Данные для записи платежа"""
+        return {
+            'user_id': user_id,
+            'amount': amount,
+            'currency': 'RUB',
+            'payment_system': payment_system,
+            'payment_id': payment_id,
+            'status': 'completed',
+            'subscription_type': subscription_type,
+            'subscription_days': subscription_days,
+            'created_at': datetime.utcnow().isoformat() + 'Z',
+            'completed_at': datetime.utcnow().isoformat() + 'Z'
+        }
+
+    def _build_users_list_params(self, limit: int, offset: int):
+        """Параметры для постраничного списка пользователей"""
+        return {
+            'select': USER_LIST_COLUMNS,
+            'order': 'created_at.desc',
+            'limit': str(limit),
+            'offset': str(offset)
+        }
+
+    def _parse_content_range_count(self, content_range: str):
+        """Достает общее количество записей из заголовка Content-Range"""
+        count = (content_range or '').split('/')
+        if len(count) > 1 and count[1].isdigit():
+            return int(count[1])
+        return 0
+
+    def _build_subscription_filter(self, subscription_type: str = None):
+        """Параметры для выборки пользователей с подпиской"""
+        params = {'select': USER_LIST_COLUMNS, 'order': 'subscription_end.desc'}
+        if subscription_type:
+            params['subscription_type'] = f'eq.{subscription_type}'
+        else:
+            params['subscription_type'] = 'neq.free'
+        return params
+
+    def add_listener(self, callback):
+        """Подписывает callback(event, **data) на события записи бота.
+
+        События: user_created, prediction_saved, subscription_activated,
+        payment_created, promo_created, promo_used, promo_deactivated,
+        ticket_created, ticket_status_changed.
+        """
+        self.listeners.append(callback)
+
+    def _emit(self, event: str, **data):
+        for callback in self.listeners:
+            try:
+                callback(event, **data)
+            except Exception as e:
+                logger.error(f"❌ Ошибка обработчика события {event}: {e}")
+
+    def _parse_admin_stats(self, result):
+        """Приводит ответ rpc/admin_stats к словарю счетчиков"""
+        if not isinstance(result, dict):
+            return None
+        stats = {field: result.get(field) or 0 for field in ADMIN_STATS_FIELDS}
+        stats['predictions_by_day'] = dict(result.get('predictions_by_day') or {})
+        return stats
+
+    def _build_recipient_filter(self, target: str):
+        """Фильтр получателей рассылки: premium, free или все"""
+        if target == 'premium':
+            return {'subscription_type': 'neq.free'}
+        if target == 'free':
+            return {'or': '(subscription_type.eq.free,subscription_type.is.null)'}
+        return {}
+
+    def _build_recipients_page_params(self, target: str, after_id: int, limit: int):
+        """Страница получателей рассылки после users.id = after_id (keyset-пагинация)"""
+        params = self._build_recipient_filter(target)
+        params.update({
+            'select': 'id,telegram_id',
+            'id': f'gt.{after_id}',
+            'order': 'id.asc',
+            'limit': str(limit)
+        })
+        return params
+
+    def _build_search_params(self, query: str):
+        """Параметры для поиска пользователей по имени и username"""
+        return {
+            'select': USER_LIST_COLUMNS,
+            'or': f'(first_name.ilike.%{query}%,username.ilike.%{query}%)',
+            'order': 'created_at.desc'
+        }
+
+    def _build_ticket_data(self, user_id: int, user_name: str, message: str, message_type: str):
+        """Данные для создания тикета"""
+        return {
+            'user_id': user_id,
+            'user_name': user_name,
+            'message': message,
+            'message_type': message_type,
+            'status': 'open',
+            'created_at': datetime.utcnow().isoformat() + 'Z'
+        }
+
+    def _build_admin_user_data(self, user_id: int, user_name: str):
+        """Данные для служебной записи админа в users"""
+        return {
+            'telegram_id': user_id,
+            'username': f'admin_{user_id}',
+            'first_name': user_name,
+            'last_name': 'Admin',
+            'language_code': 'ru',
+            'subscription_type': 'admin',
+            'is_active': True,
+            'created_at': datetime.utcnow().isoformat() + 'Z'
+        }
+
+    def _build_support_message_data(self, ticket_id: int, user_id: int, user_name: str, message: str,
+                                    is_admin: bool):
+        """Данные для сообщения в тикете"""
+        return {
+            'ticket_id': ticket_id,
+            'user_id': user_id,  # Используем ID из таблицы users
+            'user_name': user_name,
+            'message': message,
+            'is_admin': is_admin,
+            'created_at': datetime.utcnow().isoformat() + 'Z'
+        }
+
+    def _build_tickets_params(self, status: str = None, user_id: int = None):
+        """Параметры для выборки тикетов"""
+        params = {'select': TICKET_LIST_COLUMNS}
+        if status:
+            params['status'] = f'eq.{status}'
+        if user_id:
+            params['user_id'] = f'eq.{user_id}'
+        params['order'] = 'created_at.desc'
+        return params
+
+    def _build_ticket_status_update(self, status: str):
+        """Данные для смены статуса тикета"""
+        update_data = {
+            'status': status,
+            'updated_at': datetime.utcnow().isoformat() + 'Z'
+        }
+
+        if status == 'closed':
+            update_data['closed_at'] = datetime.utcnow().isoformat() + 'Z'
+
+        return update_data
+
+    def _build_promo_data(self, code: str, days: int, max_uses: int, created_by: int,
+                          description: str, subscription_type: str):
+        """Данные для создания промокода"""
+        return {
+            'code': code.upper(),
+            'subscription_type': subscription_type,
+            'days': days,
+            'max_uses': max_uses,
+            'used_count': 0,
+            'is_active': True,
+            'created_by': str(created_by),  # Конвертируем в строку для безопасности
+            'description': description,
+            'created_at': datetime.utcnow().isoformat() + 'Z'
+        }
+
+    def _build_promo_batch_params(self):
+        """Параметры пакетной вставки промокодов: конфликт по code, в ответе только code"""
+        return {'on_conflict': 'code', 'select': 'code'}
+
+    def _build_promo_index_params(self, updated_since, after_id: int, limit: int):
+        """Страница промокодов для локального индекса после promo_codes.id = after_id"""
+        params = {
+            'select': 'id,code,is_active,created_at,updated_at',
+            'id': f'gt.{after_id}',
+            'order': 'id.asc',
+            'limit': str(limit)
+        }
+        if updated_since is None:
+            params['is_active'] = 'eq.true'
+        else:
+            params['updated_at'] = f'gte.{updated_since}'
+        return params
+
+    def _apply_redeem_result(self, telegram_id: int, code: str, result) -> bool:
+        """Разбирает ответ rpc/redeem_promo: кладет пользователя в кэш или логирует причину отказа"""
+        if not isinstance(result, dict):
+            logger.error(f"❌ Не удалось активировать промокод {code} для пользователя {telegram_id}")
+            return False
+
+        status = result.get('status')
+        if status != 'ok':
+            logger.error(f"❌ Промокод {code} не активирован для {telegram_id}: {PROMO_REDEEM_ERRORS.get(status, status)}")
+            return False
+
+        self.users_cache.put(result['user'], write_through=True)
+        logger.info(f"✅ Промокод {code} активирован для {telegram_id} до {result['user']['subscription_end']}")
+        return True
+
+    def _apply_user_update(self, telegram_id: int, update_data: dict, result):
+        """Write-through: переносит результат успешного PATCH в кэш пользователей"""
+        if isinstance(result, list) and result:
+            self.users_cache.put(result[0], write_through=True)
+        elif result:
+            self.users_cache.update(telegram_id, update_data)
+
+    def _build_rpc_row_params(self, telegram_id: int, row: dict):
+        """Аргументы RPC record_prediction/record_payment: строка для вставки без user_id"""
+        row = {key: value for key, value in row.items() if key != 'user_id'}
+        return {'p_telegram_id': telegram_id, 'p_row': row}
+
+    def _build_queued_prediction(self, telegram_id: int, prediction_data: dict):
+        """Строка для пакетной RPC record_predictions"""
+        row = {key: value for key, value in prediction_data.items() if key != 'user_id'}
+        row['telegram_id'] = telegram_id
+        return row
+
+    def _apply_rpc_user(self, telegram_id: int, result) -> bool:
+        """Кладет в кэш запись пользователя, которую вернула RPC после инкремента"""
+        if isinstance(result, list) and result:
+            self.users_cache.put(result[0], write_through=True)
+            return True
+
+        if result is not None:
+            logger.error(f"❌ Пользователь {telegram_id} не найден")
+        return False
+
+    def get_user_cache_stats(self):
+        """Счетчики кэша пользователей"""
+        return self.users_cache.get_stats()
+
+    def _build_promo_stats(self, promos):
+        """Считает статистику по списку промокодов"""
+        return {
+            'total_codes': len(promos),
+            'active_codes': sum(1 for p in promos if p['is_active']),
+            'used_codes': sum(1 for p in promos if p['used_count'] > 0),
+            'total_uses': sum(p['used_count'] for p in promos)
+        }
+
+    def get_or_create_user(self, telegram_user):
+        """Получить или создать пользователя.
+
+        При промахе кэша пользователь создается одним POST с on_conflict=telegram_id:
+        новый пользователь возвращается сразу, а конфликт с существующим или
+        создаваемым параллельно не дает ошибки уникальности. Пустой ответ значит,
+        что запись уже есть, и тогда она читается обычным GET.
+        """
+        user = self.users_cache.get(telegram_user.id)
+        if user:
+            return user
+
+        new_user = self._make_request(
+            'users', method='POST', data=self._build_new_user_data(telegram_user),
+            params=self._build_user_upsert_params(), headers=USER_UPSERT_HEADERS
+        )
 
         if new_user and len(new_user) > 0:
             user = new_user[0]
             logger.info(f"✅ Создан новый пользователь: {user['first_name']}")
-            self.users_cache[cache_key] = user
+            self.users_cache.put(user)
+            return user
+
+        user = self.get_user_by_telegram_id(telegram_user.id)
+        if user is None:
+            logger.error(f"❌ Не удалось создать пользователя для {telegram_user.id}")
+        return user
+
+    def get_session(self, telegram_user):
+        """Пользователь и его статистика: {'user': запись, 'stats': статистика} (см. AsyncDatabaseManager.get_session)"""
+        user = self.get_or_create_user(telegram_user)
+        return {'user': user, 'stats': self._build_user_stats(user)} if user else None
+
+    def get_user_by_telegram_id(self, telegram_id: int):
+        """Получить запись пользователя по Telegram ID (через кэш)"""
+        user = self.users_cache.get(telegram_id)
+        if user:
             return user
 
-        logger.error(f"❌ Не удалось создать пользователя для {telegram_user.id}")
+        users = self._make_request('users', params={'telegram_id': f'eq.{telegram_id}'})
+        if users and len(users) > 0:
+            self.users_cache.put(users[0])
+            return users[0]
+
         return None
 
     def get_user_stats(self, telegram_id: int):
         """Получить статистику пользователя"""
         try:
-            user = self._make_request('users', params={'telegram_id': f'eq.{telegram_id}'})
-            if not user or len(user) == 0:
+            user = self.get_user_by_telegram_id(telegram_id)
+            if not user:
                 return None
 
-            user_data = user[0]
-
-            from config import FREE_PREDICTIONS_LIMIT
-
-            # Проверяем активна ли подписка
-            has_subscription = self._is_subscription_active(user_data)
-
-            remaining_predictions = (
-                float('inf') if has_subscription
-                else max(0, FREE_PREDICTIONS_LIMIT - user_data['predictions_count'])
-            )
-
-            # Форматируем дату для красивого отображения
-            subscription_end = user_data.get('subscription_end')
-            subscription_end_formatted = "неизвестно"
-
-            if subscription_end:
-                try:
-                    end_date = self._parse_supabase_date(subscription_end)
-                    if end_date:
-                        subscription_end_formatted = end_date.strftime('%d.%m.%Y')
-                    else:
-                        subscription_end_formatted = "ошибка даты"
-                except Exception as e:
-                    logger.error(f"❌ Ошибка форматирования даты: {e}")
-                    subscription_end_formatted = "ошибка"
-
-            return {
-                'predictions_count': user_data['predictions_count'],
-                'remaining_predictions': remaining_predictions,
-                'has_subscription': has_subscription,
-                'subscription_type': user_data.get('subscription_type', 'free'),
-                'subscription_end': subscription_end_formatted,
-                'total_spent': user_data.get('total_spent', 0)
-            }
+            return self._build_user_stats(user)
 
         except Exception as e:
             logger.error(f"❌ Ошибка получения статистики: {e}")
@@ -228,48 +654,16 @@ class DatabaseManager:
                         cards: list, prediction: str) -> bool:
         """Сохранить предсказание"""
         try:
-            # Получаем пользователя
-            user = self._make_request('users', params={'telegram_id': f'eq.{telegram_id}'})
-            if not user or len(user) == 0:
-                logger.error(f"❌ Пользователь {telegram_id} не найден")
-                return False
-
-            user_id = user[0]['id']
-
-            # Создаем предсказание
-            prediction_data = {
-                'user_id': user_id,
-                'prediction_type': prediction_type,
-                'user_name': user_name,
-                'partner_name': partner_name or '',
-                'birth_date': birth_date,
-                'zodiac_sign': zodiac_sign,
-                'cards_drawn': json.dumps(cards, ensure_ascii=False),
-                'prediction_text': prediction,
-                'is_ai_generated': True,
-                'created_at': datetime.utcnow().isoformat() + 'Z'
-            }
-
-            result = self._make_request('predictions', method='POST', data=prediction_data)
-
-            if result:
-                # Обновляем счетчик предсказаний пользователя
-                update_data = {
-                    'predictions_count': user[0]['predictions_count'] + 1,
-                    'updated_at': datetime.utcnow().isoformat() + 'Z'
-                }
-
-                self._make_request(
-                    f'users?id=eq.{user_id}',
-                    method='PATCH',
-                    data=update_data
-                )
+            prediction_data = self._build_prediction_data(
+                None, prediction_type, user_name, partner_name, birth_date, zodiac_sign, cards, prediction
+            )
 
-                # Обновляем кэш
-                cache_key = str(telegram_id)
-                if cache_key in self.users_cache:
-                    self.users_cache[cache_key]['predictions_count'] += 1
+            # Вставка предсказания и инкремент predictions_count одним атомарным запросом
+            result = self._make_request(
+                'rpc/record_prediction', method='POST', data=self._build_rpc_row_params(telegram_id, prediction_data)
+            )
 
+            if self._apply_rpc_user(telegram_id, result):
                 logger.info(f"✅ Предсказание сохранено для пользователя {telegram_id}")
                 return True
 
@@ -281,47 +675,20 @@ class DatabaseManager:
 
     def get_user_predictions(self, telegram_id: int, limit: int = 5):
         """Получить историю предсказаний"""
-        try:
-            # Получаем пользователя
-            user = self._make_request('users', params={'telegram_id': f'eq.{telegram_id}'})
-            if not user or len(user) == 0:
-                return []
+        return self.get_prediction_history(telegram_id, limit)['predictions']
 
-            user_id = user[0]['id']
-
-            # Получаем предсказания
+    def get_prediction_history(self, telegram_id: int, limit: int = HISTORY_PAGE_SIZE,
+                               before: tuple = None, after: tuple = None):
+        """Страница истории предсказаний (см. _build_history_params): {'predictions', 'older', 'newer'}"""
+        try:
             predictions = self._make_request(
-                'predictions',
-                params={
-                    'user_id': f'eq.{user_id}',
-                    'order': 'created_at.desc',
-                    'limit': str(limit)
-                }
+                'predictions', params=self._build_history_params(telegram_id, limit, before, after)
             )
-
-            if not predictions:
-                return []
-
-            # Преобразуем данные
-            result = []
-            for pred in predictions:
-                result.append({
-                    'id': pred['id'],
-                    'prediction_type': pred['prediction_type'],
-                    'user_name': pred['user_name'],
-                    'partner_name': pred['partner_name'],
-                    'birth_date': pred['birth_date'],
-                    'zodiac_sign': pred['zodiac_sign'],
-                    'cards_drawn': json.loads(pred['cards_drawn']),
-                    'prediction_text': pred['prediction_text'],
-                    'created_at': pred['created_at']
-                })
-
-            return result
+            return self._parse_history_page(predictions, limit, before, after)
 
         except Exception as e:
             logger.error(f"❌ Ошибка получения истории: {e}")
-            return []
+            return self._parse_history_page([], limit)
 
     def can_user_make_prediction(self, telegram_id: int) -> bool:
         """Проверить может ли пользователь сделать предсказание"""
@@ -336,23 +703,14 @@ class DatabaseManager:
         try:
             logger.info(f"🔧 Активация подписки: user={telegram_id}, type={subscription_type}, days={days}")
 
-            user = self._make_request('users', params={'telegram_id': f'eq.{telegram_id}'})
-            if not user or len(user) == 0:
+            user = self.get_user_by_telegram_id(telegram_id)
+            if not user:
                 logger.error(f"❌ Пользователь {telegram_id} не найден")
                 return False
 
-            user_id = user[0]['id']
+            user_id = user['id']
 
-            subscription_start = datetime.utcnow()
-            subscription_end = subscription_start + timedelta(days=days)
-
-            update_data = {
-                'subscription_type': subscription_type,
-                'subscription_start': subscription_start.isoformat() + 'Z',
-                'subscription_end': subscription_end.isoformat() + 'Z',
-                'is_active': True,
-                'updated_at': datetime.utcnow().isoformat() + 'Z'
-            }
+            update_data, subscription_end = self._build_subscription_update(subscription_type, days)
 
             result = self._make_request(f'users?id=eq.{user_id}', method='PATCH', data=update_data)
 
@@ -360,9 +718,7 @@ class DatabaseManager:
                 logger.info(f"✅ Подписка успешно активирована для {telegram_id} до {subscription_end}")
 
                 # Обновляем кэш
-                cache_key = str(telegram_id)
-                if cache_key in self.users_cache:
-                    self.users_cache[cache_key].update(update_data)
+                self._apply_user_update(telegram_id, update_data, result)
 
                 return True
             else:
@@ -377,36 +733,16 @@ class DatabaseManager:
                        payment_id: str, subscription_type: str, subscription_days: int) -> bool:
         """Создать запись о платеже"""
         try:
-            user = self._make_request('users', params={'telegram_id': f'eq.{telegram_id}'})
-            if not user or len(user) == 0:
-                return False
-
-            user_id = user[0]['id']
-
-            payment_data = {
-                'user_id': user_id,
-                'amount': amount,
-                'currency': 'RUB',
-                'payment_system': payment_system,
-                'payment_id': payment_id,
-                'status': 'completed',
-                'subscription_type': subscription_type,
-                'subscription_days': subscription_days,
-                'created_at': datetime.utcnow().isoformat() + 'Z',
-                'completed_at': datetime.utcnow().isoformat() + 'Z'
-            }
-
-            result = self._make_request('payments', method='POST', data=payment_data)
-
-            if result:
-                # Обновляем total_spent пользователя
-                update_data = {
-                    'total_spent': user[0].get('total_spent', 0) + amount,
-                    'updated_at': datetime.utcnow().isoformat() + 'Z'
-                }
+            payment_data = self._build_payment_data(
+                None, amount, payment_system, payment_id, subscription_type, subscription_days
+            )
 
-                self._make_request(f'users?id=eq.{user_id}', method='PATCH', data=update_data)
+            # Вставка платежа и увеличение total_spent одним атомарным запросом
+            result = self._make_request(
+                'rpc/record_payment', method='POST', data=self._build_rpc_row_params(telegram_id, payment_data)
+            )
 
+            if self._apply_rpc_user(telegram_id, result):
                 logger.info(f"✅ Платеж сохранен для {telegram_id}")
                 return True
 
@@ -420,13 +756,7 @@ class DatabaseManager:
     def get_all_users(self, limit: int = 100, offset: int = 0):
         """Получить список всех пользователей"""
         try:
-            params = {
-                'order': 'created_at.desc',
-                'limit': str(limit),
-                'offset': str(offset)
-            }
-
-            users = self._make_request('users', params=params)
+            users = self._make_request('users', params=self._build_users_list_params(limit, offset))
             return users or []
 
         except Exception as e:
@@ -441,28 +771,72 @@ class DatabaseManager:
             headers['Prefer'] = 'count=exact'
 
             url = f"{self.supabase_url}/users"
-            response = requests.get(url, headers=headers, params={'limit': '1'})
+            response = self.transport.get(url, headers=headers, params={'select': 'id', 'limit': '0'})
 
             if response.status_code == 200:
-                count = response.headers.get('content-range', '').split('/')
-                if len(count) > 1:
-                    return int(count[1])
+                return self._parse_content_range_count(response.headers.get('content-range', ''))
             return 0
 
         except Exception as e:
             logger.error(f"❌ Ошибка получения количества пользователей: {e}")
             return 0
 
+    def get_admin_stats(self):
+        """Счетчики для админ-панели одним запросом rpc/admin_stats.
+
+        Все агрегаты считает база, поэтому ответ занимает несколько десятков
+        байт при любом размере таблиц.
+        """
+        try:
+            return self._parse_admin_stats(self._make_request('rpc/admin_stats', method='POST', data={}))
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения статистики: {e}")
+            return None
+
+    def count_broadcast_recipients(self, target: str):
+        """Количество получателей рассылки"""
+        try:
+            headers = self.headers.copy()
+            headers['Prefer'] = 'count=exact'
+
+            params = self._build_recipient_filter(target)
+            params.update({'select': 'id', 'limit': '0'})
+
+            url = f"{self.supabase_url}/users"
+            response = self.transport.get(url, headers=headers, params=params)
+
+            if response.status_code == 200:
+                return self._parse_content_range_count(response.headers.get('content-range', ''))
+            return 0
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка подсчета получателей рассылки: {e}")
+            return 0
+
+    def iter_broadcast_recipients(self, target: str, after_id: int = 0, chunk_size: int = BROADCAST_CHUNK_SIZE):
+        """Получатели рассылки пачками [{'id', 'telegram_id'}, ...] в порядке users.id.
+
+        Каждая страница запрашивается по условию id > последнего id, поэтому
+        стоимость запроса не растет с номером страницы, а в памяти держится
+        только одна пачка.
+        """
+        while True:
+            users = self._make_request('users', params=self._build_recipients_page_params(target, after_id, chunk_size))
+            if users is None:
+                raise ConnectionError(f"Не удалось загрузить получателей после id={after_id}")
+            if not users:
+                return
+
+            yield users
+            if len(users) < chunk_size:
+                return
+            after_id = users[-1]['id']
+
     def get_users_with_subscription(self, subscription_type: str = None):
         """Получить пользователей с подпиской"""
         try:
-            params = {'order': 'subscription_end.desc'}
-            if subscription_type:
-                params['subscription_type'] = f'eq.{subscription_type}'
-            else:
-                params['subscription_type'] = 'neq.free'
-
-            users = self._make_request('users', params=params)
+            users = self._make_request('users', params=self._build_subscription_filter(subscription_type))
             return users or []
 
         except Exception as e:
@@ -474,17 +848,12 @@ class DatabaseManager:
         try:
             # Поиск по telegram_id если query число
             if query.isdigit():
-                users_by_id = self._make_request('users', params={'telegram_id': f'eq.{query}'})
-                if users_by_id:
-                    return users_by_id
+                user_by_id = self.get_user_by_telegram_id(int(query))
+                if user_by_id:
+                    return [user_by_id]
 
             # Поиск по имени и username
-            params = {
-                'or': f'(first_name.ilike.%{query}%,username.ilike.%{query}%)',
-                'order': 'created_at.desc'
-            }
-
-            users = self._make_request('users', params=params)
+            users = self._make_request('users', params=self._build_search_params(query))
             return users or []
 
         except Exception as e:
@@ -495,16 +864,9 @@ class DatabaseManager:
     def create_support_ticket(self, user_id: int, user_name: str, message: str, message_type: str = 'question') -> int:
         """Создать тикет поддержки"""
         try:
-            ticket_data = {
-                'user_id': user_id,
-                'user_name': user_name,
-                'message': message,
-                'message_type': message_type,
-                'status': 'open',
-                'created_at': datetime.utcnow().isoformat() + 'Z'
-            }
+            ticket_data = self._build_ticket_data(user_id, user_name, message, message_type)
 
-            result = self._make_request('support_tickets', method='POST', data=ticket_data)
+            result = self._make_request('support_tickets', method='POST', data=ticket_data, params={'select': 'id'})
 
             if result and len(result) > 0:
                 ticket_id = result[0]['id']
@@ -523,40 +885,27 @@ class DatabaseManager:
             # Для админов нужно найти или создать запись пользователя в таблице users
             if is_admin:
                 # Получаем пользователя по telegram_id (user_id в этом случае - telegram_id админа)
-                admin_user = self._make_request('users', params={'telegram_id': f'eq.{user_id}'})
-                if not admin_user or len(admin_user) == 0:
+                admin_user = self.get_user_by_telegram_id(user_id)
+                if not admin_user:
                     # Создаем временную запись админа в users если не существует
-                    admin_data = {
-                        'telegram_id': user_id,
-                        'username': f'admin_{user_id}',
-                        'first_name': user_name,
-                        'last_name': 'Admin',
-                        'language_code': 'ru',
-                        'subscription_type': 'admin',
-                        'is_active': True,
-                        'created_at': datetime.utcnow().isoformat() + 'Z'
-                    }
+                    admin_data = self._build_admin_user_data(user_id, user_name)
                     admin_user = self._make_request('users', method='POST', data=admin_data)
                     if admin_user and len(admin_user) > 0:
                         actual_user_id = admin_user[0]['id']
+                        self.users_cache.put(admin_user[0])
                     else:
                         logger.error(f"❌ Не удалось создать запись админа в users")
                         return False
                 else:
-                    actual_user_id = admin_user[0]['id']
+                    actual_user_id = admin_user['id']
             else:
                 actual_user_id = user_id  # Для обычных пользователей используем переданный user_id
 
-            message_data = {
-                'ticket_id': ticket_id,
-                'user_id': actual_user_id,  # Используем ID из таблицы users
-                'user_name': user_name,
-                'message': message,
-                'is_admin': is_admin,
-                'created_at': datetime.utcnow().isoformat() + 'Z'
-            }
+            message_data = self._build_support_message_data(ticket_id, actual_user_id, user_name, message, is_admin)
 
-            result = self._make_request('support_messages', method='POST', data=message_data)
+            result = self._make_request(
+                'support_messages', method='POST', data=message_data, headers=RETURN_MINIMAL_HEADERS
+            )
 
             if result:
                 logger.info(f"✅ Добавлено сообщение в тикет #{ticket_id}")
@@ -571,14 +920,7 @@ class DatabaseManager:
     def get_support_tickets(self, status: str = None, user_id: int = None):
         """Получить список тикетов"""
         try:
-            params = {}
-            if status:
-                params['status'] = f'eq.{status}'
-            if user_id:
-                params['user_id'] = f'eq.{user_id}'
-            params['order'] = 'created_at.desc'
-
-            tickets = self._make_request('support_tickets', params=params)
+            tickets = self._make_request('support_tickets', params=self._build_tickets_params(status, user_id))
             return tickets or []
 
         except Exception as e:
@@ -591,6 +933,7 @@ class DatabaseManager:
             messages = self._make_request(
                 'support_messages',
                 params={
+                    'select': TICKET_MESSAGE_COLUMNS,
                     'ticket_id': f'eq.{ticket_id}',
                     'order': 'created_at.asc'
                 }
@@ -604,15 +947,11 @@ class DatabaseManager:
     def update_ticket_status(self, ticket_id: int, status: str):
         """Обновить статус тикета"""
         try:
-            update_data = {
-                'status': status,
-                'updated_at': datetime.utcnow().isoformat() + 'Z'
-            }
-
-            if status == 'closed':
-                update_data['closed_at'] = datetime.utcnow().isoformat() + 'Z'
+            update_data = self._build_ticket_status_update(status)
 
-            result = self._make_request(f'support_tickets?id=eq.{ticket_id}', method='PATCH', data=update_data)
+            result = self._make_request(
+                f'support_tickets?id=eq.{ticket_id}&select=id', method='PATCH', data=update_data
+            )
 
             if result:
                 logger.info(f"✅ Статус тикета #{ticket_id} изменен на {status}")
@@ -642,19 +981,9 @@ class DatabaseManager:
                           description: str = "", subscription_type: str = "premium") -> bool:
         """Создать промокод"""
         try:
-            promo_data = {
-                'code': code.upper(),
-                'subscription_type': subscription_type,
-                'days': days,
-                'max_uses': max_uses,
-                'used_count': 0,
-                'is_active': True,
-                'created_by': str(created_by),  # Конвертируем в строку для безопасности
-                'description': description,
-                'created_at': datetime.utcnow().isoformat() + 'Z'
-            }
+            promo_data = self._build_promo_data(code, days, max_uses, created_by, description, subscription_type)
 
-            result = self._make_request('promo_codes', method='POST', data=promo_data)
+            result = self._make_request('promo_codes', method='POST', data=promo_data, headers=RETURN_MINIMAL_HEADERS)
 
             if result is None:
                 logger.error(f"❌ Не удалось создать промокод {code}")
@@ -667,6 +996,32 @@ class DatabaseManager:
             logger.error(f"❌ Ошибка создания промокода {code}: {e}")
             return False
 
+    def create_promo_codes(self, codes: dict, days: int, max_uses: int, created_by: int,
+                           subscription_type: str = "premium", chunk_size: int = PROMO_INSERT_CHUNK) -> list:
+        """Создать пачку промокодов {код: описание} массивами по chunk_size строк.
+
+        Коды, которые уже есть в базе, пропускаются. Возвращает вставленные коды
+        или None, если запрос не прошел: тогда коды этой и следующих пачек
+        не отправляются, а коды предыдущих пачек уже могли быть вставлены.
+        """
+        promos = [
+            self._build_promo_data(code, days, max_uses, created_by, description, subscription_type)
+            for code, description in codes.items()
+        ]
+        created = []
+
+        for start in range(0, len(promos), chunk_size):
+            result = self._make_request(
+                'promo_codes', method='POST', data=promos[start:start + chunk_size],
+                params=self._build_promo_batch_params(), headers=PROMO_BATCH_HEADERS
+            )
+            if not isinstance(result, list):
+                logger.error(f"❌ Не удалось создать пачку промокодов с {start + 1} по {start + chunk_size}")
+                return None
+            created.extend(row['code'] for row in result)
+
+        return created
+
     def get_promo_code(self, code: str):
         """Получить промокод по коду"""
         try:
@@ -677,71 +1032,14 @@ class DatabaseManager:
             return None
 
     def use_promo_code(self, code: str, user_id: int) -> bool:
-        """Использовать промокод"""
+        """Использовать промокод: проверка, учет и подписка одной транзакцией в rpc/redeem_promo"""
         try:
             logger.info(f"🔑 Попытка активации промокода: {code} для пользователя {user_id}")
 
-            promo = self.get_promo_code(code)
-            if not promo:
-                logger.error(f"❌ Промокод {code} не найден")
-                return False
-
-            logger.info(f"📋 Найден промокод: {promo}")
-
-            # Проверяем активность промокода
-            if not promo.get('is_active', True):
-                logger.error(f"❌ Промокод {code} не активен")
-                return False
-
-            # Проверяем лимит использований
-            used_count = promo.get('used_count', 0)
-            max_uses = promo.get('max_uses', 1)
-
-            if used_count >= max_uses:
-                logger.error(f"❌ Промокод {code} уже использован максимальное количество раз ({used_count}/{max_uses})")
-                return False
-
-            # Проверяем срок действия
-            if promo.get('expires_at'):
-                expires_date = self._parse_supabase_date(promo['expires_at'])
-                if expires_date and expires_date < datetime.utcnow():
-                    logger.error(f"❌ Срок действия промокода {code} истек")
-                    return False
-
-            # Получаем параметры подписки из промокода
-            subscription_type = promo.get('subscription_type', 'premium')
-            days = promo.get('days', 30)
-
-            logger.info(f"🎯 Активация подписки: тип={subscription_type}, дней={days}")
-
-            # Активируем подписку
-            success = self.activate_subscription(user_id, subscription_type, days)
-
-            if success:
-                logger.info(f"✅ Подписка активирована для пользователя {user_id}")
-
-                # Обновляем счетчик использований промокода
-                update_data = {
-                    'used_count': used_count + 1,
-                    'updated_at': datetime.utcnow().isoformat() + 'Z'
-                }
-
-                # Если достигли лимита, деактивируем код
-                if update_data['used_count'] >= max_uses:
-                    update_data['is_active'] = False
-                    logger.info(f"🔒 Промокод {code} деактивирован (достигнут лимит)")
-
-                update_result = self._make_request(f'promo_codes?id=eq.{promo["id"]}', method='PATCH', data=update_data)
-
-                if update_result:
-                    logger.info(f"✅ Счетчик промокода {code} обновлен")
-                else:
-                    logger.error(f"❌ Не удалось обновить счетчик промокода {code}")
-
-                return True
-            else:
-                logger.error(f"❌ Не удалось активировать подписку для пользователя {user_id}")
-                return False
+            result = self._make_request(
+                'rpc/redeem_promo', method='POST', data={'p_code': code.upper(), 'p_telegram_id': user_id}
+            )
+            return self._apply_redeem_result(user_id, code, result)
 
         except Exception as e:
             logger.error(f"❌ Критическая ошибка использования промокода {code}: {e}")
@@ -750,7 +1048,7 @@ class DatabaseManager:
     def get_all_promo_codes(self):
         """Получить все промокоды"""
         try:
-            promos = self._make_request('promo_codes', params={'order': 'created_at.desc'})
+            promos = self._make_request('promo_codes', params={'select': PROMO_LIST_COLUMNS, 'order': 'created_at.desc'})
             return promos or []
         except Exception as e:
             logger.error(f"❌ Ошибка получения промокодов: {e}")
@@ -759,11 +1057,11 @@ class DatabaseManager:
     def deactivate_promo_code(self, code_id: int) -> bool:
         """Деактивировать промокод"""
         try:
-            update_data = {
-                'is_active': False,
-                'updated_at': datetime.utcnow().isoformat() + 'Z'
-            }
-            result = self._make_request(f'promo_codes?id=eq.{code_id}', method='PATCH', data=update_data)
+            # updated_at, по которому изменения дочитывает индекс промокодов, ставит база
+            update_data = {'is_active': False}
+            result = self._make_request(
+                f'promo_codes?id=eq.{code_id}', method='PATCH', data=update_data, headers=RETURN_MINIMAL_HEADERS
+            )
             return result is not None
         except Exception as e:
             logger.error(f"❌ Ошибка деактивации промокода: {e}")
@@ -773,18 +1071,7 @@ class DatabaseManager:
         """Получить статистику по промокодам"""
         try:
             promos = self.get_all_promo_codes()
-
-            total = len(promos)
-            active = sum(1 for p in promos if p['is_active'])
-            used = sum(1 for p in promos if p['used_count'] > 0)
-            total_uses = sum(p['used_count'] for p in promos)
-
-            return {
-                'total_codes': total,
-                'active_codes': active,
-                'used_codes': used,
-                'total_uses': total_uses
-            }
+            return self._build_promo_stats(promos)
         except Exception as e:
             logger.error(f"❌ Ошибка получения статистики промокодов: {e}")
             return {
@@ -1,5 +1,5 @@
 import os
-import requests
+from supabase_transport import get_transport, format_stats
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -19,7 +19,7 @@ def debug_subscription(telegram_id):
 
     # Получаем данные пользователя
     url = f"{supabase_url}/users?telegram_id=eq.{telegram_id}"
-    response = requests.get(url, headers=headers)
+    response = get_transport().get(url, headers=headers)
 
     if response.status_code != 200 or not response.json():
         print("❌ Пользователь не найден")
@@ -128,7 +128,7 @@ def fix_subscription(telegram_id, days=30):
     }
 
     url = f"{supabase_url}/users?id=eq.{user_id}"
-    response = requests.patch(url, headers=headers, json=update_data)
+    response = get_transport().patch(url, headers=headers, json=update_data)
 
     if response.status_code == 200:
         print(f"✅ Подписка исправлена!")
@@ -163,4 +163,6 @@ if __name__ == "__main__":
                 days = int(input("Количество дней подписки (30): ") or "30")
                 fix_subscription(TARGET_USER_ID, days)
             except ValueError:
-                print("❌ Неверное количество дней")
\ No newline at end of file
+                print("❌ Неверное количество дней")
+
+    print(f"🔌 Соединения Supabase: {format_stats(get_transport().get_stats())}")
\ No newline at end of file
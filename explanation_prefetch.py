@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from config import PREFETCH_TTL, PREFETCH_MAX_USERS, PREFETCH_MAX_INFLIGHT
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать уже идущую фоновую генерацию, прежде чем начать заново
+JOIN_TIMEOUT = 35.0
+
+
+class _Prefetch:
+    __slots__ = ('key', 'task', 'text', 'tokens', 'ready_at')
+
+    def __init__(self, key, task):
+        self.key = key
+        self.task = task
+        self.text = None
+        self.tokens = 0
+        self.ready_at = None
+
+
+class ExplanationPrefetcher:
+    """Упреждающая генерация расширенного обоснования.
+
+    После выдачи предсказания подписчику обоснование генерируется в фоне и
+    хранится до ttl секунд, по одной записи на пользователя (не больше
+    max_users записей, старые вытесняются). Кнопка «Расширенное обоснование»
+    забирает готовый текст или дожидается уже идущей генерации.
+
+    Фоновые запросы не должны отнимать слоты LLM у живых запросов: генерация
+    запускается, только если в планировщике есть свободный слот, и не больше
+    max_inflight одновременно. Новое предсказание пользователя отменяет
+    незавершенную генерацию для прошлого. Невостребованные тексты считаются
+    потраченными впустую вместе с их токенами.
+    """
+
+    def __init__(self, assistant, scheduler, ttl: int = PREFETCH_TTL, max_users: int = PREFETCH_MAX_USERS,
+                 max_inflight: int = PREFETCH_MAX_INFLIGHT, clock=time.monotonic):
+        self.assistant = assistant
+        self.scheduler = scheduler
+        self.ttl = ttl
+        self.max_users = max_users
+        self.max_inflight = max_inflight
+        self._clock = clock
+
+        self._entries = OrderedDict()
+        self._inflight = 0
+
+        self.started = 0
+        self.skipped = 0
+        self.hits = 0
+        self.joined = 0
+        self.misses = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.wasted = 0
+        self.used_tokens = 0
+        self.wasted_tokens = 0
+
+    @staticmethod
+    def make_key(prediction: dict) -> tuple:
+        """Ключ расклада: обоснование подходит только к тем же картам и данным"""
+        return (prediction['prediction_type'], prediction['name'], prediction['partner_name'],
+                prediction['birth_date'], tuple(prediction['cards']))
+
+    def schedule(self, telegram_id: int, prediction: dict) -> bool:
+        """Запускает фоновую генерацию обоснования для только что выданного предсказания"""
+        self._discard(telegram_id)
+
+        if self._inflight >= self.max_inflight or self.scheduler.idle_slots() <= 1:
+            # Последний свободный слот оставляем живым запросам
+            self.skipped += 1
+            return False
+
+        entry = _Prefetch(self.make_key(prediction), None)
+        entry.task = asyncio.create_task(self._generate(telegram_id, entry, prediction))
+        entry.task.add_done_callback(self._on_done)
+        self._entries[telegram_id] = entry
+        self._inflight += 1
+        self.started += 1
+
+        while len(self._entries) > self.max_users:
+            self._discard(next(iter(self._entries)))
+        return True
+
+    async def take(self, telegram_id: int, prediction: dict):
+        """Возвращает готовое обоснование для этого расклада или None"""
+        entry = self._entries.get(telegram_id)
+        if entry is None or entry.key != self.make_key(prediction):
+            self.misses += 1
+            return None
+
+        if not entry.task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(entry.task), timeout=JOIN_TIMEOUT)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self.misses += 1
+                return None
+            if entry.text is not None:
+                self.joined += 1
+        elif entry.text is not None and self._clock() - entry.ready_at > self.ttl:
+            self._discard(telegram_id)
+            self.misses += 1
+            return None
+        elif entry.text is not None:
+            self.hits += 1
+
+        if self._entries.get(telegram_id) is entry:
+            del self._entries[telegram_id]
+        if entry.text is None:
+            self.misses += 1
+            return None
+
+        self.used_tokens += entry.tokens
+        return entry.text
+
+    async def _generate(self, telegram_id: int, entry: _Prefetch, prediction: dict):
+        try:
+            async with self.scheduler.slot(telegram_id):
+                usage = {}
+                text = await self.assistant.generate_detailed_explanation(
+                    prediction['prediction_type'],
+                    prediction['name'],
+                    prediction['partner_name'],
+                    prediction['birth_date'],
+                    prediction['zodiac_sign'],
+                    prediction['cards'],
+                    usage=usage
+                )
+
+            # Без usage ассистент вернул запасной текст - его не кэшируем
+            if not usage:
+                self.failed += 1
+                return
+
+            entry.text = text
+            entry.tokens = usage.get('total_tokens', 0)
+            entry.ready_at = self._clock()
+
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"❌ Ошибка фоновой генерации обоснования: {e}")
+
+    def _on_done(self, task: asyncio.Task):
+        # Колбэк, а не finally: задача может быть отменена до первого шага
+        self._inflight -= 1
+        if task.cancelled():
+            self.cancelled += 1
+
+    def _discard(self, telegram_id: int):
+        """Убирает запись пользователя, отменяя незавершенную генерацию"""
+        entry = self._entries.pop(telegram_id, None)
+        if entry is None:
+            return
+
+        if not entry.task.done():
+            entry.task.cancel()
+        elif entry.text is not None:
+            self.wasted += 1
+            self.wasted_tokens += entry.tokens
+
+    async def close(self):
+        """Отменяет все фоновые генерации"""
+        tasks = [entry.task for entry in self._entries.values() if not entry.task.done()]
+        for telegram_id in list(self._entries):
+            self._discard(telegram_id)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        """Попадания, отмены и потраченные впустую токены"""
+        served = self.hits + self.joined
+        requested = served + self.misses
+        return {
+            'entries': len(self._entries),
+            'inflight': self._inflight,
+            'started': self.started,
+            'skipped': self.skipped,
+            'hits': self.hits,
+            'joined': self.joined,
+            'misses': self.misses,
+            'hit_rate': served / requested if requested else 0.0,
+            'cancelled': self.cancelled,
+            'failed': self.failed,
+            'wasted': self.wasted,
+            'used_tokens': self.used_tokens,
+            'wasted_tokens': self.wasted_tokens
+        }
\ No newline at end of file
@@ -1,13 +1,24 @@
+import csv
+import gzip
+import json
 import os
-import requests
+from supabase_transport import get_transport, format_stats
 from dotenv import load_dotenv
 import logging
 from datetime import datetime
+from config import PROMO_EXPORT_PAGE
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Колонки полной выгрузки в CSV/JSONL
+EXPORT_COLUMNS = (
+    'id', 'code', 'subscription_type', 'days', 'max_uses', 'used_count',
+    'is_active', 'description', 'expires_at', 'created_at'
+)
+EXPORT_FORMATS = ('csv', 'jsonl')
+
 
 class PromoCodeExporter:
     def __init__(self):
@@ -18,85 +29,168 @@ class PromoCodeExporter:
             'Authorization': f"Bearer {os.getenv('SUPABASE_KEY')}",
         }
 
-    def get_all_promo_codes(self):
-        """Получить все промокоды из базы"""
+    def iter_promo_codes(self, columns: str, active_only: bool = False, page_size: int = PROMO_EXPORT_PAGE):
+        """Промокоды страницами по page_size строк в порядке id.
+
+        Каждая страница запрашивается по условию id > последнего id, поэтому
+        выгрузка не замедляется к концу таблицы, а в памяти держится одна страница.
+        """
+        url = f"{self.supabase_url}/promo_codes"
+        after_id = 0
+
+        while True:
+            params = {'select': columns, 'id': f'gt.{after_id}', 'order': 'id.asc', 'limit': str(page_size)}
+            if active_only:
+                params['is_active'] = 'eq.true'
+
+            response = get_transport().get(url, headers=self.headers, params=params)
+            if response.status_code != 200:
+                raise ConnectionError(f"Ошибка получения промокодов после id={after_id}: "
+                                      f"{response.status_code} - {response.text}")
+
+            promos = response.json()
+            if not promos:
+                return
+
+            yield promos
+            if len(promos) < page_size:
+                return
+            after_id = promos[-1]['id']
+
+    def count_promo_codes(self, active_only: bool = False) -> int:
+        """Количество промокодов без загрузки строк (Prefer: count=exact)"""
+        params = {'select': 'id', 'limit': '0'}
+        if active_only:
+            params['is_active'] = 'eq.true'
+
+        response = get_transport().get(f"{self.supabase_url}/promo_codes",
+                                       headers={**self.headers, 'Prefer': 'count=exact'}, params=params)
+        if response.status_code not in (200, 206):
+            raise ConnectionError(f"Ошибка подсчета промокодов: {response.status_code} - {response.text}")
+
+        # Content-Range: 0-0/1234 или */1234
+        return int(response.headers.get('content-range', '*/0').split('/')[-1])
+
+    @staticmethod
+    def _open(filename: str, compress: bool):
+        if compress:
+            return gzip.open(filename, 'wt', encoding='utf-8', newline='')
+        return open(filename, 'w', encoding='utf-8', newline='')
+
+    def _write_file(self, filename: str, compress: bool, write) -> int:
+        """Пишет выгрузку во временный файл и переименовывает его только после успеха,
+        чтобы прерванная выгрузка не оставила обрезанный файл под итоговым именем"""
+        partial = f"{filename}.part"
         try:
-            url = f"{self.supabase_url}/promo_codes"
-            params = {
-                'select': 'code,days,max_uses,used_count,is_active,created_at',
-                'order': 'created_at.desc'
-            }
-
-            response = requests.get(url, headers=self.headers, params=params)
-
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"❌ Ошибка получения промокодов: {response.status_code} - {response.text}")
-                return []
-
-        except Exception as e:
-            logger.error(f"❌ Ошибка подключения к базе: {e}")
-            return []
+            with self._open(partial, compress) as f:
+                written = write(f)
+            os.replace(partial, filename)
+            return written
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
 
     def export_clean_list(self, filename=None):
         """Экспортировать чистый список кодов (только активные)"""
-        promos = self.get_all_promo_codes()
-
-        if not promos:
-            logger.error("❌ Промокоды не найдены или ошибка подключения")
-            return False
-
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"promocodes_clean_{timestamp}.txt"
 
-        try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                # Только активные промокоды
-                active_promos = [p for p in promos if p.get('is_active', True)]
-
-                # Просто список кодов, каждый с новой строки
-                for promo in active_promos:
-                    f.write(f"{promo['code']}\n")
-
-            logger.info(f"✅ Экспортировано {len(active_promos)} промокодов в: {filename}")
-            return True
+        def write(f):
+            written = 0
+            # Просто список кодов, каждый с новой строки
+            for promos in self.iter_promo_codes('id,code', active_only=True):
+                f.writelines(f"{promo['code']}\n" for promo in promos)
+                written += len(promos)
+            return written
 
+        try:
+            written = self._write_file(filename, False, write)
         except Exception as e:
-            logger.error(f"❌ Ошибка записи в файл: {e}")
+            logger.error(f"❌ Ошибка выгрузки промокодов: {e}")
             return False
 
-    def export_with_status(self, filename=None):
-        """Экспортировать коды с пометкой статуса"""
-        promos = self.get_all_promo_codes()
-
-        if not promos:
+        if not written:
             logger.error("❌ Промокоды не найдены")
+            os.remove(filename)
             return False
 
+        logger.info(f"✅ Экспортировано {written} промокодов в: {filename}")
+        return True
+
+    def export_with_status(self, filename=None):
+        """Экспортировать коды с пометкой статуса"""
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"promocodes_status_{timestamp}.txt"
 
+        def write(f):
+            # Заголовок - снимок отдельным запросом до выгрузки: если коды меняются
+            # во время выгрузки, он может разойтись со строками ниже. Точное число - в конце
+            f.write(f"Активных промокодов на начало выгрузки: {self.count_promo_codes(active_only=True)}\n")
+            f.write("=" * 20 + "\n\n")
+
+            written = 0
+            for promos in self.iter_promo_codes('id,code,used_count,max_uses', active_only=True):
+                for promo in promos:
+                    status = "✅" if (promo.get('used_count') or 0) < (promo.get('max_uses') or 1) else "❌"
+                    f.write(f"{promo['code']} {status}\n")
+                written += len(promos)
+
+            f.write("\n" + "=" * 20 + "\n")
+            f.write(f"Выгружено промокодов: {written}\n")
+            return written
+
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                active_promos = [p for p in promos if p.get('is_active', True)]
+            written = self._write_file(filename, False, write)
+        except Exception as e:
+            logger.error(f"❌ Ошибка выгрузки промокодов: {e}")
+            return False
 
-                f.write(f"Активных промокодов: {len(active_promos)}\n")
-                f.write("=" * 20 + "\n\n")
+        if not written:
+            logger.error("❌ Промокоды не найдены")
+            os.remove(filename)
+            return False
 
-                for promo in active_promos:
-                    status = "✅" if promo.get('used_count', 0) < promo.get('max_uses', 1) else "❌"
-                    f.write(f"{promo['code']} {status}\n")
+        logger.info(f"✅ Экспортировано {written} промокодов в: {filename}")
+        return True
 
-            logger.info(f"✅ Экспортировано {len(active_promos)} промокодов в: {filename}")
-            return True
+    def export_table(self, filename=None, fmt: str = 'csv', compress: bool = False, active_only: bool = False):
+        """Экспортировать промокоды со всеми колонками в CSV или JSONL, по желанию со сжатием gzip"""
+        if fmt not in EXPORT_FORMATS:
+            logger.error(f"❌ Неизвестный формат выгрузки: {fmt}")
+            return False
 
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"promocodes_{timestamp}.{fmt}" + (".gz" if compress else "")
+
+        def write(f):
+            written = 0
+            writer = None
+            if fmt == 'csv':
+                writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+                writer.writeheader()
+
+            for promos in self.iter_promo_codes(','.join(EXPORT_COLUMNS), active_only=active_only):
+                if writer:
+                    writer.writerows(promos)
+                else:
+                    f.writelines(json.dumps(promo, ensure_ascii=False) + "\n" for promo in promos)
+                written += len(promos)
+                logger.info(f"📦 Выгружено {written} промокодов...")
+            return written
+
+        try:
+            written = self._write_file(filename, compress, write)
         except Exception as e:
-            logger.error(f"❌ Ошибка записи: {e}")
+            logger.error(f"❌ Ошибка выгрузки промокодов: {e}")
             return False
 
+        logger.info(f"✅ Экспортировано {written} промокодов в: {filename}")
+        return True
+
 
 def main():
     """Основная функция"""
@@ -109,9 +203,10 @@ def main():
         print("\nВыберите действие:")
         print("1. 📄 Чистый список (только коды)")
         print("2. 📊 Список со статусами")
-        print("3. 🚪 Выход")
+        print("3. 🗂 Полная выгрузка (CSV/JSONL)")
+        print("4. 🚪 Выход")
 
-        choice = input("\nВаш выбор (1-3): ").strip()
+        choice = input("\nВаш выбор (1-4): ").strip()
 
         if choice == '1':
             filename = input("Имя файла (или Enter для автоимени): ").strip()
@@ -126,12 +221,23 @@ def main():
             exporter.export_with_status(filename)
 
         elif choice == '3':
+            fmt = input("Формат (csv/jsonl, Enter - csv): ").strip().lower() or 'csv'
+            compress = input("Сжать gzip? (y/N): ").strip().lower() == 'y'
+            active_only = input("Только активные? (y/N): ").strip().lower() == 'y'
+            filename = input("Имя файла (или Enter для автоимени): ").strip()
+            if not filename:
+                filename = None
+            exporter.export_table(filename, fmt, compress, active_only)
+
+        elif choice == '4':
             print("👋 До свидания!")
             break
 
         else:
             print("❌ Неверный выбор, попробуйте снова")
 
+    print(f"🔌 Соединения Supabase: {format_stats(get_transport().get_stats())}")
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
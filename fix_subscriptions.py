@@ -1,5 +1,5 @@
 import os
-import requests
+from supabase_transport import get_transport, format_stats
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
@@ -21,7 +21,7 @@ def fix_all_subscriptions():
 
     # Получаем всех пользователей с подписками
     url = f"{supabase_url}/users?subscription_type=neq.free&select=id,telegram_id,first_name,subscription_type,subscription_end"
-    response = requests.get(url, headers=headers)
+    response = get_transport().get(url, headers=headers)
 
     if response.status_code != 200:
         print("❌ Ошибка получения пользователей")
@@ -63,7 +63,7 @@ def fix_all_subscriptions():
             }
 
             update_url = f"{supabase_url}/users?id=eq.{user_id}"
-            response = requests.patch(update_url, headers=headers, json=update_data)
+            response = get_transport().patch(update_url, headers=headers, json=update_data)
 
             if response.status_code == 200:
                 print(f"✅ Исправлена подписка для {user['first_name']} ({telegram_id})")
@@ -89,7 +89,7 @@ def grant_subscription_to_user(telegram_id, days=30):
 
     # Находим пользователя
     url = f"{supabase_url}/users?telegram_id=eq.{telegram_id}"
-    response = requests.get(url, headers=headers)
+    response = get_transport().get(url, headers=headers)
 
     if response.status_code != 200 or not response.json():
         print(f"❌ Пользователь {telegram_id} не найден")
@@ -111,7 +111,7 @@ def grant_subscription_to_user(telegram_id, days=30):
     }
 
     update_url = f"{supabase_url}/users?id=eq.{user_id}"
-    response = requests.patch(update_url, headers=headers, json=update_data)
+    response = get_transport().patch(update_url, headers=headers, json=update_data)
 
     if response.status_code == 200:
         print(f"✅ Подписка выдана пользователю {user['first_name']}")
@@ -146,4 +146,6 @@ if __name__ == "__main__":
     elif choice == '3':
         print("👋 Выход")
     else:
-        print("❌ Неверный выбор")
\ No newline at end of file
+        print("❌ Неверный выбор")
+
+    print(f"🔌 Соединения Supabase: {format_stats(get_transport().get_stats())}")
\ No newline at end of file
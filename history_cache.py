@@ -0,0 +1,132 @@
+import threading
+from collections import OrderedDict, deque
+
+from config import HISTORY_CACHE_DEPTH, HISTORY_CACHE_MAX_USERS
+
+
+class UserHistory:
+    """Последние предсказания пользователя, от новых к старым"""
+
+    __slots__ = ('items', 'complete')
+
+    def __init__(self, items: list, depth: int, complete: bool):
+        self.items = deque(items[:depth], maxlen=depth)
+        # True - в буфере вся история пользователя, старше записей нет
+        self.complete = complete and len(items) <= depth
+
+
+class RecentHistoryCache:
+    """Кольцевые буферы последних depth предсказаний активных пользователей.
+
+    Буфер загружается из базы при первом просмотре истории, а новые предсказания
+    бот дописывает в него сам при save_prediction, поэтому повторный /history
+    не обращается к базе. У дописанных записей еще нет id: страницу, для курсора
+    которой нужен id такой записи, кэш не отдает, и она читается из базы
+    с перезагрузкой буфера. Пользователей не больше max_users, самые давно
+    смотревшие историю вытесняются.
+    """
+
+    def __init__(self, depth: int = HISTORY_CACHE_DEPTH, max_users: int = HISTORY_CACHE_MAX_USERS):
+        self.depth = depth
+        self.max_users = max_users
+
+        # telegram_id -> UserHistory, от самого давно использованного к самому свежему
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.appends = 0
+        self.evictions = 0
+
+    def load(self, telegram_id, predictions: list, complete: bool):
+        """Сохраняет последние предсказания из базы (от новых к старым)"""
+        with self._lock:
+            self._entries[int(telegram_id)] = UserHistory(predictions, self.depth, complete)
+            self._entries.move_to_end(int(telegram_id))
+
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def append(self, telegram_id, prediction: dict):
+        """Дописывает новое предсказание в буфер, если история пользователя уже загружена"""
+        with self._lock:
+            history = self._entries.get(int(telegram_id))
+            if history is None:
+                return
+
+            if len(history.items) == history.items.maxlen:
+                history.complete = False
+            history.items.appendleft(prediction)
+            self.appends += 1
+
+    def invalidate(self, telegram_id):
+        with self._lock:
+            self._entries.pop(int(telegram_id), None)
+
+    def page(self, telegram_id, limit: int, before: tuple = None, after: tuple = None):
+        """Страница в формате DatabaseManager._parse_history_page или None, если ее нет в буфере"""
+        with self._lock:
+            page = self._page(self._entries.get(int(telegram_id)), limit, before, after)
+            if page is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(int(telegram_id))
+            self.hits += 1
+            return page
+
+    @staticmethod
+    def _page(history: UserHistory, limit: int, before: tuple, after: tuple):
+        if history is None:
+            return None
+
+        items = list(history.items)
+        cursor = before or after
+        if cursor:
+            # Курсор (created_at, id) ищем в буфере по id
+            position = next((i for i, item in enumerate(items) if item['id'] == cursor[1]), None)
+            if position is None:
+                return None
+            older, newer = items[position + 1:], items[:position]
+        else:
+            older, newer = items, []
+
+        if after:
+            rows = newer[-limit:]
+            has_newer = len(newer) > limit
+            has_older = True
+        else:
+            # Записи старше буфера и их наличие знает только база
+            if len(older) <= limit and not history.complete:
+                return None
+            rows = older[:limit]
+            has_older = len(older) > limit
+            has_newer = before is not None
+
+        if not rows and cursor:
+            return None
+
+        # Курсор на запись без id не построить
+        if (has_older and rows[-1]['id'] is None) or (has_newer and rows[0]['id'] is None):
+            return None
+
+        return {
+            'predictions': [dict(item) for item in rows],
+            'older': (rows[-1]['created_at'], rows[-1]['id']) if has_older else None,
+            'newer': (rows[0]['created_at'], rows[0]['id']) if has_newer else None
+        }
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'users': len(self._entries),
+                'max_users': self.max_users,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'appends': self.appends,
+                'evictions': self.evictions
+            }
\ No newline at end of file
@@ -0,0 +1,149 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from config import LLM_MAX_CONCURRENT
+from stream_editor import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+# Как часто ожидающий запрос пересчитывает свое место в очереди
+POSITION_REFRESH_INTERVAL = 2.0
+
+
+class _Waiter:
+    __slots__ = ('key', 'telegram_id', 'premium', 'future', 'enqueued_at')
+
+    def __init__(self, key, telegram_id, premium, future, enqueued_at):
+        self.key = key
+        self.telegram_id = telegram_id
+        self.premium = premium
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+
+class LLMScheduler:
+    """Ограничивает число одновременных запросов к LLM и выдает слоты по приоритету.
+
+    Пока занято меньше max_concurrent слотов, запрос выполняется сразу, иначе
+    встает в очередь. Порядок очереди: сначала пользователи с активной подпиской,
+    затем пользователи, у которых меньше запросов уже выполняется или ждет,
+    затем по времени постановки. Так один пользователь с пачкой запросов не
+    задерживает остальных. Ожидающий запрос сообщает свое место через on_position.
+    """
+
+    def __init__(self, max_concurrent: int = LLM_MAX_CONCURRENT, clock=time.monotonic):
+        self.max_concurrent = max_concurrent
+        self._clock = clock
+
+        self._active = 0
+        self._queue = []
+        self._user_load = defaultdict(int)
+        self._sequence = itertools.count()
+
+        self.granted = 0
+        self.queued_total = 0
+        self.max_queue_depth = 0
+        self.wait_premium = LatencyTracker()
+        self.wait_free = LatencyTracker()
+
+    @asynccontextmanager
+    async def slot(self, telegram_id: int, premium: bool = False, on_position=None):
+        """Занимает слот на время блока async with"""
+        await self.acquire(telegram_id, premium, on_position)
+        try:
+            yield
+        finally:
+            self.release(telegram_id)
+
+    async def acquire(self, telegram_id: int, premium: bool = False, on_position=None):
+        """Ждет свободный слот. on_position(место) вызывается при изменении места в очереди"""
+        load = self._user_load[telegram_id]
+        self._user_load[telegram_id] += 1
+
+        if self._active < self.max_concurrent and not self._queue:
+            self._active += 1
+            self._record_grant(premium, 0.0)
+            return
+
+        waiter = _Waiter(
+            (0 if premium else 1, load, next(self._sequence)),
+            telegram_id, premium, asyncio.get_running_loop().create_future(), self._clock()
+        )
+        heapq.heappush(self._queue, waiter)
+        self.queued_total += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+
+        position = None
+        try:
+            while not waiter.future.done():
+                current = self._position(waiter)
+                if on_position and current != position:
+                    position = current
+                    try:
+                        await on_position(position)
+                    except Exception as e:
+                        logger.debug(f"Не удалось показать место в очереди: {e}")
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future), timeout=POSITION_REFRESH_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            if waiter.future.done():
+                # Слот уже передан этому запросу - возвращаем его следующему
+                self.release(telegram_id)
+            else:
+                self._queue.remove(waiter)
+                heapq.heapify(self._queue)
+                self._decrement_load(telegram_id)
+            raise
+
+    def release(self, telegram_id: int):
+        """Освобождает слот и сразу передает его первому в очереди"""
+        self._decrement_load(telegram_id)
+
+        if self._queue:
+            waiter = heapq.heappop(self._queue)
+            waiter.future.set_result(None)
+            self._record_grant(waiter.premium, self._clock() - waiter.enqueued_at)
+        else:
+            self._active -= 1
+
+    def idle_slots(self) -> int:
+        """Сколько слотов свободно прямо сейчас (0, если кто-то ждет в очереди)"""
+        if self._queue:
+            return 0
+        return self.max_concurrent - self._active
+
+    def _position(self, waiter: _Waiter) -> int:
+        return 1 + sum(1 for other in self._queue if other.key < waiter.key)
+
+    def _decrement_load(self, telegram_id: int):
+        self._user_load[telegram_id] -= 1
+        if self._user_load[telegram_id] <= 0:
+            del self._user_load[telegram_id]
+
+    def _record_grant(self, premium: bool, waited: float):
+        self.granted += 1
+        (self.wait_premium if premium else self.wait_free).record(waited)
+
+    def get_stats(self) -> dict:
+        """Загрузка слотов, глубина очереди и время ожидания по типам пользователей"""
+        return {
+            'active': self._active,
+            'max_concurrent': self.max_concurrent,
+            'queue_depth': len(self._queue),
+            'queue_premium': sum(1 for waiter in self._queue if waiter.premium),
+            'max_queue_depth': self.max_queue_depth,
+            'granted': self.granted,
+            'queued_total': self.queued_total,
+            'wait_premium': self.wait_premium.snapshot(),
+            'wait_free': self.wait_free.snapshot()
+        }
\ No newline at end of file
@@ -0,0 +1,58 @@
+import logging
+
+import aiohttp
+
+from config import LLM_POOL_LIMIT, LLM_POOL_LIMIT_PER_HOST, LLM_KEEPALIVE_TIMEOUT, LLM_DNS_CACHE_TTL
+from supabase_transport import ConnectionStats, create_trace_config, format_stats
+
+logger = logging.getLogger(__name__)
+
+
+class LLMSession:
+    """Долгоживущая aiohttp-сессия для запросов к LLM API.
+
+    Один TCPConnector на весь процесс сохраняет пул соединений, DNS-кэш и
+    TLS-сессии к провайдеру между вызовами. Таймауты задаются на каждый запрос.
+    Создается в post_init бота и закрывается в post_shutdown; если сессию не
+    создали заранее, она открывается при первом запросе.
+    """
+
+    def __init__(self, name: str, limit: int = LLM_POOL_LIMIT, limit_per_host: int = LLM_POOL_LIMIT_PER_HOST,
+                 keepalive_timeout: float = LLM_KEEPALIVE_TIMEOUT, ttl_dns_cache: int = LLM_DNS_CACHE_TTL):
+        self.name = name
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+
+        self.stats = ConnectionStats()
+        self._session = None
+
+    async def start(self):
+        await self.get_session()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Возвращает общую сессию, создавая ее при первом обращении"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.ttl_dns_cache
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                trace_configs=[create_trace_config(self.stats)]
+            )
+            logger.info(f"✅ Создана общая aiohttp-сессия для {self.name}")
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info(f"✅ Сессия {self.name} закрыта: {format_stats(self.get_stats())}")
+        self._session = None
+
+    def get_stats(self) -> dict:
+        """Счетчики переиспользования соединений"""
+        return self.stats.snapshot()
\ No newline at end of file
@@ -1,13 +1,23 @@
 import logging
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler, ConversationHandler
 from telegram import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup, Update
-from database_manager import DatabaseManager
+from async_database_manager import AsyncDatabaseManager
 from openrouter_api import OpenRouterAssistant
 import json
 from dateutil import parser
 from datetime import datetime, timedelta
 import asyncio
-from config import FREE_PREDICTIONS_LIMIT, SUBSCRIPTION_PRICE, ADMIN_IDS
+import functools
+import time
+from config import FREE_PREDICTIONS_LIMIT, SUBSCRIPTION_PRICE, ADMIN_IDS, LLM_STREAMING, PREFETCH_ENABLED
+from stream_editor import ThrottledMessageEditor, LatencyTracker
+from llm_scheduler import LLMScheduler
+from explanation_prefetch import ExplanationPrefetcher
+from broadcast_engine import BroadcastEngine, BroadcastJob
+from admin_dashboard import AdminDashboard
+from promo_manager import PROMO_CODES_SHOWN
+from promo_index import PromoCodeIndex
+from supabase_transport import traffic_label
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -18,14 +28,93 @@ logger = logging.getLogger(__name__)
 # Состояния для ConversationHandler
 ADMIN_RESPONSE = range(1)
 
+# Сколько обработчиков показывать в разделе трафика админ-панели
+TRAFFIC_TOP_HANDLERS = 5
+
+
+def _track_traffic(callback):
+    """Учитывает запросы к Supabase из обработчика под его именем (см. TrafficStats)"""
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        token = traffic_label.set(callback.__name__)
+        try:
+            return await callback(update, context)
+        finally:
+            traffic_label.reset(token)
+
+    return wrapper
+
 
 class TarotBot:
     def __init__(self, token: str, openrouter_key: str, model: str):
-        self.application = Application.builder().token(token).build()
-        self.database = DatabaseManager()
+        self.application = (
+            Application.builder().token(token).post_init(self.post_init).post_shutdown(self.post_shutdown).build()
+        )
+        self.database = AsyncDatabaseManager()
+        # Статистика админ-панели в памяти, обновляется по событиям записи
+        self.dashboard = AdminDashboard(self.database)
+        # Активные промокоды в памяти: неизвестные коды отклоняются без запроса к базе
+        self.promo_index = PromoCodeIndex(self.database)
         self.ai_assistant = OpenRouterAssistant(openrouter_key, model)
+        # Время от запроса к LLM до первого видимого пользователю текста
+        self.first_token_latency = LatencyTracker()
+        # Общий лимит одновременных запросов к LLM с приоритетом для подписчиков
+        self.llm_scheduler = LLMScheduler()
+        self.explanation_prefetcher = ExplanationPrefetcher(self.ai_assistant, self.llm_scheduler)
+        self.broadcast_engine = BroadcastEngine(self.application.bot, self.database)
         self.setup_handlers()
 
+    async def post_init(self, application):
+        """Подготовка ресурсов при запуске бота"""
+        await self.database.start()
+        await self.dashboard.start()
+        await self.promo_index.start()
+        await self.ai_assistant.start()
+        # Продолжаем рассылку, прерванную остановкой бота
+        self.broadcast_engine.resume(on_progress=self._report_broadcast_progress)
+
+    async def post_shutdown(self, application):
+        """Освобождение ресурсов при остановке бота"""
+        await self.broadcast_engine.close()
+        await self.explanation_prefetcher.close()
+        await self.ai_assistant.close()
+        await self.dashboard.close()
+        await self.promo_index.close()
+        await self.database.close()
+
+    async def _get_session(self, user, context, message):
+        """Пользователь и его статистика на время одного апдейта: не больше одного запроса к базе.
+
+        Если профиль не загрузился, отвечает пользователю на message и возвращает None
+        """
+        session = getattr(context, 'user_session', None)
+        if session is None:
+            session = await self.database.get_session(user)
+            if session is None:
+                await message.reply_text("❌ Ошибка загрузки профиля")
+                return None
+            context.user_session = session
+        return session
+
+    def _count_prediction(self, session):
+        """Учитывает сохраненное предсказание в сессии апдейта без повторного чтения"""
+        session['user']['predictions_count'] = (session['user'].get('predictions_count') or 0) + 1
+        session['stats'] = self.database._build_user_stats(session['user'])
+
+    async def _redeem_promo(self, update: Update, code: str):
+        """Активирует промокод через индекс. None - лимит попыток превышен, пользователь уже получил ответ"""
+        status = await self.promo_index.redeem(update.effective_user.id, code)
+        if status == 'rate_limited':
+            await update.message.reply_text(
+                "⏳ *Слишком много попыток*\n\n"
+                f"Попробуйте ввести промокод через {self.promo_index.attempts_window:.0f} секунд",
+                parse_mode='Markdown',
+                reply_markup=self.get_main_keyboard()
+            )
+            return None
+        return status == 'ok'
+
     async def activate_promo_command(self, update: Update, context):
         """Команда для прямой активации промокода"""
         user = update.effective_user
@@ -44,7 +133,9 @@ class TarotBot:
         code = context.args[0].strip().upper()
         logger.info(f"🔑 Прямая активация промокода {code} для пользователя {user.id}")
 
-        success = self.database.use_promo_code(code, user.id)
+        success = await self._redeem_promo(update, code)
+        if success is None:
+            return
 
         if success:
             await update.message.reply_text(
@@ -104,6 +195,14 @@ class TarotBot:
         # Callback кнопки
         self.application.add_handler(CallbackQueryHandler(self.button_handler))
 
+        # Метки обработчиков для учета трафика Supabase
+        for handler in [handler for group in self.application.handlers.values() for handler in group]:
+            nested = [handler]
+            if isinstance(handler, ConversationHandler):
+                nested = handler.entry_points + [h for state in handler.states.values() for h in state] + handler.fallbacks
+            for inner in nested:
+                inner.callback = _track_traffic(inner.callback)
+
     def get_main_keyboard(self):
         keyboard = [
             [KeyboardButton("🔮 Сделать расклад"), KeyboardButton("👤 Профиль")],
@@ -180,7 +279,11 @@ class TarotBot:
 
     async def start(self, update, context):
         user = update.effective_user
-        db_user = self.database.get_or_create_user(user)
+        session = await self._get_session(user, context, update.message)
+        if not session:
+            return
+        db_user = session['user']
+        status_text = self._get_user_status_text(session['stats'])
 
         welcome_text = f"""
 🔮 *Добро пожаловать в Цифровое Таро, {user.first_name}!* 
@@ -195,7 +298,7 @@ class TarotBot:
 
 📊 *Ваша статистика:*
 • Сделано предсказаний: {db_user['predictions_count']}/{FREE_PREDICTIONS_LIMIT}
-• Статус: {self._get_user_status_text(db_user)}
+• Статус: {status_text}
 
 *Начните с выбора расклада!* ⬇️
         """
@@ -209,9 +312,11 @@ class TarotBot:
     async def show_spreads_menu(self, update, context):
         """Показать меню раскладов"""
         user = update.effective_user
-        db_user = self.database.get_or_create_user(user)
-
-        stats = self.database.get_user_stats(db_user['telegram_id'])
+        session = await self._get_session(user, context, update.effective_message)
+        if not session:
+            return
+        stats = session['stats']
+        status_text = self._get_user_status_text(stats)
 
         menu_text = f"""
 🔮 *ВЫБЕРИТЕ ТИП РАСКЛАДА*
@@ -229,7 +334,7 @@ class TarotBot:
 📊 *Ваша статистика:*
 • Сделано предсказаний: {stats['predictions_count']}
 • Осталось бесплатных: {stats['remaining_predictions']}
-• Статус: {self._get_user_status_text(db_user)}
+• Статус: {status_text}
 
 *Выберите тип расклада ниже ⬇️*
         """
@@ -243,9 +348,11 @@ class TarotBot:
     async def show_spreads_menu_from_callback(self, query, context):
         """Показать меню раскладов из callback"""
         user = query.from_user
-        db_user = self.database.get_or_create_user(user)
-
-        stats = self.database.get_user_stats(db_user['telegram_id'])
+        session = await self._get_session(user, context, query.message)
+        if not session:
+            return
+        stats = session['stats']
+        status_text = self._get_user_status_text(stats)
 
         menu_text = f"""
 🔮 *ВЫБЕРИТЕ ТИП РАСКЛАДА*
@@ -263,7 +370,7 @@ class TarotBot:
 📊 *Ваша статистика:*
 • Сделано предсказаний: {stats['predictions_count']}
 • Осталось бесплатных: {stats['remaining_predictions']}
-• Статус: {self._get_user_status_text(db_user)}
+• Статус: {status_text}
 
 *Выберите тип расклада ниже ⬇️*
         """
@@ -326,10 +433,8 @@ class TarotBot:
             await self.handle_user_message_input(update, context)
             return
 
-        # Получаем или создаем пользователя
-        db_user = self.database.get_or_create_user(user)
-        if not db_user:
-            await update.message.reply_text("❌ Ошибка загрузки профиля")
+        # Получаем или создаем пользователя, дальше обработчики берут его из контекста апдейта
+        if not await self._get_session(user, context, update.message):
             return
 
         # Обработка основных команд через кнопки
@@ -447,10 +552,13 @@ class TarotBot:
     async def start_personal_prediction(self, update, context):
         """Начало личного расклада"""
         user = update.effective_user
-        db_user = self.database.get_or_create_user(user)
+        session = await self._get_session(user, context, update.effective_message)
+        if not session:
+            return
+        stats = session['stats']
 
-        if not self.database.can_user_make_prediction(db_user['telegram_id']):
-            await self._show_subscription_required(update, db_user)
+        if stats['remaining_predictions'] <= 0:
+            await self._show_subscription_required(update, stats)
             return
 
         context.user_data['current_prediction_type'] = 'personal'
@@ -459,17 +567,20 @@ class TarotBot:
             "🔮 *Личный расклад*\n\n"
             "Напишите ваше *имя* и *дату рождения*:\n"
             "*Пример:* Анна 15.03.1990\n\n"
-            f"🎯 *Осталось бесплатных предсказаний:* {self.database.get_user_stats(db_user['telegram_id'])['remaining_predictions']}",
+            f"🎯 *Осталось бесплатных предсказаний:* {stats['remaining_predictions']}",
             parse_mode='Markdown'
         )
 
     async def start_career_prediction(self, update, context):
         """Начало карьерного расклада"""
         user = update.effective_user
-        db_user = self.database.get_or_create_user(user)
+        session = await self._get_session(user, context, update.effective_message)
+        if not session:
+            return
+        stats = session['stats']
 
-        if not self.database.can_user_make_prediction(db_user['telegram_id']):
-            await self._show_subscription_required(update, db_user)
+        if stats['remaining_predictions'] <= 0:
+            await self._show_subscription_required(update, stats)
             return
 
         context.user_data['current_prediction_type'] = 'career'
@@ -478,17 +589,20 @@ class TarotBot:
             "💼 *Карьерный расклад*\n\n"
             "Напишите ваше *имя* и *дату рождения*:\n"
             "*Пример:* Анна 15.03.1990\n\n"
-            f"🎯 *Осталось бесплатных предсказаний:* {self.database.get_user_stats(db_user['telegram_id'])['remaining_predictions']}",
+            f"🎯 *Осталось бесплатных предсказаний:* {stats['remaining_predictions']}",
             parse_mode='Markdown'
         )
 
     async def start_compatibility_prediction(self, update, context):
         """Начало расклада на совместимость"""
         user = update.effective_user
-        db_user = self.database.get_or_create_user(user)
+        session = await self._get_session(user, context, update.effective_message)
+        if not session:
+            return
+        stats = session['stats']
 
-        if not self.database.can_user_make_prediction(db_user['telegram_id']):
-            await self._show_subscription_required(update, db_user)
+        if stats['remaining_predictions'] <= 0:
+            await self._show_subscription_required(update, stats)
             return
 
         context.user_data['current_prediction_type'] = 'compatibility'
@@ -498,17 +612,20 @@ class TarotBot:
             "Напишите через пробел:\n"
             "*ВашеИмя ИмяПартнера ВашаДатаРождения*\n"
             "*Пример:* Анна Иван 15.03.1990\n\n"
-            f"🎯 *Осталось бесплатных предсказаний:* {self.database.get_user_stats(db_user['telegram_id'])['remaining_predictions']}",
+            f"🎯 *Осталось бесплатных предсказаний:* {stats['remaining_predictions']}",
             parse_mode='Markdown'
         )
 
     async def start_intimacy_prediction(self, update, context):
         """Начало расклада на секс и страсть"""
         user = update.effective_user
-        db_user = self.database.get_or_create_user(user)
+        session = await self._get_session(user, context, update.effective_message)
+        if not session:
+            return
+        stats = session['stats']
 
-        if not self.database.can_user_make_prediction(db_user['telegram_id']):
-            await self._show_subscription_required(update, db_user)
+        if stats['remaining_predictions'] <= 0:
+            await self._show_subscription_required(update, stats)
             return
 
         context.user_data['current_prediction_type'] = 'intimacy'
@@ -518,14 +635,17 @@ class TarotBot:
             "Напишите через пробел:\n"
             "*ВашеИмя ИмяПартнера ВашаДатаРождения*\n"
             "*Пример:* Анна Иван 15.03.1990\n\n"
-            f"🎯 *Осталось бесплатных предсказаний:* {self.database.get_user_stats(db_user['telegram_id'])['remaining_predictions']}",
+            f"🎯 *Осталось бесплатных предсказаний:* {stats['remaining_predictions']}",
             parse_mode='Markdown'
         )
 
     async def process_prediction_input(self, update, context, user_message):
         """Обработка введенных данных для предсказания"""
         user = update.effective_user
-        db_user = self.database.get_or_create_user(user)
+        session = await self._get_session(user, context, update.message)
+        if not session:
+            return
+        db_user = session['user']
 
         prediction_type = context.user_data.get('current_prediction_type')
         if not prediction_type:
@@ -591,28 +711,46 @@ class TarotBot:
                 parse_mode='Markdown'
             )
 
-            # Получаем предсказание
-            try:
-                prediction = await asyncio.wait_for(
-                    self.ai_assistant.generate_tarot_prediction(
-                        prediction_type, name, partner_name, birth_date_formatted, zodiac_sign, cards
-                    ),
-                    timeout=30.0
+            async def show_queue_position(position):
+                await analyzing_msg.edit_text(
+                    f"🎴 *Выпали карты:* {', '.join(cards)}\n\n"
+                    f"⏳ *Вы в очереди: {position}*\n"
+                    f"*Карты скоро откроют свои тайны...* ✨",
+                    parse_mode='Markdown'
                 )
-            except asyncio.TimeoutError:
-                prediction = self.ai_assistant._get_truly_random_fallback(
-                    prediction_type, name, partner_name, cards, zodiac_sign
+
+            # Ждем свободный слот LLM, затем получаем предсказание, показывая текст по мере генерации
+            premium = session['stats']['has_subscription']
+            async with self.llm_scheduler.slot(db_user['telegram_id'], premium, on_position=show_queue_position):
+                editor = ThrottledMessageEditor(
+                    analyzing_msg.edit_text,
+                    header=f"🎴 Выпали карты: {', '.join(cards)}\n\n",
+                    tracker=self.first_token_latency
                 )
-                await analyzing_msg.edit_text("⏰ *Энергии карт требуют больше времени для раскрытия...*")
+                try:
+                    prediction = await asyncio.wait_for(
+                        self.ai_assistant.generate_tarot_prediction(
+                            prediction_type, name, partner_name, birth_date_formatted, zodiac_sign, cards,
+                            on_partial=editor.update if LLM_STREAMING else None
+                        ),
+                        timeout=30.0
+                    )
+                except asyncio.TimeoutError:
+                    prediction = self.ai_assistant._get_truly_random_fallback(
+                        prediction_type, name, partner_name, cards, zodiac_sign
+                    )
+                    await analyzing_msg.edit_text("⏰ *Энергии карт требуют больше времени для раскрытия...*")
 
             # Сохраняем данные
-            self.database.save_prediction(
+            if await self.database.save_prediction(
                 db_user['telegram_id'], prediction_type, name, partner_name,
                 birth_date_formatted, zodiac_sign, cards, prediction
-            )
+            ):
+                self._count_prediction(session)
 
             # Формируем ответ
             title = self._get_prediction_title(prediction_type, name, partner_name)
+            footer = self._get_prediction_footer(session['stats'])
 
             response_text = f"""
 {title}
@@ -623,7 +761,7 @@ class TarotBot:
 
 {prediction}
 
-*✨ {self._get_prediction_footer(db_user)}*
+*✨ {footer}*
             """
 
             # Сохраняем для расширенного обоснования
@@ -644,6 +782,10 @@ class TarotBot:
                 reply_markup=self.get_prediction_keyboard()
             )
 
+            # Подписчикам готовим расширенное обоснование заранее
+            if premium and PREFETCH_ENABLED:
+                self.explanation_prefetcher.schedule(db_user['telegram_id'], context.user_data['last_prediction'])
+
             # Очищаем тип предсказания
             context.user_data['current_prediction_type'] = None
 
@@ -677,11 +819,10 @@ class TarotBot:
     async def profile(self, update, context):
         """Показать профиль пользователя"""
         user = update.effective_user
-        stats = self.database.get_user_stats(user.id)
-
-        if not stats:
-            await update.message.reply_text("❌ Ошибка загрузки профиля")
+        session = await self._get_session(user, context, update.effective_message)
+        if not session:
             return
+        stats = session['stats']
 
         profile_text = f"""
 👤 *ВАШ ПРОФИЛЬ*
@@ -714,11 +855,10 @@ class TarotBot:
     async def subscription(self, update, context):
         """Показать информацию о подписке"""
         user = update.effective_user
-        stats = self.database.get_user_stats(user.id)
-
-        if not stats:
-            await update.message.reply_text("❌ Ошибка загрузки данных")
+        session = await self._get_session(user, context, update.effective_message)
+        if not session:
             return
+        stats = session['stats']
 
         subscription_text = f"""
 💎 *ПОДПИСКА НА ТАРО*
@@ -756,12 +896,24 @@ class TarotBot:
             )
 
     async def history(self, update, context):
-        """Показать историю предсказаний"""
+        """Показать историю предсказаний с листанием к старым и новым"""
         user = update.effective_user
-        history = self.database.get_user_predictions(user.id)
+        query = update.callback_query
 
-        if not history:
-            await update.message.reply_text(
+        # history_older_<id>_<created_at> или history_newer_<id>_<created_at>
+        before = after = None
+        if query:
+            _, direction, prediction_id, created_at = query.data.split('_', 3)
+            cursor = (created_at, int(prediction_id))
+            before, after = (cursor, None) if direction == 'older' else (None, cursor)
+
+        page = await self.database.get_prediction_history(user.id, before=before, after=after)
+        if not page['predictions'] and query:
+            # Записи курсора больше нет - показываем последние предсказания
+            page = await self.database.get_prediction_history(user.id)
+
+        if not page['predictions']:
+            await update.effective_message.reply_text(
                 "📚 *У вас еще нет предсказаний*\n\n"
                 "Получите первое предсказание! 🔮",
                 parse_mode='Markdown'
@@ -769,10 +921,10 @@ class TarotBot:
             return
 
         response = "📚 *ИСТОРИЯ ПРЕДСКАЗАНИЙ*\n\n"
-        for i, pred in enumerate(history[:5], 1):
+        for pred in page['predictions']:
             type_emoji = self._get_prediction_emoji(pred['prediction_type'])
             cards = pred['cards_drawn']
-            response += f"*{i}. {pred['created_at'][:10]}* {type_emoji}\n"
+            response += f"*{pred['created_at'][:10]}* {type_emoji}\n"
             response += f"🎴 {', '.join(cards)}\n"
             if pred['partner_name']:
                 response += f"👥 {pred['user_name']} + {pred['partner_name']}\n"
@@ -780,7 +932,19 @@ class TarotBot:
                 response += f"👤 {pred['user_name']}\n"
             response += f"---\n"
 
-        await update.message.reply_text(response, parse_mode='Markdown')
+        keyboard = []
+        if page['newer']:
+            created_at, prediction_id = page['newer']
+            keyboard.append(InlineKeyboardButton("⬅️ Новее", callback_data=f"history_newer_{prediction_id}_{created_at}"))
+        if page['older']:
+            created_at, prediction_id = page['older']
+            keyboard.append(InlineKeyboardButton("Старее ➡️", callback_data=f"history_older_{prediction_id}_{created_at}"))
+        reply_markup = InlineKeyboardMarkup([keyboard]) if keyboard else None
+
+        if query:
+            await query.edit_message_text(response, parse_mode='Markdown', reply_markup=reply_markup)
+        else:
+            await update.message.reply_text(response, parse_mode='Markdown', reply_markup=reply_markup)
 
     def _get_prediction_emoji(self, prediction_type):
         """Получить эмодзи для типа предсказания"""
@@ -849,14 +1013,14 @@ class TarotBot:
             return
 
         # Получаем пользователя
-        db_user = self.database.get_or_create_user(user)
-        if not db_user:
-            await update.message.reply_text("❌ Ошибка загрузки профиля")
+        session = await self._get_session(user, context, update.message)
+        if not session:
             context.user_data['awaiting_support'] = False
             return
+        db_user = session['user']
 
         # Создаем тикет
-        ticket_id = self.database.create_support_ticket(
+        ticket_id = await self.database.create_support_ticket(
             db_user['id'],
             f"{user.first_name} ({user.id})",
             message_text
@@ -864,7 +1028,7 @@ class TarotBot:
 
         if ticket_id:
             # Добавляем сообщение в тикет
-            self.database.add_support_message(ticket_id, db_user['id'], user.first_name, message_text)
+            await self.database.add_support_message(ticket_id, db_user['id'], user.first_name, message_text)
 
             # Уведомляем админов
             await self.notify_admins_about_ticket(ticket_id, user, message_text)
@@ -920,7 +1084,21 @@ class TarotBot:
             await update.message.reply_text("❌ У вас нет доступа к этой команде")
             return
 
-        stats = self.get_admin_stats()
+        stats = await self.get_admin_stats()
+        cache = self.database.get_user_cache_stats()
+        history_cache = self.database.get_history_cache_stats()
+        llm = self.ai_assistant.get_connection_stats()
+        first_token = self.first_token_latency.snapshot()
+        scheduler = self.llm_scheduler.get_stats()
+        prefetch = self.explanation_prefetcher.get_stats()
+        promo_index = self.promo_index.get_stats()
+        traffic = self.database.get_traffic_stats()
+        received = sum(counters['received'] for counters in traffic.values())
+        decoded = sum(counters['decoded'] for counters in traffic.values())
+        traffic_top = "".join(
+            f"• `{label}`: {counters['received'] // 1024} КБ за {counters['requests']} запросов\n"
+            for label, counters in list(traffic.items())[:TRAFFIC_TOP_HANDLERS]
+        )
 
         admin_text = (
             f"👑 *ПАНЕЛЬ АДМИНИСТРАТОРА*\n\n"
@@ -928,7 +1106,40 @@ class TarotBot:
             f"• Всего пользователей: {stats['total_users']}\n"
             f"• Активных подписок: {stats['active_subscriptions']}\n"
             f"• Открытых тикетов: {stats['open_tickets']}\n"
-            f"• Всего предсказаний: {stats['total_predictions']}\n\n"
+            f"• Всего предсказаний: {stats['total_predictions']}\n"
+            f"• Предсказаний сегодня: {stats.get('predictions_today', 'N/A')}\n"
+            f"• MRR: {stats.get('mrr', 'N/A')}₽\n\n"
+            f"🗄 *Кэш пользователей:*\n"
+            f"• Записей: {cache['size']}/{cache['max_size']}\n"
+            f"• Память: {cache['bytes_used'] // 1024}/{cache['max_bytes'] // 1024} КБ\n"
+            f"• Попаданий: {cache['hit_rate'] * 100:.0f}%\n"
+            f"• Вытеснено: {cache['evictions']}, истекло: {cache['expired']}\n\n"
+            f"📚 *Кэш истории:*\n"
+            f"• Пользователей: {history_cache['users']}/{history_cache['max_users']}\n"
+            f"• Страниц без базы: {history_cache['hit_rate'] * 100:.0f}% ({history_cache['hits']} из "
+            f"{history_cache['hits'] + history_cache['misses']})\n\n"
+            f"🔌 *Соединения OpenRouter:*\n"
+            f"• Запросов: {llm['requests']}, новых соединений: {llm['new_connections']}\n"
+            f"• Переиспользовано: {llm['hit_rate'] * 100:.0f}%\n"
+            f"• Первый текст: p50 {first_token['p50']:.1f} с, p95 {first_token['p95']:.1f} с "
+            f"({first_token['count']} ответов)\n\n"
+            f"⏳ *Очередь LLM:*\n"
+            f"• Занято слотов: {scheduler['active']}/{scheduler['max_concurrent']}\n"
+            f"• В очереди: {scheduler['queue_depth']} (премиум {scheduler['queue_premium']}), "
+            f"максимум {scheduler['max_queue_depth']}\n"
+            f"• Ожидание p95: премиум {scheduler['wait_premium']['p95']:.1f} с, "
+            f"бесплатные {scheduler['wait_free']['p95']:.1f} с\n\n"
+            f"📖 *Заготовки обоснований:*\n"
+            f"• Запущено: {prefetch['started']}, пропущено: {prefetch['skipped']}, отменено: {prefetch['cancelled']}\n"
+            f"• Попаданий: {prefetch['hit_rate'] * 100:.0f}% ({prefetch['hits']} готовых, {prefetch['joined']} в процессе)\n"
+            f"• Токенов впустую: {prefetch['wasted_tokens']} из {prefetch['used_tokens'] + prefetch['wasted_tokens']}\n\n"
+            f"🔑 *Индекс промокодов:*\n"
+            f"• Активных кодов: {promo_index['size']}{'' if promo_index['ready'] else ' (не загружен)'}\n"
+            f"• Отклонено без базы: {promo_index['rejected']}, передано в базу: {promo_index['passed']}\n"
+            f"• Лимит попыток: {promo_index['rate_limited']}\n\n"
+            f"📦 *Трафик Supabase:*\n"
+            f"• Принято: {received // 1024} КБ, без сжатия {decoded // 1024} КБ\n"
+            f"{traffic_top}\n"
             f"⚡ *Управление через кнопки ниже:*"
         )
 
@@ -946,7 +1157,7 @@ class TarotBot:
             await update.message.reply_text("❌ У вас нет доступа к этой команде")
             return
 
-        users_count = self.database.get_users_count()
+        users_count = await self.database.get_users_count()
 
         users_text = (
             f"👥 *УПРАВЛЕНИЕ ПОЛЬЗОВАТЕЛЯМИ*\n\n"
@@ -993,7 +1204,7 @@ class TarotBot:
         try:
             from promo_manager import PromoCodeManager
             promo_manager = PromoCodeManager(self.database)
-            stats = promo_manager.get_promo_stats()
+            stats = await promo_manager.get_promo_stats()
 
             stats_text = f"""
     🎫 *УПРАВЛЕНИЕ ПРОМОКОДАМИ*
@@ -1089,8 +1300,8 @@ class TarotBot:
         telegram_id = int(user_input)
 
         # Проверяем существует ли пользователь
-        user_data = self.database._make_request('users', params={'telegram_id': f'eq.{telegram_id}'})
-        if not user_data or len(user_data) == 0:
+        target_user = await self.database.get_user_by_telegram_id(telegram_id)
+        if not target_user:
             await update.message.reply_text(
                 f"❌ Пользователь с ID {telegram_id} не найден.\n"
                 f"Попробуйте другой ID:",
@@ -1103,7 +1314,6 @@ class TarotBot:
         context.user_data['awaiting_user_id'] = False
         context.user_data['awaiting_user_message'] = True
 
-        target_user = user_data[0]
         await update.message.reply_text(
             f"✅ *Пользователь найден:* {target_user.get('first_name', 'No name')}\n\n"
             f"Теперь введите сообщение для отправки:",
@@ -1133,8 +1343,8 @@ class TarotBot:
             )
 
             # Получаем информацию о пользователе для отчета
-            user_data = self.database._make_request('users', params={'telegram_id': f'eq.{telegram_id}'})
-            user_name = user_data[0].get('first_name', 'Unknown') if user_data else 'Unknown'
+            target_user = await self.database.get_user_by_telegram_id(telegram_id)
+            user_name = target_user.get('first_name', 'Unknown') if target_user else 'Unknown'
 
             await update.message.reply_text(
                 f"✅ *Сообщение отправлено!*\n\n"
@@ -1167,7 +1377,7 @@ class TarotBot:
             await update.message.reply_text("❌ У вас нет доступа к этой команде")
             return
 
-        tickets = self.database.get_support_tickets(status='open')
+        tickets = await self.database.get_support_tickets(status='open')
 
         if not tickets:
             await update.message.reply_text("📭 Нет открытых тикетов")
@@ -1211,7 +1421,7 @@ class TarotBot:
         context.user_data['admin_ticket_id'] = ticket_id
 
         # Получаем информацию о тикете
-        ticket_messages = self.database.get_ticket_messages(ticket_id)
+        ticket_messages = await self.database.get_ticket_messages(ticket_id)
 
         if not ticket_messages:
             await query.edit_message_text("❌ Тикет не найден")
@@ -1244,7 +1454,7 @@ class TarotBot:
             return ConversationHandler.END
 
         # Добавляем сообщение админа
-        success = self.database.add_support_message(
+        success = await self.database.add_support_message(
             ticket_id,
             user.id,
             f"Админ {user.first_name}",
@@ -1254,11 +1464,11 @@ class TarotBot:
 
         if success:
             # Отправляем ответ пользователю
-            ticket_info = self.database.get_support_tickets(user_id=None)
+            ticket_info = await self.database.get_support_tickets(user_id=None)
             ticket = next((t for t in ticket_info if t['id'] == ticket_id), None)
 
             if ticket:
-                user_info = self.database.get_user_by_id(ticket['user_id'])
+                user_info = await self.database.get_user_by_id(ticket['user_id'])
                 if user_info:
                     try:
                         await self.application.bot.send_message(
@@ -1297,7 +1507,7 @@ class TarotBot:
             await update.message.reply_text("❌ У вас нет доступа")
             return
 
-        stats = self.get_admin_stats()
+        stats = await self.get_admin_stats()
         stats_text = (
             f"📊 *ДЕТАЛЬНАЯ СТАТИСТИКА*\n\n"
             f"👥 *Пользователи:*\n"
@@ -1333,8 +1543,8 @@ class TarotBot:
         limit = 10
         offset = (page - 1) * limit
 
-        users = self.database.get_all_users(limit=limit, offset=offset)
-        total_users = self.database.get_users_count()
+        users = await self.database.get_all_users(limit=limit, offset=offset)
+        total_users = await self.database.get_users_count()
 
         if not users:
             text = "📭 Пользователи не найдены"
@@ -1406,7 +1616,7 @@ class TarotBot:
 
     async def _perform_users_search(self, update: Update, context, query: str):
         """Выполнить поиск пользователей"""
-        users = self.database.search_users(query)
+        users = await self.database.search_users(query)
 
         if not users:
             text = f"🔍 *Результаты поиска: '{query}'*\n\nПользователи не найдены."
@@ -1460,7 +1670,7 @@ class TarotBot:
             await update.message.reply_text("❌ У вас нет доступа")
             return
 
-        premium_users = self.database.get_users_with_subscription()
+        premium_users = await self.database.get_users_with_subscription()
 
         if not premium_users:
             text = "💎 *ПРЕМИУМ ПОЛЬЗОВАТЕЛИ*\n\nПремиум пользователи не найдены."
@@ -1512,19 +1722,21 @@ class TarotBot:
             await update.message.reply_text("❌ У вас нет доступа")
             return
 
-        all_users = self.database.get_all_users(limit=1000)  # Получаем всех для статистики
-        premium_users = self.database.get_users_with_subscription()
+        stats = await self._get_dashboard_stats()
+        if stats is None:
+            await update.effective_message.reply_text("❌ Статистика временно недоступна")
+            return
 
-        total_users = len(all_users)
-        premium_count = len(premium_users)
+        total_users = stats['total_users']
+        premium_count = stats['premium_users']
         free_count = total_users - premium_count
 
         # Статистика по предсказаниям
-        total_predictions = sum(user.get('predictions_count', 0) for user in all_users)
+        total_predictions = stats['predictions_sum']
         avg_predictions = total_predictions / total_users if total_users > 0 else 0
 
         # Статистика по доходам
-        total_income = sum(user.get('total_spent', 0) for user in all_users)
+        total_income = stats['total_income']
         avg_income = total_income / premium_count if premium_count > 0 else 0
 
         text = (
@@ -1533,16 +1745,17 @@ class TarotBot:
             f"• Всего пользователей: {total_users}\n"
             f"• Премиум: {premium_count}\n"
             f"• Бесплатных: {free_count}\n"
-            f"• Конверсия в премиум: {premium_count / total_users * 100:.1f}%\n\n"
+            f"• Конверсия в премиум: {stats['conversion']:.1f}%\n\n"
 
             f"🔮 *Предсказания:*\n"
             f"• Всего предсказаний: {total_predictions}\n"
-            f"• В среднем на пользователя: {avg_predictions:.1f}\n\n"
+            f"• В среднем на пользователя: {avg_predictions:.1f}\n"
+            f"• За 7 дней: {' / '.join(str(count) for day, count in stats['predictions_by_day'])}\n\n"
 
             f"💰 *Финансы:*\n"
             f"• Общий доход: {total_income}₽\n"
             f"• Средний чек: {avg_income:.0f}₽\n"
-            f"• MRR: {premium_count * 199}₽\n"
+            f"• MRR: {stats['mrr']}₽\n"
         )
 
         keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="admin_users")]]
@@ -1650,116 +1863,82 @@ class TarotBot:
         query = update.callback_query
         await query.answer()
 
-        # Получаем пользователей в зависимости от цели
-        if target == 'premium':
-            users = self.database.get_users_with_subscription()
-        elif target == 'free':
-            all_users = self.database.get_all_users(limit=1000)
-            premium_users = self.database.get_users_with_subscription()
-            premium_ids = {u['telegram_id'] for u in premium_users}
-            users = [u for u in all_users if u['telegram_id'] not in premium_ids]
-        else:  # all
-            users = self.database.get_all_users(limit=1000)
-
-        total_users = len(users)
-        successful = 0
-        failed = 0
+        if self.broadcast_engine.is_running():
+            job = self.broadcast_engine.job
+            await query.edit_message_text(
+                f"⏳ *Уже идет рассылка*\n\n"
+                f"✉️ Обработано: {job.processed}/{job.total}\n"
+                f"Дождитесь ее завершения.",
+                parse_mode='Markdown'
+            )
+            return
+
+        # Получателей считаем на сервере, сами они читаются пачками во время рассылки
+        total_users = await self.database.count_broadcast_recipients(target)
 
         # Обновляем сообщение о начале рассылки
         progress_msg = await query.edit_message_text(
             f"📢 *НАЧАЛАСЬ РАССЫЛКА*\n\n"
             f"👥 Получателей: {total_users}\n"
-            f"✉️ Отправлено: 0/{total_users}\n"
-            f"✅ Успешно: 0\n"
-            f"❌ Ошибок: 0",
+            f"✉️ Отправлено: 0/{total_users}",
             parse_mode='Markdown'
         )
 
-        # Выполняем рассылку
-        for i, user_data in enumerate(users, 1):
-            try:
-                telegram_id = user_data.get('telegram_id')
-                if telegram_id:
-                    await context.bot.send_message(
-                        chat_id=telegram_id,
-                        text=message,
-                        parse_mode='Markdown'
-                    )
-                    successful += 1
-                else:
-                    failed += 1
-            except Exception as e:
-                failed += 1
-                logger.error(f"❌ Ошибка отправки пользователю {user_data.get('id')}: {e}")
-
-            # Обновляем прогресс каждые 10 сообщений или в конце
-            if i % 10 == 0 or i == total_users:
-                try:
-                    await progress_msg.edit_text(
-                        f"📢 *РАССЫЛКА В ПРОЦЕССЕ*\n\n"
-                        f"👥 Получателей: {total_users}\n"
-                        f"✉️ Отправлено: {i}/{total_users}\n"
-                        f"✅ Успешно: {successful}\n"
-                        f"❌ Ошибок: {failed}",
-                        parse_mode='Markdown'
-                    )
-                except:
-                    pass
-
-            # Небольшая задержка чтобы не превысить лимиты Telegram
-            await asyncio.sleep(0.1)
-
-        # Финальный отчет
-        report_text = (
-            f"📢 *РАССЫЛКА ЗАВЕРШЕНА*\n\n"
-            f"👥 Всего получателей: {total_users}\n"
-            f"✅ Успешно отправлено: {successful}\n"
-            f"❌ Не удалось отправить: {failed}\n"
-            f"📊 Успешных доставок: {successful / total_users * 100:.1f}%"
-        )
-
-        keyboard = [[InlineKeyboardButton("🔙 В админ панель", callback_data="admin_back")]]
-
-        await progress_msg.edit_text(
-            report_text,
+        # Рассылка идет в фоне, обработчик администратора сразу освобождается
+        job = BroadcastJob(message, target, total_users, chat_id=progress_msg.chat_id, message_id=progress_msg.message_id)
+        self.broadcast_engine.start(job, on_progress=self._report_broadcast_progress)
+
+    async def _report_broadcast_progress(self, job: BroadcastJob, finished: bool):
+        """Обновляет сообщение администратора с прогрессом рассылки"""
+        if finished:
+            delivery_rate = job.successful / job.total * 100 if job.total else 0
+            text = (
+                f"📢 *РАССЫЛКА ЗАВЕРШЕНА*\n\n"
+                f"👥 Всего получателей: {job.total}\n"
+                f"✅ Успешно отправлено: {job.successful}\n"
+                f"❌ Не удалось отправить: {job.failed}\n"
+                f"📊 Успешных доставок: {delivery_rate:.1f}%"
+            )
+            keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 В админ панель", callback_data="admin_back")]])
+        else:
+            text = (
+                f"📢 *РАССЫЛКА В ПРОЦЕССЕ*\n\n"
+                f"👥 Получателей: {job.total}\n"
+                f"✉️ Отправлено: {job.processed}/{job.total}\n"
+                f"✅ Успешно: {job.successful}\n"
+                f"❌ Ошибок: {job.failed}\n"
+                f"⏸ Пауз по лимиту Telegram: {job.retry_after_hits}"
+            )
+            if job.error:
+                text += "\n\n⚠️ База недоступна, рассылка продолжится после перезапуска бота"
+            keyboard = None
+
+        await self.application.bot.edit_message_text(
+            text,
+            chat_id=job.chat_id,
+            message_id=job.message_id,
             parse_mode='Markdown',
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=keyboard
         )
 
-    def get_admin_stats(self):
-        """Получает статистику для админ-панели"""
-        try:
-            # Получаем базовую статистику
-            users = self.database.get_all_users(limit=1)
-            tickets = self.database.get_support_tickets(status='open')
-            predictions = self.database._make_request('predictions')
-
-            total_users = self.database.get_users_count()
-            open_tickets = len(tickets) if tickets else 0
-            total_predictions = len(predictions) if predictions else 0
-
-            # Считаем активные подписки
-            active_subscriptions = 0
-            all_users = self.database.get_all_users(limit=1000)
-            if all_users:
-                for user in all_users:
-                    if self.database._is_subscription_active(user):
-                        active_subscriptions += 1
+    async def _get_dashboard_stats(self):
+        """Снимок статистики из памяти; если он еще не загружен - сверка с базой"""
+        stats = self.dashboard.snapshot()
+        if stats is None and await self.dashboard.reconcile():
+            stats = self.dashboard.snapshot()
+        return stats
 
-            return {
-                'total_users': total_users,
-                'active_subscriptions': active_subscriptions,
-                'open_tickets': open_tickets,
-                'total_predictions': total_predictions
-            }
-        except Exception as e:
-            logger.error(f"❌ Ошибка получения статистики: {e}")
+    async def get_admin_stats(self):
+        """Получает статистику для админ-панели"""
+        stats = await self._get_dashboard_stats()
+        if stats is None:
             return {
                 'total_users': "N/A",
                 'active_subscriptions': "N/A",
                 'open_tickets': "N/A",
                 'total_predictions': "N/A"
             }
+        return stats
 
     # СУЩЕСТВУЮЩИЕ ВСПОМОГАТЕЛЬНЫЕ МЕТОДЫ
     def get_prediction_keyboard(self):
@@ -1794,6 +1973,8 @@ class TarotBot:
             await self.show_spreads_menu_from_callback(query, context)
         elif query.data == "profile":
             await self.profile(update, context)
+        elif query.data.startswith("history_"):
+            await self.history(update, context)
         elif query.data == "subscription":
             await self.subscription(update, context)
         elif query.data == "month_subscription":
@@ -1874,26 +2055,43 @@ class TarotBot:
             return
 
         # Проверяем лимиты для расширенного предсказания
-        db_user = self.database.get_or_create_user(user)
-        if not self.database.can_user_make_prediction(db_user['telegram_id']):
-            await self._show_subscription_required(query, db_user)
+        session = await self._get_session(user, context, query.message)
+        if not session:
+            return
+        db_user = session['user']
+        if session['stats']['remaining_predictions'] <= 0:
+            await self._show_subscription_required(query, session['stats'])
             return
 
         await query.edit_message_text("📖 *Погружаюсь в глубины символов...* 🔮\n*Анализирую кармические связи...* 🌌")
 
+        async def show_queue_position(position):
+            await query.edit_message_text(f"📖 *Погружаюсь в глубины символов...* 🔮\n⏳ *Вы в очереди: {position}*")
+
         try:
-            # Генерируем совершенно новое расширенное предсказание
-            explanation = await self.ai_assistant.generate_detailed_explanation(
-                user_data['prediction_type'],
-                user_data['name'],
-                user_data['partner_name'],
-                user_data['birth_date'],
-                user_data['zodiac_sign'],
-                user_data['cards']
-            )
+            # Обоснование могло быть сгенерировано заранее
+            explanation = await self.explanation_prefetcher.take(db_user['telegram_id'], user_data)
+            if explanation is None:
+                # Генерируем совершенно новое расширенное предсказание
+                premium = session['stats']['has_subscription']
+                async with self.llm_scheduler.slot(db_user['telegram_id'], premium, on_position=show_queue_position):
+                    editor = ThrottledMessageEditor(
+                        query.edit_message_text,
+                        header="📖 РАСШИРЕННОЕ ПРЕДСКАЗАНИЕ\n\n",
+                        tracker=self.first_token_latency
+                    )
+                    explanation = await self.ai_assistant.generate_detailed_explanation(
+                        user_data['prediction_type'],
+                        user_data['name'],
+                        user_data['partner_name'],
+                        user_data['birth_date'],
+                        user_data['zodiac_sign'],
+                        user_data['cards'],
+                        on_partial=editor.update if LLM_STREAMING else None
+                    )
 
             # Сохраняем расширенное предсказание как отдельную запись
-            self.database.save_prediction(
+            if await self.database.save_prediction(
                 db_user['telegram_id'],
                 f"{user_data['prediction_type']}_detailed",  # Отмечаем как расширенное
                 user_data['name'],
@@ -1902,7 +2100,8 @@ class TarotBot:
                 user_data['zodiac_sign'],
                 user_data['cards'],
                 explanation
-            )
+            ):
+                self._count_prediction(session)
 
             response = f"""
 📖 *РАСШИРЕННОЕ ПРЕДСКАЗАНИЕ*
@@ -1983,7 +2182,9 @@ class TarotBot:
             logger.warning(f"❌ Неожиданный ввод промокода {code}. Флаг: {context.user_data.get('awaiting_promo_code')}")
             # Все равно попробуем обработать, если пользователь явно ввел промокод
             logger.info(f"🔑 Попытка обработки промокода {code} без флага")
-            success = self.database.use_promo_code(code, user.id)
+            success = await self._redeem_promo(update, code)
+            if success is None:
+                return
 
             if success:
                 await update.message.reply_text(
@@ -2005,7 +2206,9 @@ class TarotBot:
         logger.info(f"🔑 Флаг awaiting_promo_code сброшен")
 
         # Активируем промокод
-        success = self.database.use_promo_code(code, user.id)
+        success = await self._redeem_promo(update, code)
+        if success is None:
+            return
 
         if success:
             logger.info(f"✅ Промокод {code} успешно активирован для пользователя {user.id}")
@@ -2061,16 +2264,31 @@ class TarotBot:
 
             from promo_manager import PromoCodeManager
             promo_manager = PromoCodeManager(self.database)
-            codes = promo_manager.create_promo_batch(count, days, max_uses, user.id)
+            started = time.perf_counter()
+            codes = await promo_manager.create_promo_batch(count, days, max_uses, user.id)
+            elapsed = time.perf_counter() - started
+
+            # Большая партия не помещается в одно сообщение Telegram
+            codes_text = "\n".join([f"• `{code}`" for code in codes[:PROMO_CODES_SHOWN]])
+            if len(codes) > PROMO_CODES_SHOWN:
+                codes_text += f"\n… и еще {len(codes) - PROMO_CODES_SHOWN}"
 
-            if codes:
-                codes_text = "\n".join([f"• `{code}`" for code in codes])
+            if codes and len(codes) == count:
                 await update.message.reply_text(
                     f"✅ *Создано {len(codes)} промокодов*\n\n"
                     f"*Коды:*\n{codes_text}\n\n"
                     f"*Параметры:*\n"
                     f"• Дней: {days}\n"
-                    f"• Использований: {max_uses}",
+                    f"• Использований: {max_uses}\n\n"
+                    f"⏱ {elapsed:.2f} с, {len(codes) / elapsed if elapsed else 0:.0f} кодов/с",
+                    parse_mode='Markdown'
+                )
+            elif codes:
+                # Часть кодов уже действует: админ должен их увидеть
+                await update.message.reply_text(
+                    f"❌ *Создано только {len(codes)} из {count} промокодов*\n\n"
+                    f"Остальные не созданы, создайте недостающие повторно\n\n"
+                    f"*Созданные коды:*\n{codes_text}",
                     parse_mode='Markdown'
                 )
             else:
@@ -2087,7 +2305,7 @@ class TarotBot:
             await update.message.reply_text("❌ У вас нет доступа")
             return
 
-        promos = self.database.get_all_promo_codes()
+        promos = await self.database.get_all_promo_codes()
 
         if not promos:
             await update.message.reply_text("📭 Промокоды не найдены")
@@ -2121,22 +2339,24 @@ class TarotBot:
             await update.message.reply_text("❌ У вас нет доступа")
             return
 
-        from promo_manager import PromoCodeManager
-        promo_manager = PromoCodeManager(self.database)
-        stats = promo_manager.get_promo_stats()
+        stats = await self._get_dashboard_stats()
+        if stats is None:
+            await update.message.reply_text("❌ Статистика временно недоступна")
+            return
 
+        total_codes = stats['promo_total']
         stats_text = f"""
 📊 *СТАТИСТИКА ПРОМОКОДОВ*
 
 *Общая статистика:*
-• Всего кодов: {stats['total_codes']}
-• Активных: {stats['active_codes']}
-• Использованных: {stats['used_codes']}
-• Всего активаций: {stats['total_uses']}
+• Всего кодов: {total_codes}
+• Активных: {stats['promo_active']}
+• Использованных: {stats['promo_used']}
+• Всего активаций: {stats['promo_uses']}
 
 *Эффективность:*
-• Конверсия: {stats['used_codes']/stats['total_codes']*100:.1f}% кодов использованы
-• В среднем использований на код: {stats['total_uses']/stats['total_codes']:.1f}
+• Конверсия: {stats['promo_used'] / total_codes * 100 if total_codes else 0:.1f}% кодов использованы
+• В среднем использований на код: {stats['promo_uses'] / total_codes if total_codes else 0:.1f}
         """
 
         await update.message.reply_text(stats_text, parse_mode='Markdown')
@@ -2194,18 +2414,15 @@ class TarotBot:
             else:
                 await update.message.reply_text(simple_text)
 
-    def _get_user_status_text(self, db_user):
+    def _get_user_status_text(self, stats):
         """Получить текстовый статус пользователя"""
-        stats = self.database.get_user_stats(db_user['telegram_id'])
         if stats['has_subscription']:
             return "💎 ПРЕМИУМ"
         else:
             return "🆓 БЕСПЛАТНЫЙ"
 
-    def _get_prediction_footer(self, db_user):
+    def _get_prediction_footer(self, stats):
         """Получить футер для предсказания"""
-        stats = self.database.get_user_stats(db_user['telegram_id'])
-
         if stats['has_subscription']:
             return "Пусть звезды благоволят вам! 💫"
         else:
@@ -2225,9 +2442,8 @@ class TarotBot:
         else:
             return "Не активирована"
 
-    async def _show_subscription_required(self, update, db_user):
+    async def _show_subscription_required(self, update, stats):
         """Показать сообщение о необходимости подписки"""
-        stats = self.database.get_user_stats(db_user['telegram_id'])
 
         text = f"""
 ❌ *ЛИМИТ ПРЕДСКАЗАНИЙ ИСЧЕРПАН*
@@ -1,9 +1,12 @@
 import aiohttp
+import json
 import random
 from datetime import datetime
 from typing import List, Dict
 import logging
 
+from llm_session import LLMSession
+
 logger = logging.getLogger(__name__)
 
 
@@ -13,6 +16,9 @@ class OpenRouterAssistant:
         self.model = model
         self.url = "https://openrouter.ai/api/v1/chat/completions"
 
+        # Пул соединений к openrouter.ai живет все время работы бота
+        self.http = LLMSession("OpenRouter")
+
         self.tarot_cards = [
             "Шут", "Маг", "Верховная Жрица", "Императрица", "Император",
             "Иерофант", "Влюбленные", "Колесница", "Сила", "Отшельник",
@@ -29,6 +35,16 @@ class OpenRouterAssistant:
             (12, 31): "Козерог"
         }
 
+    async def start(self):
+        """Открывает общую сессию к OpenRouter"""
+        await self.http.start()
+
+    async def close(self):
+        await self.http.close()
+
+    def get_connection_stats(self) -> dict:
+        return self.http.get_stats()
+
     def get_zodiac_sign(self, birth_date: datetime) -> str:
         day = birth_date.day
         month = birth_date.month
@@ -42,8 +58,12 @@ class OpenRouterAssistant:
         return random.sample(self.tarot_cards, count)
 
     async def generate_tarot_prediction(self, prediction_type: str, name: str, partner_name: str, birth_date: str,
-                                        zodiac_sign: str, cards: List[str]) -> str:
-        """Генерация основного предсказания с учетом типа расклада"""
+                                        zodiac_sign: str, cards: List[str], on_partial=None) -> str:
+        """Генерация основного предсказания с учетом типа расклада.
+
+        Если передан on_partial, ответ запрашивается потоком (SSE), и накопленный
+        текст передается в корутину on_partial по мере поступления.
+        """
 
         # Случайный выбор стиля предсказания
         styles = [
@@ -66,50 +86,56 @@ class OpenRouterAssistant:
         try:
             logger.info(f"🔮 Подключение к энергиям карт для {prediction_type} (стиль: {style})")
 
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
-                data = {
-                    "model": self.model,
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": self._get_system_prompt(prediction_type, tone, style, length)
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "max_tokens": 800,
-                    "temperature": 0.95,
-                    "top_p": 0.9,
-                    "frequency_penalty": 0.7,
-                    "presence_penalty": 0.6,
-                }
-
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "https://t.me",
-                    "X-Title": "Tarot Bot"
-                }
-
-                async with session.post(self.url, headers=headers, json=data) as response:
-
-                    if response.status == 200:
+            session = await self.http.get_session()
+
+            data = {
+                "model": self.model,
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": self._get_system_prompt(prediction_type, tone, style, length)
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                "max_tokens": 800,
+                "temperature": 0.95,
+                "top_p": 0.9,
+                "frequency_penalty": 0.7,
+                "presence_penalty": 0.6,
+                "stream": on_partial is not None,
+            }
+
+            headers = {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "https://t.me",
+                "X-Title": "Tarot Bot"
+            }
+
+            async with session.post(self.url, headers=headers, json=data,
+                                    timeout=aiohttp.ClientTimeout(total=30)) as response:
+
+                if response.status == 200:
+                    if on_partial:
+                        response_text = (await self._read_stream(response, on_partial)).strip()
+                    else:
                         result = await response.json()
                         response_text = result["choices"][0]["message"]["content"].strip()
 
-                        if response_text and self._is_russian(response_text):
-                            logger.info("✅ Успешное подключение к энергиям карт")
-                            return self._clean_response(response_text)
-                        else:
-                            logger.warning("❌ Энергии карт вернули неясный ответ")
-                            return self._get_truly_random_fallback(prediction_type, name, partner_name, cards,
-                                                                   zodiac_sign)
+                    if response_text and self._is_russian(response_text):
+                        logger.info("✅ Успешное подключение к энергиям карт")
+                        return self._clean_response(response_text)
                     else:
-                        error_text = await response.text()
-                        logger.error(f"❌ Ошибка подключения к энергиям карт: {response.status} - {error_text}")
-                        return self._get_truly_random_fallback(prediction_type, name, partner_name, cards, zodiac_sign)
+                        logger.warning("❌ Энергии карт вернули неясный ответ")
+                        return self._get_truly_random_fallback(prediction_type, name, partner_name, cards,
+                                                               zodiac_sign)
+                else:
+                    error_text = await response.text()
+                    logger.error(f"❌ Ошибка подключения к энергиям карт: {response.status} - {error_text}")
+                    return self._get_truly_random_fallback(prediction_type, name, partner_name, cards, zodiac_sign)
 
         except Exception as e:
             logger.error(f"❌ Прервано соединение с энергиями карт: {e}")
@@ -519,54 +545,68 @@ class OpenRouterAssistant:
 """
 
     async def generate_detailed_explanation(self, prediction_type: str, name: str, partner_name: str, birth_date: str,
-                                            zodiac_sign: str, cards: List[str]) -> str:
-        """Генерация расширенного обоснования как отдельного предсказания"""
+                                            zodiac_sign: str, cards: List[str], on_partial=None,
+                                            usage: dict = None) -> str:
+        """Генерация расширенного обоснования как отдельного предсказания.
+
+        on_partial работает так же, как в generate_tarot_prediction. Если передан
+        словарь usage, в него записывается расход токенов из ответа API; при
+        запасном ответе он остается пустым.
+        """
 
         prompt = self._create_detailed_prompt(prediction_type, name, partner_name, birth_date, zodiac_sign, cards)
 
         try:
             logger.info(f"📖 Погружение в глубины символов для {prediction_type}")
 
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=35)) as session:
-                data = {
-                    "model": self.model,
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": self._get_detailed_system_prompt(prediction_type)
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "max_tokens": 1000,
-                    "temperature": 0.98,
-                    "top_p": 0.85,
-                    "frequency_penalty": 0.8,
-                    "presence_penalty": 0.7,
-                }
-
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "https://t.me",
-                    "X-Title": "Tarot Bot"
-                }
-
-                async with session.post(self.url, headers=headers, json=data) as response:
-
-                    if response.status == 200:
+            session = await self.http.get_session()
+
+            data = {
+                "model": self.model,
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": self._get_detailed_system_prompt(prediction_type)
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                "max_tokens": 1000,
+                "temperature": 0.98,
+                "top_p": 0.85,
+                "frequency_penalty": 0.8,
+                "presence_penalty": 0.7,
+                "stream": on_partial is not None,
+            }
+
+            headers = {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "https://t.me",
+                "X-Title": "Tarot Bot"
+            }
+
+            async with session.post(self.url, headers=headers, json=data,
+                                    timeout=aiohttp.ClientTimeout(total=35)) as response:
+
+                if response.status == 200:
+                    if on_partial:
+                        response_text = (await self._read_stream(response, on_partial)).strip()
+                    else:
                         result = await response.json()
                         response_text = result["choices"][0]["message"]["content"].strip()
 
-                        if response_text and self._is_russian(response_text):
-                            logger.info("✅ Успешное погружение в глубины символов")
-                            return self._clean_response(response_text)
-                        else:
-                            return self._get_detailed_fallback(prediction_type, name, partner_name, cards, zodiac_sign)
+                    if response_text and self._is_russian(response_text):
+                        logger.info("✅ Успешное погружение в глубины символов")
+                        if usage is not None and not on_partial:
+                            usage.update(result.get("usage") or {})
+                        return self._clean_response(response_text)
                     else:
                         return self._get_detailed_fallback(prediction_type, name, partner_name, cards, zodiac_sign)
+                else:
+                    return self._get_detailed_fallback(prediction_type, name, partner_name, cards, zodiac_sign)
 
         except Exception as e:
             logger.error(f"❌ Прервано погружение в глубины символов: {e}")
@@ -641,6 +681,28 @@ class OpenRouterAssistant:
 СДЕЛАЙ анализ по-настоящему глубоким и неповторимым!
 """
 
+    async def _read_stream(self, response, on_partial) -> str:
+        """Читает потоковый ответ в формате SSE, передавая накопленный текст в on_partial"""
+        text = ""
+
+        async for raw_line in response.content:
+            line = raw_line.decode('utf-8').strip()
+
+            # Пропускаем пустые строки и комментарии вида ": OPENROUTER PROCESSING"
+            if not line.startswith('data:'):
+                continue
+
+            payload = line[len('data:'):].strip()
+            if payload == '[DONE]':
+                break
+
+            delta = json.loads(payload)["choices"][0].get("delta", {}).get("content")
+            if delta:
+                text += delta
+                await on_partial(text)
+
+        return text
+
     def _clean_response(self, text: str) -> str:
         """Очищает ответ от мусора"""
         lines = text.split('\n')
@@ -0,0 +1,376 @@
+import asyncio
+import json
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from aiohttp import web
+
+# Ответы меньше этого размера отдаются без сжатия, как у шлюза Supabase
+COMPRESS_MIN_SIZE = 1024
+
+# Таблицы, в которых updated_at при вставке и изменении ставит триггер базы
+TOUCHED_TABLES = ('promo_codes',)
+
+
+class PostgrestStub:
+    """Минимальный локальный PostgREST для бенчмарков без доступа к Supabase.
+
+    Хранит таблицы в памяти, понимает фильтры eq/neq/gt/gte/lt/lte/is, or с
+    вложенными and/or, фильтр связанной таблицы users.column при users!inner()
+    в select (связь по колонке <таблица без s>_id), select, order по нескольким
+    колонкам, limit, offset, Prefer: count=exact и вставку с on_conflict и
+    Prefer: resolution=ignore-duplicates, Prefer: return=minimal и сжатие gzip
+    по Accept-Encoding, а также RPC record_prediction,
+    record_payment, record_predictions, admin_stats, redeem_promo и session_bootstrap
+    из supabase_functions.sql.
+    Каждый ответ задерживается на latency секунд, чтобы имитировать сетевую
+    задержку до Supabase. Сервер работает в отдельном потоке
+    со своим event loop, поэтому его не блокируют синхронные клиенты.
+    """
+
+    def __init__(self, latency: float = 0.02, host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.tables = {}
+        self.sequences = {}
+        self.requests_count = 0
+
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._started = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/rest/v1"
+
+    def start(self):
+        """Запускает сервер в фоновом потоке"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self):
+        """Останавливает сервер"""
+        if self._loop:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+        app = web.Application(middlewares=[self._compress])
+        app.router.add_route('POST', '/rest/v1/rpc/{function}', self._handle_rpc)
+        app.router.add_route('*', '/rest/v1/{table}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+
+        self._started.set()
+        self._loop.run_forever()
+
+    def insert(self, table: str, row: dict) -> dict:
+        """Добавляет запись в таблицу, присваивая ей id"""
+        self.sequences[table] = self.sequences.get(table, 0) + 1
+        record = {'id': self.sequences[table], **row}
+        record.setdefault('created_at', datetime.utcnow().isoformat() + 'Z')
+        self._touch(table, record)
+        self.tables.setdefault(table, []).append(record)
+        return record
+
+    @staticmethod
+    def _touch(table: str, row: dict):
+        if table in TOUCHED_TABLES:
+            row['updated_at'] = datetime.utcnow().isoformat() + 'Z'
+
+    def _matches(self, row: dict, column: str, condition: str) -> bool:
+        operator, _, value = condition.partition('.')
+        if len(value) > 1 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        actual = row.get(column)
+        if operator == 'eq':
+            return str(actual).lower() == value.lower() if isinstance(actual, bool) else str(actual) == value
+        if operator == 'neq':
+            # Как в SQL: NULL не равен и не "не равен" ничему
+            return actual is not None and str(actual) != value
+        if operator == 'is':
+            return actual is None if value == 'null' else str(actual).lower() == value
+        if operator in ('gt', 'gte', 'lt', 'lte'):
+            if actual is None:
+                return False
+            left, right = self._sort_key(actual), self._sort_key(value)
+            return {'gt': left > right, 'gte': left >= right, 'lt': left < right, 'lte': left <= right}[operator]
+        return True
+
+    @staticmethod
+    def _split_logic(expression: str) -> list:
+        parts, depth, quoted, start = [], 0, False, 0
+        for position, char in enumerate(expression):
+            if char == '"':
+                quoted = not quoted
+            elif not quoted and char in '()':
+                depth += 1 if char == '(' else -1
+            elif not quoted and char == ',' and depth == 0:
+                parts.append(expression[start:position])
+                start = position + 1
+        parts.append(expression[start:])
+        return parts
+
+    def _matches_logic(self, row: dict, operator: str, expression: str) -> bool:
+        """Фильтр or=(column.op.value,and(...),...)"""
+        results = []
+        for part in self._split_logic(expression):
+            nested, _, rest = part.partition('(')
+            if nested in ('and', 'or') and rest.endswith(')'):
+                results.append(self._matches_logic(row, nested, rest[:-1]))
+            else:
+                column, _, condition = part.partition('.')
+                results.append(self._matches(row, column, condition))
+        return any(results) if operator == 'or' else all(results)
+
+    @staticmethod
+    def _sort_key(value):
+        # Числа сравниваем как числа, чтобы id=10 шел после id=9
+        try:
+            return 0, float(value), ''
+        except (TypeError, ValueError):
+            return 1, 0.0, str(value or '')
+
+    def _filter(self, table: str, query) -> list:
+        rows = self.tables.get(table, [])
+        for column, condition in query.items():
+            if column in ('order', 'limit', 'offset', 'select', 'on_conflict'):
+                continue
+            if column == 'or':
+                rows = [row for row in rows if self._matches_logic(row, 'or', condition[1:-1])]
+            elif '.' in column:
+                other, _, other_column = column.partition('.')
+                ids = {row['id'] for row in self._filter(other, {other_column: condition})}
+                rows = [row for row in rows if row.get(f'{other[:-1]}_id') in ids]
+            else:
+                rows = [row for row in rows if self._matches(row, column, condition)]
+        return rows
+
+    def _select(self, table: str, query) -> list:
+        rows = self._filter(table, query)
+
+        if 'order' in query:
+            # Устойчивая сортировка с последнего ключа до первого
+            for term in reversed(query['order'].split(',')):
+                column, _, direction = term.partition('.')
+                rows = sorted(rows, key=lambda row: self._sort_key(row.get(column)), reverse=direction == 'desc')
+
+        offset = int(query.get('offset', 0))
+        rows = rows[offset:]
+        if 'limit' in query:
+            rows = rows[:int(query['limit'])]
+        return rows
+
+    @staticmethod
+    @web.middleware
+    async def _compress(request: web.Request, handler):
+        response = await handler(request)
+        if isinstance(response, web.Response) and response.body and len(response.body) >= COMPRESS_MIN_SIZE:
+            response.enable_compression()
+        return response
+
+    @staticmethod
+    def _minimal(request: web.Request) -> bool:
+        return 'return=minimal' in request.headers.get('Prefer', '')
+
+    @staticmethod
+    def _project(rows: list, select: str) -> list:
+        if not select or select == '*':
+            return rows
+        columns = [column for column in select.split(',') if '(' not in column]
+        return [{column: row.get(column) for column in columns} for row in rows]
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.requests_count += 1
+        await asyncio.sleep(self.latency)
+
+        table = request.match_info['table']
+        query = request.rel_url.query
+
+        if request.method == 'GET':
+            rows = self._select(table, query)
+            headers = {}
+            if 'count=exact' in request.headers.get('Prefer', ''):
+                headers['Content-Range'] = f"0-{max(len(rows) - 1, 0)}/{len(self._filter(table, query))}"
+            return web.json_response(self._project(rows, query.get('select')), headers=headers)
+
+        if request.method == 'POST':
+            payload = await request.json()
+            payload = payload if isinstance(payload, list) else [payload]
+            if 'on_conflict' in query and 'resolution=ignore-duplicates' in request.headers.get('Prefer', ''):
+                column = query['on_conflict']
+                existing = {row.get(column) for row in self.tables.get(table, [])}
+                payload = [row for row in payload if row.get(column) not in existing]
+            created = [self.insert(table, row) for row in payload]
+            if self._minimal(request):
+                return web.Response(status=201)
+            return web.json_response(self._project(created, query.get('select')), status=201)
+
+        if request.method == 'PATCH':
+            payload = await request.json()
+            rows = self._select(table, query)
+            for row in rows:
+                row.update(payload)
+                self._touch(table, row)
+            if self._minimal(request):
+                return web.Response(status=204)
+            return web.json_response(self._project(rows, query.get('select')))
+
+        if request.method == 'DELETE':
+            rows = self._select(table, query)
+            self.tables[table] = [row for row in self.tables.get(table, []) if row not in rows]
+            return web.json_response(rows)
+
+        return web.Response(status=405)
+
+    async def _handle_rpc(self, request: web.Request) -> web.Response:
+        self.requests_count += 1
+        await asyncio.sleep(self.latency)
+
+        increments = {
+            'record_prediction': ('predictions', 'predictions_count', lambda row: 1),
+            'record_payment': ('payments', 'total_spent', lambda row: row['amount']),
+        }
+        function = request.match_info['function']
+        args = await request.json()
+
+        if function == 'record_predictions':
+            return web.json_response(self._record_predictions(args['p_rows']))
+        if function == 'admin_stats':
+            return web.json_response(self._admin_stats())
+        if function == 'redeem_promo':
+            return web.json_response(self._redeem_promo(args['p_code'], args['p_telegram_id']))
+        if function == 'session_bootstrap':
+            return web.json_response(self._session_bootstrap(args['p_user'], args['p_free_limit']))
+
+        if function not in increments:
+            return web.Response(status=404)
+
+        table, counter, delta = increments[function]
+
+        # Между чтением и записью нет await, поэтому инкремент атомарен, как в транзакции
+        users = self._select('users', {'telegram_id': f"eq.{args['p_telegram_id']}"})
+        if not users:
+            return web.json_response([])
+
+        user = users[0]
+        user[counter] = (user.get(counter) or 0) + delta(args['p_row'])
+        self.insert(table, {**args['p_row'], 'user_id': user['id']})
+        return web.json_response([user])
+
+    def _record_predictions(self, rows: list) -> list:
+        existing = {(p['user_id'], p.get('created_at')) for p in self.tables.get('predictions', [])}
+        updated = {}
+
+        for row in rows:
+            users = self._select('users', {'telegram_id': f"eq.{row['telegram_id']}"})
+            if not users or (users[0]['id'], row.get('created_at')) in existing:
+                continue
+
+            user = users[0]
+            prediction = {key: value for key, value in row.items() if key != 'telegram_id'}
+            self.insert('predictions', {**prediction, 'user_id': user['id']})
+            existing.add((user['id'], row.get('created_at')))
+            user['predictions_count'] = (user.get('predictions_count') or 0) + 1
+            updated[user['id']] = user
+
+        return list(updated.values())
+
+    def _redeem_promo(self, code: str, telegram_id: int) -> dict:
+        # Между проверкой лимита и инкрементом нет await, как под блокировкой строки
+        promos = self._select('promo_codes', {'code': f"eq.{code.upper()}"})
+        if not promos:
+            return {'status': 'not_found'}
+
+        promo = promos[0]
+        now = datetime.utcnow()
+        if not promo.get('is_active', True):
+            return {'status': 'inactive'}
+        if promo.get('expires_at') and promo['expires_at'] < now.isoformat():
+            return {'status': 'expired'}
+        if (promo.get('used_count') or 0) >= (promo.get('max_uses') or 1):
+            return {'status': 'exhausted'}
+
+        users = self._select('users', {'telegram_id': f"eq.{telegram_id}"})
+        if not users:
+            return {'status': 'no_user'}
+
+        user = users[0]
+        redemptions = self.tables.get('promo_redemptions', [])
+        if any(r['promo_id'] == promo['id'] and r['user_id'] == user['id'] for r in redemptions):
+            return {'status': 'already_used'}
+
+        self.insert('promo_redemptions', {'promo_id': promo['id'], 'user_id': user['id']})
+        promo['used_count'] = (promo.get('used_count') or 0) + 1
+        promo['is_active'] = promo['used_count'] < (promo.get('max_uses') or 1)
+        self._touch('promo_codes', promo)
+
+        was_premium = (user.get('subscription_type') or 'free') != 'free'
+        was_active = was_premium and user.get('is_active', True) and (user.get('subscription_end') or '') > now.isoformat()
+        user.update({
+            'subscription_type': promo.get('subscription_type') or 'premium',
+            'subscription_start': now.isoformat() + 'Z',
+            'subscription_end': (now + timedelta(days=promo.get('days') or 30)).isoformat() + 'Z',
+            'is_active': True,
+            'updated_at': now.isoformat() + 'Z'
+        })
+        return {'status': 'ok', 'user': user, 'promo': promo, 'was_active': was_active, 'was_premium': was_premium}
+
+    def _session_bootstrap(self, user_data: dict, free_limit: int) -> dict:
+        users = self._select('users', {'telegram_id': f"eq.{user_data['telegram_id']}"})
+        created = not users
+        user = users[0] if users else self.insert('users', {**user_data, 'updated_at': datetime.utcnow().isoformat() + 'Z'})
+
+        end = user.get('subscription_end') or ''
+        active = ((user.get('subscription_type') or 'free') != 'free' and user.get('is_active', True)
+                  and end > datetime.utcnow().isoformat())
+        return {
+            'user': user,
+            'created': created,
+            'has_subscription': bool(active),
+            'remaining_predictions': None if active else max(0, free_limit - (user.get('predictions_count') or 0)),
+            'subscription_end': f"{end[8:10]}.{end[5:7]}.{end[:4]}" if end else None
+        }
+
+    def _admin_stats(self) -> dict:
+        users = self.tables.get('users', [])
+        now = datetime.utcnow().isoformat()
+        premium = [user for user in users if user.get('subscription_type') not in (None, 'free')]
+        promos = self.tables.get('promo_codes', [])
+        week_ago = (datetime.utcnow() - timedelta(days=6)).date().isoformat()
+
+        return {
+            'total_users': len(users),
+            'premium_users': len(premium),
+            'active_subscriptions': sum(
+                1 for user in premium
+                if user.get('is_active', True) and (user.get('subscription_end') or '') > now
+            ),
+            'total_predictions': len(self.tables.get('predictions', [])),
+            'predictions_sum': sum(user.get('predictions_count') or 0 for user in users),
+            'total_income': sum(user.get('total_spent') or 0 for user in users),
+            'open_tickets': sum(1 for ticket in self.tables.get('support_tickets', []) if ticket.get('status') == 'open'),
+            'promo_total': len(promos),
+            'promo_active': sum(1 for promo in promos if promo.get('is_active')),
+            'promo_used': sum(1 for promo in promos if promo.get('used_count')),
+            'promo_uses': sum(promo.get('used_count') or 0 for promo in promos),
+            'predictions_by_day': dict(Counter(
+                prediction['created_at'][:10] for prediction in self.tables.get('predictions', [])
+                if prediction.get('created_at', '')[:10] >= week_ago
+            ))
+        }
+
+    def dump(self) -> str:
+        return json.dumps(self.tables, ensure_ascii=False, indent=2)
\ No newline at end of file
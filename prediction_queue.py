@@ -0,0 +1,245 @@
+import asyncio
+import json
+import logging
+import os
+
+from config import (
+    PREDICTION_BATCH_SIZE, PREDICTION_FLUSH_INTERVAL_MS, PREDICTION_SPILL_PATH, PREDICTION_MAX_ATTEMPTS,
+    PREDICTION_RETRY_MAX_DELAY, PREDICTION_DEAD_LETTER_PATH
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionWriteQueue:
+    """Отложенная пакетная запись предсказаний (write-behind).
+
+    save_prediction только кладет строку в буфер, а фоновая задача отправляет
+    накопленные строки одним запросом rpc/record_predictions каждые batch_size
+    строк или каждые flush_interval_ms миллисекунд. Каждая строка сразу
+    дописывается в журнал на диске, перед отправкой пакета журнал сбрасывается
+    на диск через fsync; после успешной отправки журнал атомарно
+    перезаписывается оставшимися строками. Если процесс упадет посреди отправки,
+    строки из журнала будут отправлены при следующем запуске. Повторная отправка
+    безопасна: RPC пропускает строки, которые уже есть в базе.
+
+    После неудачной отправки фоновые повторы идут с растущей паузой (до
+    retry_max_delay секунд). Пакет, не записанный max_attempts раз подряд,
+    делится пополам, пока строка с ошибкой не останется одна. Если база при
+    этом отвечает на чтение (AsyncDatabaseManager.is_reachable), значит она не
+    принимает именно эту строку: строка уходит в dead_letter_path и больше не
+    задерживает строки за ней.
+    """
+
+    def __init__(self, database, batch_size: int = PREDICTION_BATCH_SIZE,
+                 flush_interval_ms: int = PREDICTION_FLUSH_INTERVAL_MS, spill_path: str = PREDICTION_SPILL_PATH,
+                 max_attempts: int = PREDICTION_MAX_ATTEMPTS, retry_max_delay: float = PREDICTION_RETRY_MAX_DELAY,
+                 dead_letter_path: str = PREDICTION_DEAD_LETTER_PATH):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.spill_path = spill_path
+        self.max_attempts = max_attempts
+        self.retry_max_delay = retry_max_delay
+        self.dead_letter_path = dead_letter_path
+
+        self._pending = []
+        self._spill = None
+        self._task = None
+        self._wakeup = None
+        self._flush_lock = None
+
+        # Неудачные отправки подряд и неудачи текущего головного пакета
+        self._failures = 0
+        self._batch_attempts = 0
+        # Сколько строк в начале буфера входило в неудавшийся пакет и размер пакета для них
+        self._suspect = 0
+        self._suspect_size = batch_size
+        self._retry_at = 0.0
+
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+        self.dead_rows = 0
+
+    async def start(self):
+        """Поднимает строки из журнала прошлого запуска и запускает фоновую отправку"""
+        if self._task is not None:
+            return
+
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+        if os.path.exists(self.spill_path):
+            with open(self.spill_path, encoding='utf-8') as f:
+                recovered = [json.loads(line) for line in f if line.strip()]
+            if recovered:
+                logger.warning(f"⚠️ Восстановлено {len(recovered)} неотправленных предсказаний из {self.spill_path}")
+                self._pending.extend(recovered)
+                self._wakeup.set()
+
+        self._spill = open(self.spill_path, 'a', encoding='utf-8')
+        self._task = asyncio.create_task(self._run())
+
+    async def enqueue(self, row: dict):
+        """Кладет строку в буфер и журнал, не дожидаясь записи в базу"""
+        await self.start()
+
+        self._spill.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self._spill.flush()
+        self._pending.append(row)
+
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def has_pending(self, telegram_id: int) -> bool:
+        return any(row['telegram_id'] == telegram_id for row in self._pending)
+
+    @property
+    def failing(self) -> bool:
+        """Последняя отправка не удалась: ждать повторной отправки синхронно не стоит"""
+        return self._failures > 0
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            if loop.time() < self._retry_at:
+                continue
+            try:
+                await self.flush()
+            except Exception as e:
+                self._failures += 1
+                logger.error(f"❌ Ошибка фоновой записи предсказаний: {e}")
+
+    async def flush(self) -> bool:
+        """Отправляет все накопленные строки пакетами по batch_size"""
+        if self._flush_lock is None:
+            return True
+
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self._suspect_size if self._suspect else self.batch_size]
+
+                # Строки пакета должны пережить падение системы до ответа базы
+                self._sync_spill()
+                users = await self.database.record_predictions(batch)
+                if users is not None:
+                    self._commit(batch, users)
+                elif not await self._on_failure(batch):
+                    return False
+
+            return True
+
+    def _commit(self, batch: list, users: list):
+        """Убирает записанные строки из буфера и журнала"""
+        self._pending = [row for row in self._pending if not any(row is sent for sent in batch)]
+        self.flushed_rows += len(batch)
+        self._on_success(len(batch))
+        self._rewrite_spill()
+
+        # Счетчик в кэше уже увеличен при постановке в очередь; свежую запись
+        # из базы кладем только если у пользователя не осталось строк в буфере
+        for user in users:
+            if not self.has_pending(user['telegram_id']):
+                self.database.users_cache.put(user, write_through=True)
+
+    async def _on_failure(self, batch: list) -> bool:
+        """Учитывает неудачу пакета. True - пакет поделен или строка отложена, можно отправлять дальше"""
+        self.failed_flushes += 1
+        self._failures += 1
+        self._batch_attempts += 1
+        self._suspect = max(self._suspect, len(batch))
+        self._retry_at = asyncio.get_running_loop().time() + min(
+            self.flush_interval * 2 ** self._failures, self.retry_max_delay
+        )
+
+        if self._batch_attempts < self.max_attempts:
+            logger.error(f"❌ Не удалось записать {len(batch)} предсказаний, повтор позже")
+            return False
+
+        self._batch_attempts = 0
+        if len(batch) > 1:
+            self._suspect_size = len(batch) // 2
+            logger.warning(f"⚠️ Пакет из {len(batch)} предсказаний не записан {self.max_attempts} раз, "
+                           f"делим по {self._suspect_size}")
+            return True
+
+        # Одна строка: отличаем отказ базы от ее недоступности
+        if not await self.database.is_reachable():
+            # Строку не откладываем, следующая неудача снова проверит базу
+            self._batch_attempts = self.max_attempts - 1
+            logger.error(f"❌ База недоступна, предсказание будет отправлено позже")
+            return False
+
+        # База отвечает: строки за отложенной отправляются без паузы
+        self._dead_letter(batch[0])
+        self._on_success(0)
+        return True
+
+    def _on_success(self, count: int):
+        self._failures = 0
+        self._batch_attempts = 0
+        self._retry_at = 0.0
+        self._suspect = max(0, self._suspect - count)
+        if not self._suspect:
+            self._suspect_size = self.batch_size
+
+    def _dead_letter(self, row: dict):
+        """Переносит строку, которую база не принимает, из буфера в отдельный файл"""
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(row, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._pending = [pending for pending in self._pending if pending is not row]
+        self._suspect = max(0, self._suspect - 1)
+        self.dead_rows += 1
+        self._rewrite_spill()
+
+        # Кэши уже учли это предсказание при постановке в очередь
+        self.database.users_cache.invalidate(row['telegram_id'])
+        self.database.history_cache.invalidate(row['telegram_id'])
+        logger.error(f"❌ Предсказание пользователя {row['telegram_id']} не принято базой, "
+                     f"сохранено в {self.dead_letter_path}")
+
+    def _rewrite_spill(self):
+        """Оставляет в журнале только неотправленные строки"""
+        tmp_path = f"{self.spill_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for row in self._pending:
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._spill.close()
+        os.replace(tmp_path, self.spill_path)
+        self._spill = open(self.spill_path, 'a', encoding='utf-8')
+
+    def _sync_spill(self):
+        """Сбрасывает журнал на диск: flush после каждой строки не переживает падение системы"""
+        if self._spill is not None:
+            os.fsync(self._spill.fileno())
+
+    async def close(self):
+        """Останавливает фоновую задачу и отправляет остаток буфера"""
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        if await self.flush():
+            logger.info(f"✅ Очередь предсказаний сброшена, записано {self.flushed_rows}")
+        else:
+            logger.error(f"❌ {len(self._pending)} предсказаний остались в {self.spill_path} до следующего запуска")
+
+        self._spill.close()
+        self._task = None
\ No newline at end of file
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+
+from config import (
+    PROMO_INDEX_REFRESH_INTERVAL, PROMO_NEGATIVE_TTL, PROMO_NEGATIVE_MAX_SIZE,
+    PROMO_ATTEMPTS_LIMIT, PROMO_ATTEMPTS_WINDOW
+)
+
+logger = logging.getLogger(__name__)
+
+# Ответы rpc/redeem_promo, после которых код больше не может быть активирован
+DEAD_CODE_STATUSES = ('not_found', 'inactive', 'expired', 'exhausted')
+
+
+class PromoCodeIndex:
+    """Локальный индекс активных промокодов перед rpc/redeem_promo.
+
+    При запуске загружает все активные коды, затем каждые refresh_interval секунд
+    дочитывает коды с updated_at не раньше последнего увиденного минус
+    2 * refresh_interval: updated_at ставит база в начале транзакции, и строка,
+    закоммиченная позже уже прочитанных, появляется с более старой отметкой.
+    Повторно прочитанные коды применяются к индексу без изменений. Коды, созданные
+    и погашенные самим ботом, попадают в индекс сразу по событиям
+    AsyncDatabaseManager. Код, которого нет в индексе, отклоняется без запроса
+    к базе; коды, отвергнутые базой, запоминаются на negative_ttl секунд.
+    Попытки одного пользователя ограничены attempts_limit за attempts_window
+    секунд. Известный код по-прежнему активируется атомарно в базе.
+    """
+
+    def __init__(self, database, refresh_interval: float = PROMO_INDEX_REFRESH_INTERVAL,
+                 negative_ttl: float = PROMO_NEGATIVE_TTL, negative_max_size: int = PROMO_NEGATIVE_MAX_SIZE,
+                 attempts_limit: int = PROMO_ATTEMPTS_LIMIT, attempts_window: float = PROMO_ATTEMPTS_WINDOW,
+                 clock=time.monotonic):
+        self.database = database
+        self.refresh_interval = refresh_interval
+        self.negative_ttl = negative_ttl
+        self.negative_max_size = negative_max_size
+        self.attempts_limit = attempts_limit
+        self.attempts_window = attempts_window
+        self._clock = clock
+
+        # code -> id и обратно, чтобы снимать код по событию promo_deactivated(code_id)
+        self._codes = {}
+        self._ids = {}
+        # code -> момент истечения, от самой старой записи к самой свежей
+        self._negative = OrderedDict()
+        # telegram_id -> моменты последних попыток
+        self._attempts = {}
+
+        # Пока индекс не загружен, все коды проверяет база
+        self.ready = False
+        self.watermark = None
+        self.refreshed_at = None
+
+        self.rejected = 0
+        self.rate_limited = 0
+        self.passed = 0
+
+        self._task = None
+
+        database.add_listener(self.on_event)
+
+    async def start(self):
+        """Загружает активные коды и запускает периодическое обновление"""
+        if self._task is not None:
+            return
+
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
+            self._prune_attempts()
+
+    async def refresh(self) -> bool:
+        """Полная загрузка при первом вызове, затем только измененные коды"""
+        full = not self.ready
+        watermark = self.watermark
+
+        try:
+            async for promos in self.database.iter_promo_index(None if full else self._since(watermark)):
+                for promo in promos:
+                    self._apply(promo)
+                    changed = promo.get('updated_at') or promo.get('created_at')
+                    if changed and (watermark is None or changed > watermark):
+                        watermark = changed
+
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось обновить индекс промокодов: {e}")
+            return False
+
+        if full:
+            self.ready = True
+            logger.info(f"✅ Индекс промокодов загружен: {len(self._codes)} активных кодов")
+
+        self.watermark = watermark
+        self.refreshed_at = self._clock()
+        return True
+
+    def _since(self, watermark):
+        """Нижняя граница дочитывания: водяной знак минус окно на поздние коммиты"""
+        if watermark is None:
+            return None
+
+        try:
+            moment = datetime.fromisoformat(watermark.replace('Z', '+00:00'))
+        except ValueError:
+            logger.warning(f"⚠️ Не удалось разобрать updated_at промокода: {watermark}")
+            return watermark
+
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        moment -= timedelta(seconds=2 * self.refresh_interval)
+        return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+    def _apply(self, promo: dict):
+        if promo.get('is_active'):
+            self._add(promo['code'], promo['id'])
+        else:
+            self._remove(promo['code'])
+
+    def _add(self, code: str, code_id=None):
+        code = code.upper()
+        self._codes[code] = code_id
+        if code_id is not None:
+            self._ids[code_id] = code
+        self._negative.pop(code, None)
+
+    def _remove(self, code: str):
+        code_id = self._codes.pop(code.upper(), None)
+        self._ids.pop(code_id, None)
+
+    def on_event(self, event: str, **data):
+        """Применяет события записи промокодов к индексу"""
+        if event == 'promo_created':
+            for code in data.get('codes') or [data['code']]:
+                self._add(code)
+        elif event == 'promo_used' and data.get('deactivated'):
+            self._remove(data['code'])
+        elif event == 'promo_deactivated':
+            code = self._ids.get(data['code_id'])
+            if code is not None:
+                self._remove(code)
+
+    def is_known(self, code: str) -> bool:
+        """Может ли код быть активирован: False означает отказ без запроса к базе"""
+        code = code.upper()
+
+        expires_at = self._negative.get(code)
+        if expires_at is not None:
+            if expires_at > self._clock():
+                return False
+            del self._negative[code]
+
+        return not self.ready or code in self._codes
+
+    def _remember_rejected(self, code: str):
+        self._remove(code)
+        self._negative[code.upper()] = self._clock() + self.negative_ttl
+        self._negative.move_to_end(code.upper())
+        while len(self._negative) > self.negative_max_size:
+            self._negative.popitem(last=False)
+
+    def _allow_attempt(self, telegram_id: int) -> bool:
+        now = self._clock()
+        attempts = self._attempts.setdefault(telegram_id, deque())
+        while attempts and attempts[0] <= now - self.attempts_window:
+            attempts.popleft()
+
+        if len(attempts) >= self.attempts_limit:
+            return False
+        attempts.append(now)
+        return True
+
+    def _prune_attempts(self):
+        """Убирает пользователей, чьи попытки вышли за окно"""
+        horizon = self._clock() - self.attempts_window
+        for telegram_id in [key for key, attempts in self._attempts.items() if attempts[-1] <= horizon]:
+            del self._attempts[telegram_id]
+
+    async def redeem(self, telegram_id: int, code: str) -> str:
+        """Активирует промокод. Статусы rpc/redeem_promo, а также:
+        rate_limited - слишком много попыток, unknown - кода нет в индексе
+        """
+        if not self._allow_attempt(telegram_id):
+            self.rate_limited += 1
+            logger.warning(f"⚠️ Превышен лимит попыток ввода промокода для {telegram_id}")
+            return 'rate_limited'
+
+        if not self.is_known(code):
+            self.rejected += 1
+            logger.info(f"🔑 Промокод {code} отклонен без запроса к базе для {telegram_id}")
+            return 'unknown'
+
+        self.passed += 1
+        status = await self.database.redeem_promo_code(code, telegram_id)
+        if status in DEAD_CODE_STATUSES:
+            self._remember_rejected(code)
+        return status
+
+    def get_stats(self):
+        return {
+            'ready': self.ready,
+            'size': len(self._codes),
+            'negative': len(self._negative),
+            'rejected': self.rejected,
+            'rate_limited': self.rate_limited,
+            'passed': self.passed
+        }
\ No newline at end of file
@@ -1,14 +1,22 @@
+import asyncio
 import random
 import string
 from datetime import datetime, timedelta
-from database_manager import DatabaseManager
+from async_database_manager import AsyncDatabaseManager
+from config import PROMO_INSERT_CHUNK
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Сколько раз перегенерировать коды, совпавшие с уже существующими
+MAX_REGENERATIONS = 5
+
+# Сколько созданных кодов показывать в ответе админу
+PROMO_CODES_SHOWN = 50
+
 
 class PromoCodeManager:
-    def __init__(self, database: DatabaseManager):
+    def __init__(self, database: AsyncDatabaseManager):
         self.db = database
 
     def generate_random_code(self, length: int = 8, prefix: str = "TAROT") -> str:
@@ -17,34 +25,58 @@ class PromoCodeManager:
         random_part = ''.join(random.choice(chars) for _ in range(length))
         return f"{prefix}{random_part}"
 
-    def create_promo_batch(self, count: int, days: int, max_uses: int = 1,
-                           created_by: int = None, prefix: str = "TAROT") -> list:
-        """Создание партии промокодов"""
-        created_codes = []
+    async def create_promo_batch(self, count: int, days: int, max_uses: int = 1,
+                                 created_by: int = None, prefix: str = "TAROT") -> list:
+        """Создание партии промокодов.
 
-        for i in range(count):
-            code = self.generate_random_code(prefix=prefix)
-            success = self.db.create_promo_code(
-                code=code,
-                days=days,
-                max_uses=max_uses,
-                created_by=created_by,
-                description=f"Автогенерированный код #{i + 1}"
-            )
-
-            if success:
-                created_codes.append(code)
-                logger.info(f"✅ Успешно создан промокод: {code}")
-            else:
-                logger.error(f"❌ Не удалось создать код: {code}")
+        Вся партия генерируется локально без повторов и вставляется пачками по
+        PROMO_INSERT_CHUNK. Коды, которые уже есть в базе, сервер пропускает
+        при вставке, и заново генерируются только они. Если пачка не дошла до
+        базы, создание останавливается: возвращаются коды, вставленные до этого,
+        и партия меньше count означает ошибку.
+        """
+        created_codes = []
+        numbers = list(range(1, count + 1))
+        taken = set()
+
+        for attempt in range(MAX_REGENERATIONS + 1):
+            if not numbers:
+                break
+
+            batch = {}
+            while len(batch) < len(numbers):
+                code = self.generate_random_code(prefix=prefix)
+                if code not in taken:
+                    taken.add(code)
+                    batch[code] = numbers[len(batch)]
+
+            duplicates = []
+            items = list(batch.items())
+            for start in range(0, len(items), PROMO_INSERT_CHUNK):
+                chunk = dict(items[start:start + PROMO_INSERT_CHUNK])
+                created = await self.db.create_promo_codes(
+                    {code: f"Автогенерированный код #{number}" for code, number in chunk.items()},
+                    days, max_uses, created_by
+                )
+                if created is None:
+                    logger.error(f"❌ База не ответила на вставку промокодов, создано {len(created_codes)} из {count}")
+                    return created_codes
+
+                created = set(created)
+                created_codes.extend(code for code in chunk if code in created)
+                duplicates.extend(number for code, number in chunk.items() if code not in created)
+
+            numbers = duplicates
+            if numbers:
+                logger.warning(f"⚠️ {len(numbers)} кодов совпали с существующими (попытка {attempt + 1}), генерируем заново")
 
         logger.info(f"📊 Создано {len(created_codes)} из {count} промокодов")
         return created_codes
 
-    def create_custom_promo(self, code: str, days: int, max_uses: int = 1,
-                            created_by: int = None, description: str = "") -> bool:
+    async def create_custom_promo(self, code: str, days: int, max_uses: int = 1,
+                                  created_by: int = None, description: str = "") -> bool:
         """Создание кастомного промокода"""
-        return self.db.create_promo_code(
+        return await self.db.create_promo_code(
             code=code,
             days=days,
             max_uses=max_uses,
@@ -52,10 +84,10 @@ class PromoCodeManager:
             description=description
         )
 
-    def get_promo_stats(self) -> dict:
+    async def get_promo_stats(self) -> dict:
         """Статистика по промокодам"""
         try:
-            promos = self.db.get_all_promo_codes()
+            promos = await self.db.get_all_promo_codes()
 
             if not promos:
                 return {
@@ -87,17 +119,23 @@ class PromoCodeManager:
 
 
 # Пример использования
-if __name__ == "__main__":
-    db = DatabaseManager()
+async def main():
+    db = AsyncDatabaseManager()
     promo_manager = PromoCodeManager(db)
 
     # Создание 10 промокодов на 30 дней
-    codes = promo_manager.create_promo_batch(10, 30, created_by=1)
+    codes = await promo_manager.create_promo_batch(10, 30, created_by=1)
     print(f"Созданы коды: {codes}")
 
     # Создание кастомного кода
-    promo_manager.create_custom_promo("SUMMER2024", 60, 5, 1, "Летняя акция")
+    await promo_manager.create_custom_promo("SUMMER2024", 60, 5, 1, "Летняя акция")
 
     # Статистика
-    stats = promo_manager.get_promo_stats()
-    print(f"Статистика: {stats}")
\ No newline at end of file
+    stats = await promo_manager.get_promo_stats()
+    print(f"Статистика: {stats}")
+
+    await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
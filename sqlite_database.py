@@ -0,0 +1,645 @@
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from config import SQLITE_DB_PATH, SQLITE_STATEMENT_CACHE
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    telegram_id INTEGER UNIQUE NOT NULL,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    language_code TEXT,
+    predictions_count INTEGER DEFAULT 0,
+    total_spent REAL DEFAULT 0.0,
+    subscription_type TEXT DEFAULT 'free',
+    subscription_start TEXT,
+    subscription_end TEXT,
+    is_active BOOLEAN DEFAULT 1,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    prediction_type TEXT DEFAULT 'personal',
+    user_name TEXT,
+    partner_name TEXT,
+    birth_date TEXT,
+    zodiac_sign TEXT,
+    cards_drawn TEXT,
+    prediction_text TEXT,
+    rating INTEGER DEFAULT 0,
+    is_ai_generated BOOLEAN DEFAULT 1,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (id)
+);
+CREATE TABLE IF NOT EXISTS payments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    currency TEXT DEFAULT 'RUB',
+    payment_system TEXT,
+    payment_id TEXT UNIQUE,
+    status TEXT DEFAULT 'pending',
+    subscription_type TEXT,
+    subscription_days INTEGER,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    completed_at TEXT,
+    FOREIGN KEY (user_id) REFERENCES users (id)
+);
+CREATE TABLE IF NOT EXISTS support_tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    user_name TEXT,
+    message TEXT,
+    message_type TEXT DEFAULT 'question',
+    status TEXT DEFAULT 'open',
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT,
+    closed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS support_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    user_name TEXT,
+    message TEXT,
+    is_admin BOOLEAN DEFAULT 0,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (ticket_id) REFERENCES support_tickets (id)
+);
+CREATE TABLE IF NOT EXISTS promo_codes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    code TEXT UNIQUE NOT NULL,
+    subscription_type TEXT DEFAULT 'premium',
+    days INTEGER DEFAULT 30,
+    max_uses INTEGER DEFAULT 1,
+    used_count INTEGER DEFAULT 0,
+    is_active BOOLEAN DEFAULT 1,
+    created_by TEXT,
+    description TEXT,
+    expires_at TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS promo_redemptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    promo_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (promo_id, user_id),
+    FOREIGN KEY (promo_id) REFERENCES promo_codes (id),
+    FOREIGN KEY (user_id) REFERENCES users (id)
+);
+CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id);
+CREATE INDEX IF NOT EXISTS idx_predictions_user_id ON predictions(user_id);
+CREATE INDEX IF NOT EXISTS idx_predictions_created_at ON predictions(created_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_user_created ON predictions(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_support_tickets_status ON support_tickets(status);
+CREATE INDEX IF NOT EXISTS idx_support_messages_ticket_id ON support_messages(ticket_id);
+CREATE INDEX IF NOT EXISTS idx_promo_codes_updated_at ON promo_codes(updated_at);
+-- updated_at промокодов ставит база, как триггер promo_codes_touch в supabase_functions.sql
+CREATE TRIGGER IF NOT EXISTS promo_codes_touch_insert AFTER INSERT ON promo_codes
+BEGIN
+    UPDATE promo_codes SET updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS promo_codes_touch_update AFTER UPDATE ON promo_codes
+BEGIN
+    UPDATE promo_codes SET updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE id = NEW.id;
+END;
+"""
+
+PREDICTION_COLUMNS = (
+    'prediction_type', 'user_name', 'partner_name', 'birth_date', 'zodiac_sign',
+    'cards_drawn', 'prediction_text', 'is_ai_generated', 'created_at'
+)
+
+PAYMENT_COLUMNS = (
+    'amount', 'currency', 'payment_system', 'payment_id', 'status',
+    'subscription_type', 'subscription_days', 'created_at', 'completed_at'
+)
+
+# Операторы фильтров PostgREST (column=op.value) и их SQL
+FILTER_OPERATORS = {
+    'eq': '=', 'neq': '<>', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<=', 'like': 'LIKE', 'ilike': 'LIKE'
+}
+
+# Параметры запроса PostgREST, которые не являются фильтрами
+RESERVED_PARAMS = ('select', 'order', 'limit', 'offset', 'on_conflict')
+
+
+def _split_logic(expression: str) -> list:
+    """'a.eq.1,and(b.eq.2,c.eq.3)' -> ['a.eq.1', 'and(b.eq.2,c.eq.3)']: запятые вне скобок и кавычек"""
+    parts, depth, quoted, start = [], 0, False, 0
+    for position, char in enumerate(expression):
+        if char == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(expression[start:position])
+            start = position + 1
+    parts.append(expression[start:])
+    return parts
+
+
+def _casefold(value):
+    # Встроенный lower() SQLite меняет регистр только у латиницы
+    return value.casefold() if isinstance(value, str) else value
+
+
+class SQLiteDatabase:
+    """Локальная SQLite-база с той же схемой, что и таблицы Supabase.
+
+    Повторяет серверные функции из supabase_functions.sql: вставка строки и
+    инкремент счетчика пользователя выполняются в одной транзакции
+    BEGIN IMMEDIATE, поэтому параллельные вызовы не теряют обновления.
+    У каждого потока свое соединение.
+
+    Методы select/count/insert/update/delete/call принимают те же параметры,
+    что и PostgREST (column=op.value, or с вложенными and/or, select, order,
+    limit, offset, а также фильтр связанной таблицы table.column=op.value при
+    table!inner() в select, связь берется из FOREIGN KEY), поэтому
+    запросы DatabaseManager выполняются здесь без изменений. Имена таблиц и
+    колонок сверяются со схемой, значения передаются только параметрами, так
+    что одинаковые по форме запросы берутся из кэша подготовленных выражений.
+    """
+
+    def __init__(self, path: str = SQLITE_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._tables = {}
+        self._foreign_keys = {}
+
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, cached_statements=SQLITE_STATEMENT_CACHE
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            # В режиме WAL fsync на каждую транзакцию не нужен для целостности
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.create_function('casefold', 1, _casefold, deterministic=True)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция с блокировкой на запись с самого начала"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _table(self, table: str) -> dict:
+        """Колонки таблицы: имя -> объявленный тип. Неизвестная таблица - ValueError"""
+        columns = self._tables.get(table)
+        if columns is None:
+            rows = self._connect().execute(f"PRAGMA table_info({table})").fetchall() if table.isidentifier() else []
+            if not rows:
+                raise ValueError(f"Неизвестная таблица: {table}")
+            columns = self._tables[table] = {row['name']: row['type'].upper() for row in rows}
+        return columns
+
+    def _column(self, table: str, column: str) -> str:
+        if column not in self._table(table):
+            raise ValueError(f"Неизвестная колонка {table}.{column}")
+        return column
+
+    def _foreign_key(self, table: str, other: str):
+        """Колонки связи table -> other: (колонка table, колонка other)"""
+        key = (table, other)
+        if key not in self._foreign_keys:
+            self._table(other)
+            rows = self._connect().execute(f"PRAGMA foreign_key_list({table})").fetchall()
+            link = next(((row['from'], row['to']) for row in rows if row['table'] == other), None)
+            if link is None:
+                raise ValueError(f"Нет связи {table} -> {other}")
+            self._foreign_keys[key] = link
+        return self._foreign_keys[key]
+
+    @staticmethod
+    def _value(value):
+        if len(value) > 1 and value[0] == value[-1] == '"':
+            return value[1:-1]
+        if value in ('true', 'false'):
+            return int(value == 'true')
+        return value
+
+    def _condition(self, table: str, column: str, condition: str):
+        """Условие PostgREST column=op.value в SQL с параметрами"""
+        column = self._column(table, column)
+        operator, _, value = condition.partition('.')
+
+        if operator == 'is':
+            if value == 'null':
+                return f"{column} IS NULL", []
+            return f"{column} IS ?", [self._value(value)]
+        if operator == 'in':
+            values = [self._value(item) for item in value.strip('()').split(',')]
+            return f"{column} IN ({', '.join('?' * len(values))})", values
+        if operator == 'ilike':
+            return f"casefold({column}) LIKE casefold(?)", [value.replace('*', '%')]
+        if operator in FILTER_OPERATORS:
+            return f"{column} {FILTER_OPERATORS[operator]} ?", [self._value(value)]
+        raise ValueError(f"Неизвестный оператор фильтра: {operator}")
+
+    def _where(self, table: str, params: dict):
+        self._table(table)
+        clauses, args = [], []
+        for column, condition in params.items():
+            if column in RESERVED_PARAMS:
+                continue
+            if column == 'or':
+                sql, condition_args = self._logic(table, 'or', condition[1:-1])
+            elif '.' in column:
+                # Фильтр связанной таблицы: строки, у которых есть подходящая запись в ней
+                other, _, other_column = column.partition('.')
+                local_column, other_key = self._foreign_key(table, other)
+                sql, condition_args = self._condition(other, other_column, condition)
+                sql = f"{local_column} IN (SELECT {other_key} FROM {other} WHERE {sql})"
+            else:
+                sql, condition_args = self._condition(table, column, condition)
+            clauses.append(sql)
+            args.extend(condition_args)
+        return (f" WHERE {' AND '.join(clauses)}" if clauses else ''), args
+
+    def _logic(self, table: str, operator: str, expression: str):
+        """or=(column.op.value,and(...),...) в SQL с параметрами"""
+        parts, args = [], []
+        for part in _split_logic(expression):
+            nested, _, rest = part.partition('(')
+            if nested in ('and', 'or') and rest.endswith(')'):
+                sql, part_args = self._logic(table, nested, rest[:-1])
+            else:
+                part_column, _, part_condition = part.partition('.')
+                sql, part_args = self._condition(table, part_column, part_condition)
+            parts.append(sql)
+            args.extend(part_args)
+        return f"({f' {operator.upper()} '.join(parts)})", args
+
+    def _order(self, table: str, order: str) -> str:
+        terms = []
+        for term in order.split(','):
+            column, *modifiers = term.split('.')
+            sql = self._column(table, column)
+            if 'desc' in modifiers:
+                sql += ' DESC'
+            if 'nullslast' in modifiers:
+                sql += ' NULLS LAST'
+            elif 'nullsfirst' in modifiers:
+                sql += ' NULLS FIRST'
+            terms.append(sql)
+        return f" ORDER BY {', '.join(terms)}"
+
+    def _projection(self, table: str, select: str) -> str:
+        if not select or select == '*':
+            return '*'
+        # Связанные таблицы (users!inner()) только фильтруют строки и колонок не добавляют
+        columns = [column for column in select.split(',') if '(' not in column]
+        return ', '.join(self._column(table, column) for column in columns)
+
+    def _row(self, table: str, row: sqlite3.Row) -> dict:
+        """Строка как в ответе PostgREST: BOOLEAN-колонки возвращаются как bool"""
+        types = self._table(table)
+        record = dict(row)
+        for column, value in record.items():
+            if value is not None and types.get(column) == 'BOOLEAN':
+                record[column] = bool(value)
+        return record
+
+    @staticmethod
+    def _bind(value):
+        # json/jsonb-поля Supabase хранятся текстом
+        return json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+
+    def select(self, table: str, params: dict = None) -> list:
+        """GET /table?params"""
+        params = params or {}
+        where, args = self._where(table, params)
+        sql = f"SELECT {self._projection(table, params.get('select'))} FROM {table}{where}"
+        if params.get('order'):
+            sql += self._order(table, params['order'])
+        if 'limit' in params or 'offset' in params:
+            sql += ' LIMIT ? OFFSET ?'
+            args += [int(params.get('limit', -1)), int(params.get('offset', 0))]
+        return [self._row(table, row) for row in self._connect().execute(sql, args)]
+
+    def count(self, table: str, params: dict = None) -> int:
+        """Количество строк под фильтрами, как Prefer: count=exact"""
+        where, args = self._where(table, params or {})
+        return self._connect().execute(f"SELECT COUNT(*) FROM {table}{where}", args).fetchone()[0]
+
+    def insert(self, table: str, rows, select: str = None, on_conflict: str = None) -> list:
+        """POST /table: вставляет одну строку или список, возвращает вставленные.
+
+        С on_conflict строки, конфликтующие по этой колонке, пропускаются
+        (Prefer: resolution=ignore-duplicates) и в ответ не попадают.
+        """
+        rows = rows if isinstance(rows, list) else [rows]
+        returning = self._projection(table, select)
+        conflict = f" ON CONFLICT({self._column(table, on_conflict)}) DO NOTHING" if on_conflict else ''
+        created = []
+        with self._transaction() as conn:
+            for row in rows:
+                columns = [self._column(table, column) for column in row]
+                cursor = conn.execute(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+                    f"{conflict} RETURNING {returning}",
+                    [self._bind(row[column]) for column in columns]
+                )
+                created.extend(self._row(table, record) for record in cursor.fetchall())
+        return created
+
+    def update(self, table: str, params: dict, data: dict) -> list:
+        """PATCH /table?params: возвращает измененные строки (колонки из select)"""
+        where, args = self._where(table, params)
+        columns = [self._column(table, column) for column in data]
+        returning = self._projection(table, params.get('select'))
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in columns)}{where} RETURNING {returning}",
+                [self._bind(data[column]) for column in columns] + args
+            )
+            return [self._row(table, record) for record in cursor.fetchall()]
+
+    def delete(self, table: str, params: dict) -> list:
+        """DELETE /table?params: возвращает удаленные строки"""
+        where, args = self._where(table, params)
+        with self._transaction() as conn:
+            cursor = conn.execute(f"DELETE FROM {table}{where} RETURNING *", args)
+            return [self._row(table, record) for record in cursor.fetchall()]
+
+    def upsert(self, table: str, rows: list) -> int:
+        """Зеркалирует строки из Supabase: вставляет или заменяет по id, колонки не из схемы отбрасывает"""
+        known = self._table(table)
+        with self._transaction() as conn:
+            for row in rows:
+                columns = [column for column in row if column in known]
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    [self._bind(row[column]) for column in columns]
+                )
+        return len(rows)
+
+    def call(self, function: str, args: dict):
+        """POST /rpc/function: функции из supabase_functions.sql"""
+        if function == 'record_prediction':
+            user = self.record_prediction(args['p_telegram_id'], args['p_row'])
+        elif function == 'record_payment':
+            user = self.record_payment(args['p_telegram_id'], args['p_row'])
+        elif function == 'record_predictions':
+            return [self._row('users', user) for user in self.record_predictions(args['p_rows'])]
+        elif function == 'admin_stats':
+            return self.get_admin_stats()
+        elif function == 'redeem_promo':
+            return self.redeem_promo(args['p_code'], args['p_telegram_id'])
+        elif function == 'session_bootstrap':
+            return self.session_bootstrap(args['p_user'], args['p_free_limit'])
+        else:
+            raise ValueError(f"Неизвестная функция: {function}")
+        return [self._row('users', user)] if user else []
+
+    def get_user(self, telegram_id: int):
+        """Запись пользователя по Telegram ID"""
+        row = self._connect().execute('SELECT * FROM users WHERE telegram_id = ?', (telegram_id,)).fetchone()
+        return dict(row) if row else None
+
+    def create_user(self, user_data: dict):
+        """Создает пользователя, если его еще нет, и возвращает запись"""
+        columns = list(user_data)
+        with self._transaction() as conn:
+            conn.execute(
+                f"INSERT OR IGNORE INTO users ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [user_data[column] for column in columns]
+            )
+            row = conn.execute('SELECT * FROM users WHERE telegram_id = ?', (user_data['telegram_id'],)).fetchone()
+        return dict(row) if row else None
+
+    def session_bootstrap(self, user_data: dict, free_limit: int) -> dict:
+        """Пользователь с остатком бесплатных предсказаний и статусом подписки, как rpc/session_bootstrap.
+
+        Существующий пользователь читается без блокировки на запись,
+        транзакция открывается только для создания нового.
+        """
+        query = (
+            "SELECT *, COALESCE(subscription_type, 'free') <> 'free' AND COALESCE(is_active, 1) "
+            "AND COALESCE(julianday(subscription_end) > julianday('now'), 0) AS session_active, "
+            "strftime('%d.%m.%Y', subscription_end) AS session_end FROM users WHERE telegram_id = ?"
+        )
+        created = False
+        row = self._connect().execute(query, (user_data['telegram_id'],)).fetchone()
+        if row is None:
+            columns = [self._column('users', column) for column in user_data]
+            with self._transaction() as conn:
+                created = conn.execute(
+                    f"INSERT INTO users ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                    f"ON CONFLICT(telegram_id) DO NOTHING",
+                    [self._bind(user_data[column]) for column in columns]
+                ).rowcount == 1
+                row = conn.execute(query, (user_data['telegram_id'],)).fetchone()
+
+        user = self._row('users', row)
+        active = bool(user.pop('session_active'))
+        subscription_end = user.pop('session_end')
+        return {
+            'user': user,
+            'created': created,
+            'has_subscription': active,
+            'remaining_predictions': None if active else max(0, free_limit - (user['predictions_count'] or 0)),
+            'subscription_end': subscription_end
+        }
+
+    def record_prediction(self, telegram_id: int, row: dict):
+        """Вставляет предсказание и увеличивает predictions_count атомарно"""
+        return self._insert_with_increment(
+            telegram_id, 'predictions', PREDICTION_COLUMNS, row,
+            'predictions_count = COALESCE(predictions_count, 0) + 1', ()
+        )
+
+    def record_payment(self, telegram_id: int, row: dict):
+        """Вставляет платеж и увеличивает total_spent атомарно"""
+        return self._insert_with_increment(
+            telegram_id, 'payments', PAYMENT_COLUMNS, row,
+            'total_spent = COALESCE(total_spent, 0) + ?', (row['amount'],)
+        )
+
+    def record_predictions(self, rows: list):
+        """Пакетная вставка предсказаний с инкрементом счетчиков в одной транзакции.
+
+        Строки с уже записанными user_id и created_at пропускаются, как в RPC record_predictions.
+        """
+        added = {}
+
+        with self._transaction() as conn:
+            for row in rows:
+                user = conn.execute('SELECT id FROM users WHERE telegram_id = ?', (row['telegram_id'],)).fetchone()
+                if user is None:
+                    continue
+
+                duplicate = conn.execute(
+                    'SELECT 1 FROM predictions WHERE user_id = ? AND created_at = ?', (user['id'], row.get('created_at'))
+                ).fetchone()
+                if duplicate:
+                    continue
+
+                columns = [column for column in PREDICTION_COLUMNS if row.get(column) is not None]
+                conn.execute(
+                    f"INSERT INTO predictions (user_id, {', '.join(columns)}) VALUES (?, {', '.join('?' * len(columns))})",
+                    (user['id'], *[row[column] for column in columns])
+                )
+                added[user['id']] = added.get(user['id'], 0) + 1
+
+            updated_at = datetime.utcnow().isoformat() + 'Z'
+            users = []
+            for user_id, count in added.items():
+                conn.execute(
+                    'UPDATE users SET predictions_count = COALESCE(predictions_count, 0) + ?, updated_at = ? WHERE id = ?',
+                    (count, updated_at, user_id)
+                )
+                users.append(dict(conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()))
+
+        return users
+
+    def redeem_promo(self, code: str, telegram_id: int) -> dict:
+        """Активирует промокод одной транзакцией, как rpc/redeem_promo.
+
+        BEGIN IMMEDIATE берет блокировку на запись до проверки лимита, поэтому
+        параллельные активации многоразового кода не превышают max_uses.
+        """
+        stamp = datetime.utcnow().isoformat() + 'Z'
+
+        with self._transaction() as conn:
+            promo = conn.execute(
+                "SELECT *, julianday(expires_at) < julianday('now') AS expired FROM promo_codes WHERE code = ?",
+                (code.upper(),)
+            ).fetchone()
+            if promo is None:
+                return {'status': 'not_found'}
+            if promo['is_active'] is not None and not promo['is_active']:
+                return {'status': 'inactive'}
+            if promo['expired']:
+                return {'status': 'expired'}
+            if (promo['used_count'] or 0) >= (promo['max_uses'] or 1):
+                return {'status': 'exhausted'}
+
+            user = conn.execute(
+                "SELECT *, julianday(subscription_end) > julianday('now') AS subscription_running "
+                "FROM users WHERE telegram_id = ?", (telegram_id,)
+            ).fetchone()
+            if user is None:
+                return {'status': 'no_user'}
+
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO promo_redemptions (promo_id, user_id, created_at) VALUES (?, ?, ?)',
+                (promo['id'], user['id'], stamp)
+            )
+            if cursor.rowcount == 0:
+                return {'status': 'already_used'}
+
+            promo = conn.execute(
+                'UPDATE promo_codes SET used_count = COALESCE(used_count, 0) + 1, '
+                'is_active = COALESCE(used_count, 0) + 1 < COALESCE(max_uses, 1), updated_at = ? '
+                'WHERE id = ? RETURNING *', (stamp, promo['id'])
+            ).fetchall()[0]
+
+            was_premium = (user['subscription_type'] or 'free') != 'free'
+            was_active = was_premium and user['is_active'] != 0 and bool(user['subscription_running'])
+
+            start = datetime.utcnow()
+            user = conn.execute(
+                'UPDATE users SET subscription_type = ?, subscription_start = ?, subscription_end = ?, '
+                'is_active = 1, updated_at = ? WHERE id = ? RETURNING *',
+                (promo['subscription_type'] or 'premium', start.isoformat() + 'Z',
+                 (start + timedelta(days=promo['days'] or 30)).isoformat() + 'Z', stamp, user['id'])
+            ).fetchall()[0]
+
+        return {
+            'status': 'ok',
+            'user': self._row('users', user),
+            'promo': self._row('promo_codes', promo),
+            'was_active': was_active,
+            'was_premium': was_premium
+        }
+
+    def get_admin_stats(self):
+        """Счетчики для админ-панели, как rpc/admin_stats: все агрегаты считает SQLite"""
+        row = self._connect().execute("""
+            SELECT
+                (SELECT COUNT(*) FROM users) AS total_users,
+                (SELECT COUNT(*) FROM users WHERE subscription_type <> 'free') AS premium_users,
+                (SELECT COUNT(*) FROM users
+                  WHERE subscription_type <> 'free'
+                    AND COALESCE(is_active, 1)
+                    AND julianday(subscription_end) > julianday('now')) AS active_subscriptions,
+                (SELECT COUNT(*) FROM predictions) AS total_predictions,
+                (SELECT COALESCE(SUM(predictions_count), 0) FROM users) AS predictions_sum,
+                (SELECT COALESCE(SUM(total_spent), 0) FROM users) AS total_income,
+                (SELECT COUNT(*) FROM support_tickets WHERE status = 'open') AS open_tickets,
+                (SELECT COUNT(*) FROM promo_codes) AS promo_total,
+                (SELECT COUNT(*) FROM promo_codes WHERE is_active) AS promo_active,
+                (SELECT COUNT(*) FROM promo_codes WHERE used_count > 0) AS promo_used,
+                (SELECT COALESCE(SUM(used_count), 0) FROM promo_codes) AS promo_uses
+        """).fetchone()
+        days = self._connect().execute("""
+            SELECT date(created_at) AS day, COUNT(*) AS added
+              FROM predictions
+             WHERE created_at >= date('now', '-6 days')
+             GROUP BY 1
+        """).fetchall()
+
+        stats = dict(row)
+        stats['predictions_by_day'] = {day['day']: day['added'] for day in days}
+        return stats
+
+    def _insert_with_increment(self, telegram_id: int, table: str, columns: tuple, row: dict,
+                               increment: str, increment_args: tuple):
+        # Незаданные колонки не передаем, чтобы сработали DEFAULT схемы
+        columns = [column for column in columns if row.get(column) is not None]
+        values = [row[column] for column in columns]
+
+        try:
+            with self._transaction() as conn:
+                cursor = conn.execute(
+                    f"UPDATE users SET {increment}, updated_at = ? WHERE telegram_id = ?",
+                    (*increment_args, datetime.utcnow().isoformat() + 'Z', telegram_id)
+                )
+                if cursor.rowcount == 0:
+                    return None
+
+                user = conn.execute('SELECT * FROM users WHERE telegram_id = ?', (telegram_id,)).fetchone()
+                conn.execute(
+                    f"INSERT INTO {table} (user_id, {', '.join(columns)}) VALUES (?, {', '.join('?' * len(columns))})",
+                    (user['id'], *values)
+                )
+            return dict(user)
+
+        except sqlite3.IntegrityError as e:
+            logger.error(f"❌ Ошибка записи в {table}: {e}")
+            return None
\ No newline at end of file
@@ -0,0 +1,470 @@
+import asyncio
+import json
+import logging
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import aiohttp
+
+from config import (
+    SUPABASE_POOL_MAXSIZE, SUPABASE_MAX_RETRIES, SUPABASE_TIMEOUT, SQLITE_DB_PATH,
+    REPLICA_SYNC_INTERVAL, REPLICA_SYNC_BATCH, REPLICA_USERS_MAX_AGE, REPLICA_PREDICTIONS_MAX_AGE
+)
+from sqlite_database import SQLiteDatabase
+from supabase_transport import (
+    ConnectionStats, TrafficStats, RETRY_STATUSES, IDEMPOTENT_METHODS, ACCEPT_ENCODING,
+    backoff_delay, create_trace_config, format_stats
+)
+
+logger = logging.getLogger(__name__)
+
+# RPC только на чтение: в SQLite выполняются без потока-писателя
+READ_ONLY_FUNCTIONS = frozenset(['admin_stats'])
+
+# Таблицы локальной реплики: колонка-водяной знак синхронизации и допустимая устарелость, секунд.
+# Предсказания только добавляются, и их id растет надежнее, чем created_at от клиента
+REPLICATED_TABLES = {
+    'users': ('updated_at', REPLICA_USERS_MAX_AGE),
+    'predictions': ('id', REPLICA_PREDICTIONS_MAX_AGE),
+}
+
+# RPC, которые возвращают обновленные записи пользователей
+USER_RETURNING_FUNCTIONS = frozenset(['rpc/record_prediction', 'rpc/record_payment', 'rpc/record_predictions'])
+
+# Фильтры, которыми запрос predictions выбирает предсказания одного пользователя
+PREDICTION_OWNER_FILTERS = ('user_id', 'users.telegram_id')
+
+# RPC, возвращающие объект с записью пользователя в поле user
+USER_RESULT_FUNCTIONS = frozenset(['rpc/redeem_promo', 'rpc/session_bootstrap'])
+
+
+def split_endpoint(endpoint: str, params: dict = None):
+    """'users?id=eq.5' -> ('users', {'id': 'eq.5', ...params})"""
+    path, _, query = endpoint.partition('?')
+    merged = dict(parse_qsl(query, keep_blank_values=True))
+    merged.update(params or {})
+    return path, merged
+
+
+class PostgrestBackend:
+    """Хранилище в Supabase: запросы к PostgREST через общую aiohttp-сессию.
+
+    Одна сессия с пулом keep-alive соединений на все запросы. Таймауты и ответы
+    5xx повторяются с задержкой и разбросом только для идемпотентных методов;
+    ошибка установки соединения повторяется всегда. Политика повторов и
+    счетчики пула те же, что у SupabaseTransport. Ответы запрашиваются сжатыми
+    и распаковываются здесь же, чтобы traffic видел их размер по сети.
+    """
+
+    def __init__(self, base_url: str, headers: dict, pool_limit: int = SUPABASE_POOL_MAXSIZE,
+                 pool_limit_per_host: int = SUPABASE_POOL_MAXSIZE, keepalive_timeout: float = 30.0,
+                 request_timeout: float = SUPABASE_TIMEOUT, max_retries: int = SUPABASE_MAX_RETRIES):
+        self.base_url = base_url
+        self.headers = headers
+        self.pool_limit = pool_limit
+        self.pool_limit_per_host = pool_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+
+        self._session = None
+        self._connection_stats = ConnectionStats()
+        self.traffic = TrafficStats()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Возвращает общую сессию, создавая ее при первом обращении"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={**self.headers, 'Accept-Encoding': ACCEPT_ENCODING},
+                auto_decompress=False,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                trace_configs=[create_trace_config(self._connection_stats)]
+            )
+            logger.info("✅ Создана общая aiohttp-сессия для Supabase")
+        return self._session
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info(f"✅ Сессия Supabase закрыта: {format_stats(self.get_stats())}")
+        self._session = None
+
+    def get_stats(self):
+        """Счетчики переиспользования соединений к Supabase"""
+        return self._connection_stats.snapshot()
+
+    @staticmethod
+    def _decode(response: aiohttp.ClientResponse, content: bytes) -> bytes:
+        if not content or response.headers.get('Content-Encoding') not in ('gzip', 'deflate'):
+            return content
+        try:
+            # 32 + MAX_WBITS: заголовок gzip или zlib определяется автоматически
+            return zlib.decompress(content, 32 + zlib.MAX_WBITS)
+        except zlib.error:
+            # deflate без заголовка zlib
+            return zlib.decompress(content, -zlib.MAX_WBITS)
+
+    async def request(self, endpoint, method='GET', data=None, params=None, headers=None):
+        """Запрос к PostgREST. Возвращает разобранный JSON, True для пустого ответа или None при ошибке"""
+        url = f"{self.base_url}/{endpoint}"
+        retryable = method in IDEMPOTENT_METHODS
+        attempt = 0
+
+        body = json.dumps(data).encode() if data is not None else None
+        headers = {'Content-Type': 'application/json', **(headers or {})}
+
+        while True:
+            can_retry = attempt < self.max_retries
+
+            try:
+                if method not in ('GET', 'POST', 'PATCH', 'DELETE'):
+                    raise ValueError(f"Неизвестный метод: {method}")
+
+                session = await self._get_session()
+                async with session.request(method, url, params=params, data=body, headers=headers) as response:
+                    received = await response.read()
+                    content = self._decode(response, received)
+                    self.traffic.record(len(body or b''), len(received), len(content))
+
+                    # 204 - запись с Prefer: return=minimal
+                    if response.status in [200, 201, 204]:
+                        return json.loads(content) if content else True
+
+                    if not (retryable and can_retry and response.status in RETRY_STATUSES):
+                        logger.error(f"❌ HTTP {response.status}: {content.decode('utf-8', 'replace')}")
+                        return None
+
+                    logger.warning(f"⚠️ HTTP {response.status} от {endpoint}, повтор #{attempt + 1}")
+
+            except asyncio.TimeoutError:
+                if not (retryable and can_retry):
+                    logger.error(f"❌ Таймаут запроса к {endpoint}")
+                    return None
+                logger.warning(f"⚠️ Таймаут запроса к {endpoint}, повтор #{attempt + 1}")
+
+            except aiohttp.ClientConnectorError as e:
+                if not can_retry:
+                    logger.error(f"❌ Ошибка запроса к {endpoint}: {e}")
+                    return None
+                logger.warning(f"⚠️ Не удалось подключиться к {endpoint}, повтор #{attempt + 1}")
+
+            except Exception as e:
+                logger.error(f"❌ Ошибка запроса к {endpoint}: {e}")
+                return None
+
+            self._connection_stats.record_retry()
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    async def count(self, table: str, params: dict = None) -> int:
+        """Количество строк под фильтрами через заголовок Content-Range"""
+        params = dict(params or {})
+        params.update({'select': 'id', 'limit': '0'})
+
+        session = await self._get_session()
+        async with session.get(f"{self.base_url}/{table}", headers={'Prefer': 'count=exact'}, params=params) as response:
+            received = await response.read()
+            self.traffic.record(0, len(received), len(self._decode(response, received)))
+            if response.status == 200:
+                count = response.headers.get('content-range', '').split('/')
+                if len(count) > 1 and count[1].isdigit():
+                    return int(count[1])
+        return 0
+
+
+class SQLiteBackend:
+    """Локальное хранилище в SQLite с тем же интерфейсом, что и PostgrestBackend.
+
+    Запросы в формате PostgREST выполняет SQLiteDatabase. Чтения идут прямо в
+    event loop: в режиме WAL читатели не ждут писателя, а выборка по индексу
+    занимает микросекунды, меньше передачи задачи в поток. Все записи
+    выполняет один поток-писатель по очереди, так что event loop не ждет
+    блокировку базы и запись на диск. Ошибка запроса логируется и дает None,
+    как HTTP-ошибка у PostgREST.
+    """
+
+    def __init__(self, path: str = SQLITE_DB_PATH):
+        self.path = path
+        self.db = SQLiteDatabase(path)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-writer')
+
+        self.reads = 0
+        self.writes = 0
+        self.errors = 0
+        self.pending_writes = 0
+        # Сети нет, счетчики трафика остаются пустыми
+        self.traffic = TrafficStats()
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        """Дожидается очереди записей и закрывает соединения"""
+        if self._writer is None:
+            return
+
+        # Соединение SQLite закрывается в том же потоке, где открыто
+        await self._write(self.db.close)
+        self._writer.shutdown(wait=True)
+        self._writer = None
+        self.db.close()
+        logger.info(f"✅ SQLite-база {self.path} закрыта: {self.reads} чтений, {self.writes} записей")
+
+    def get_stats(self):
+        """Счетчики запросов к локальной базе"""
+        return {
+            'reads': self.reads,
+            'writes': self.writes,
+            'errors': self.errors,
+            'pending_writes': self.pending_writes
+        }
+
+    async def _write(self, function, *args):
+        self.pending_writes += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._writer, function, *args)
+        finally:
+            self.pending_writes -= 1
+
+    async def request(self, endpoint, method='GET', data=None, params=None, headers=None):
+        """Тот же запрос, что ушел бы в PostgREST, выполненный в SQLite"""
+        table, params = split_endpoint(endpoint, params)
+        prefer = (headers or {}).get('Prefer', '')
+
+        try:
+            if table.startswith('rpc/'):
+                function = table[len('rpc/'):]
+                if function in READ_ONLY_FUNCTIONS:
+                    self.reads += 1
+                    return self.db.call(function, data or {})
+                self.writes += 1
+                return await self._write(self.db.call, function, data or {})
+
+            if method == 'GET':
+                self.reads += 1
+                return self.db.select(table, params)
+
+            self.writes += 1
+            if method == 'POST':
+                on_conflict = params.get('on_conflict') if 'resolution=ignore-duplicates' in prefer else None
+                result = await self._write(self.db.insert, table, data, params.get('select'), on_conflict)
+            elif method == 'PATCH':
+                result = await self._write(self.db.update, table, params, data)
+            elif method == 'DELETE':
+                result = await self._write(self.db.delete, table, params)
+            else:
+                raise ValueError(f"Неизвестный метод: {method}")
+
+            # Как PostgREST с Prefer: return=minimal - успех без тела ответа
+            return True if 'return=minimal' in prefer else result
+
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ Ошибка запроса к {endpoint}: {e}")
+            return None
+
+    async def count(self, table: str, params: dict = None) -> int:
+        """Количество строк под фильтрами"""
+        self.reads += 1
+        return self.db.count(table, params)
+
+    async def upsert(self, table: str, rows: list) -> int:
+        """Записывает копии строк другого хранилища через поток-писатель"""
+        self.writes += 1
+        return await self._write(self.db.upsert, table, rows)
+
+
+class ReplicaBackend:
+    """Supabase с локальной SQLite-репликой для чтения.
+
+    Записи уходят в remote, а строки из ответа сразу копируются в local.
+    Чтение таблиц из REPLICATED_TABLES идет из реплики, если ее последняя
+    синхронизация не старше допустимой устарелости таблицы. Пустой ответ
+    реплики считается промахом: запрос повторяется в remote, найденные строки
+    копируются. Фоновая синхронизация забирает из remote строки с водяным
+    знаком не меньше последнего увиденного, так что реплика догоняет и записи,
+    сделанные в обход бота. Строки без водяного знака попадают в реплику только
+    через промах или запись.
+    """
+
+    def __init__(self, remote, local, tables: dict = None, sync_interval: float = REPLICA_SYNC_INTERVAL,
+                 batch_size: int = REPLICA_SYNC_BATCH, clock=time.monotonic):
+        self.remote = remote
+        self.local = local
+        self.traffic = remote.traffic
+        self.tables = tables or REPLICATED_TABLES
+        self.sync_interval = sync_interval
+        self.batch_size = batch_size
+        self._clock = clock
+
+        # Водяной знак и сколько строк с ровно таким значением уже забрано
+        self._watermarks = {table: (None, 0) for table in self.tables}
+        self._synced_at = {}
+        # Фильтры (колонка, значение) пользователей, чьи предсказания записаны через RPC
+        # после последней синхронизации (см. PREDICTION_OWNER_FILTERS)
+        self._dirty_users = set()
+        self._task = None
+
+        self.local_reads = 0
+        self.remote_reads = 0
+        self.misses = 0
+        self.mirrored = 0
+        self.synced_rows = 0
+        self.sync_errors = 0
+
+    async def start(self):
+        await self.remote.start()
+        await self.local.start()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self.remote.close()
+        await self.local.close()
+
+    def get_stats(self):
+        """Попадания в реплику, промахи и возраст синхронизации таблиц"""
+        now = self._clock()
+        return {
+            'local_reads': self.local_reads,
+            'remote_reads': self.remote_reads,
+            'misses': self.misses,
+            'mirrored': self.mirrored,
+            'synced_rows': self.synced_rows,
+            'sync_errors': self.sync_errors,
+            'age': {table: now - synced_at for table, synced_at in self._synced_at.items()},
+            'remote': self.remote.get_stats()
+        }
+
+    def _is_fresh(self, table: str, params: dict) -> bool:
+        synced_at = self._synced_at.get(table)
+        if synced_at is None or self._clock() - synced_at > self.tables[table][1]:
+            return False
+
+        # Предсказания, записанные RPC, в реплике появятся только после синхронизации
+        return not (table == 'predictions' and any(
+            (column, params.get(column)) in self._dirty_users for column in PREDICTION_OWNER_FILTERS
+        ))
+
+    async def request(self, endpoint, method='GET', data=None, params=None, headers=None):
+        table, query = split_endpoint(endpoint, params)
+
+        if method == 'GET' and table in self.tables:
+            if self._is_fresh(table, query):
+                rows = await self.local.request(table, params=query)
+                if rows:
+                    self.local_reads += 1
+                    return rows
+                self.misses += 1
+
+            self.remote_reads += 1
+            rows = await self.remote.request(table, params=query)
+            # Частичные строки (select=...) не копируем, чтобы не затереть остальные колонки
+            if isinstance(rows, list) and query.get('select', '*') == '*':
+                await self._mirror(table, rows)
+                if table == 'predictions':
+                    for column in PREDICTION_OWNER_FILTERS:
+                        self._dirty_users.discard((column, query.get(column)))
+            return rows
+
+        result = await self.remote.request(endpoint, method, data, params, headers)
+        if isinstance(result, list) and table in self.tables:
+            if method == 'DELETE':
+                await self.local.request(table, 'DELETE', params=query)
+            else:
+                await self._mirror(table, result)
+        elif isinstance(result, list) and table in USER_RETURNING_FUNCTIONS:
+            await self._mirror('users', result)
+            if table != 'rpc/record_payment':
+                for user in result:
+                    self._dirty_users.update([('user_id', f"eq.{user['id']}"),
+                                              ('users.telegram_id', f"eq.{user['telegram_id']}")])
+        elif table in USER_RESULT_FUNCTIONS and isinstance(result, dict) and result.get('user'):
+            await self._mirror('users', [result['user']])
+        return result
+
+    async def count(self, table: str, params: dict = None) -> int:
+        if table in self.tables and self._is_fresh(table, params or {}):
+            self.local_reads += 1
+            return await self.local.count(table, params)
+
+        self.remote_reads += 1
+        return await self.remote.count(table, params)
+
+    async def _mirror(self, table: str, rows: list):
+        if not rows:
+            return
+        try:
+            self.mirrored += await self.local.upsert(table, rows)
+        except Exception as e:
+            # Реплика догонит запись при следующей синхронизации
+            logger.warning(f"⚠️ Не удалось скопировать {table} в реплику: {e}")
+
+    async def _run(self):
+        while True:
+            for table in self.tables:
+                try:
+                    await self.sync(table)
+                except Exception as e:
+                    self.sync_errors += 1
+                    logger.error(f"❌ Ошибка синхронизации реплики {table}: {e}")
+            await asyncio.sleep(self.sync_interval)
+
+    async def sync(self, table: str) -> int:
+        """Забирает из remote строки с водяным знаком не меньше последнего увиденного"""
+        column = self.tables[table][0]
+        watermark, skip = self._watermarks[table]
+        started = self._clock()
+        dirty_users = set(self._dirty_users)
+        synced = 0
+
+        while True:
+            params = {'order': f'{column}.asc,id.asc', 'limit': str(self.batch_size), 'offset': str(skip)}
+            if watermark is not None:
+                params[column] = f'gte.{watermark}'
+
+            rows = await self.remote.request(table, params=params)
+            if rows is None:
+                raise ConnectionError(f"Не удалось загрузить {table} после {column}={watermark}")
+            if rows:
+                await self.local.upsert(table, rows)
+                synced += len(rows)
+
+            # NULL сортируются последними и под фильтр gte не попадают
+            values = [row[column] for row in rows if row.get(column) is not None]
+            if not values:
+                break
+            if values[-1] == watermark:
+                skip += len(values)
+            else:
+                watermark, skip = values[-1], values.count(values[-1])
+
+            if len(rows) < self.batch_size:
+                break
+
+        self._watermarks[table] = (watermark, skip)
+        self._synced_at[table] = started
+        if table == 'predictions':
+            self._dirty_users -= dirty_users
+        self.synced_rows += synced
+        return synced
\ No newline at end of file
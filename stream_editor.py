@@ -0,0 +1,85 @@
+import logging
+import time
+from collections import deque
+
+from telegram.error import RetryAfter, TelegramError
+
+from config import STREAM_EDIT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Лимит Telegram на длину сообщения с запасом под заголовок
+MAX_MESSAGE_LENGTH = 4000
+
+
+class LatencyTracker:
+    """Скользящее окно замеров задержки в секундах"""
+
+    def __init__(self, size: int = 500):
+        self._samples = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self._samples)
+        if not ordered:
+            return {'count': 0, 'p50': 0.0, 'p95': 0.0}
+
+        def percentile(p):
+            return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+        return {'count': len(ordered), 'p50': percentile(50), 'p95': percentile(95)}
+
+
+class ThrottledMessageEditor:
+    """Показывает потоковый ответ LLM, постепенно редактируя одно сообщение.
+
+    Telegram ограничивает частоту правок, поэтому сообщение правится не чаще
+    одного раза в min_interval секунд, а при RetryAfter следующая правка
+    откладывается. Промежуточный текст отправляется без разметки: незакрытые
+    * и _ в середине ответа сломали бы Markdown. Время от создания редактора
+    до первой видимой правки записывается в tracker.
+    """
+
+    def __init__(self, edit, header: str = "", tracker: LatencyTracker = None,
+                 min_interval: float = STREAM_EDIT_INTERVAL, clock=time.monotonic):
+        self._edit = edit
+        self.header = header
+        self.tracker = tracker
+        self.min_interval = min_interval
+        self._clock = clock
+
+        self._started = clock()
+        self._next_edit_at = self._started
+        self.first_visible = None
+        self.edits = 0
+
+    async def update(self, text: str):
+        """Обновляет сообщение накопленным текстом, если позволяет лимит частоты"""
+        now = self._clock()
+        if now < self._next_edit_at:
+            return
+        self._next_edit_at = now + self.min_interval
+
+        try:
+            await self._edit(self._render(text))
+        except RetryAfter as e:
+            self._next_edit_at = now + e.retry_after
+            return
+        except TelegramError as e:
+            logger.debug(f"Не удалось обновить сообщение: {e}")
+            return
+
+        self.edits += 1
+        if self.first_visible is None:
+            self.first_visible = self._clock() - self._started
+            if self.tracker:
+                self.tracker.record(self.first_visible)
+
+    def _render(self, text: str) -> str:
+        body = f"{text} ▌"
+        limit = MAX_MESSAGE_LENGTH - len(self.header)
+        if len(body) > limit:
+            body = "…" + body[-(limit - 1):]
+        return self.header + body
\ No newline at end of file
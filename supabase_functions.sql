@@ -0,0 +1,312 @@
+-- Серверные функции для Supabase (выполнить в SQL Editor).
+-- PostgREST открывает их как POST /rest/v1/rpc/<имя функции>.
+
+-- Вставляет предсказание и увеличивает users.predictions_count одной транзакцией.
+-- UPDATE блокирует строку пользователя, поэтому параллельные вызовы
+-- для одного пользователя не теряют инкременты.
+create or replace function record_prediction(p_telegram_id bigint, p_row jsonb)
+returns setof users
+language plpgsql
+as $$
+declare
+    v_user_id bigint;
+begin
+    update users
+       set predictions_count = coalesce(predictions_count, 0) + 1,
+           updated_at = now()
+     where telegram_id = p_telegram_id
+    returning id into v_user_id;
+
+    if v_user_id is null then
+        return;
+    end if;
+
+    insert into predictions (user_id, prediction_type, user_name, partner_name, birth_date,
+                             zodiac_sign, cards_drawn, prediction_text, is_ai_generated, created_at)
+    values (v_user_id,
+            p_row->>'prediction_type',
+            p_row->>'user_name',
+            coalesce(p_row->>'partner_name', ''),
+            p_row->>'birth_date',
+            p_row->>'zodiac_sign',
+            p_row->>'cards_drawn',
+            p_row->>'prediction_text',
+            coalesce((p_row->>'is_ai_generated')::boolean, true),
+            coalesce((p_row->>'created_at')::timestamptz, now()));
+
+    return query select * from users where id = v_user_id;
+end;
+$$;
+
+-- Вставляет платеж и увеличивает users.total_spent одной транзакцией.
+-- Повтор с тем же payment_id падает на UNIQUE и откатывает инкремент.
+create or replace function record_payment(p_telegram_id bigint, p_row jsonb)
+returns setof users
+language plpgsql
+as $$
+declare
+    v_user_id bigint;
+begin
+    update users
+       set total_spent = coalesce(total_spent, 0) + (p_row->>'amount')::numeric,
+           updated_at = now()
+     where telegram_id = p_telegram_id
+    returning id into v_user_id;
+
+    if v_user_id is null then
+        return;
+    end if;
+
+    insert into payments (user_id, amount, currency, payment_system, payment_id, status,
+                          subscription_type, subscription_days, created_at, completed_at)
+    values (v_user_id,
+            (p_row->>'amount')::numeric,
+            coalesce(p_row->>'currency', 'RUB'),
+            p_row->>'payment_system',
+            p_row->>'payment_id',
+            coalesce(p_row->>'status', 'completed'),
+            p_row->>'subscription_type',
+            (p_row->>'subscription_days')::integer,
+            coalesce((p_row->>'created_at')::timestamptz, now()),
+            (p_row->>'completed_at')::timestamptz);
+
+    return query select * from users where id = v_user_id;
+end;
+$$;
+-- Пакетная запись предсказаний из очереди бота (prediction_queue.py).
+-- p_rows: массив объектов с telegram_id и полями predictions. Строки, которые
+-- уже есть в базе (тот же user_id и created_at), пропускаются, поэтому повторная
+-- отправка журнала после падения процесса не создает дубликатов.
+create or replace function record_predictions(p_rows jsonb)
+returns setof users
+language plpgsql
+as $$
+begin
+    return query
+    with incoming as (
+        select u.id as user_id, r
+          from jsonb_array_elements(p_rows) as r
+          join users u on u.telegram_id = (r->>'telegram_id')::bigint
+    ),
+    inserted as (
+        insert into predictions (user_id, prediction_type, user_name, partner_name, birth_date,
+                                 zodiac_sign, cards_drawn, prediction_text, is_ai_generated, created_at)
+        select i.user_id,
+               i.r->>'prediction_type',
+               i.r->>'user_name',
+               coalesce(i.r->>'partner_name', ''),
+               i.r->>'birth_date',
+               i.r->>'zodiac_sign',
+               i.r->>'cards_drawn',
+               i.r->>'prediction_text',
+               coalesce((i.r->>'is_ai_generated')::boolean, true),
+               coalesce((i.r->>'created_at')::timestamptz, now())
+          from incoming i
+         where not exists (
+               select 1
+                 from predictions p
+                where p.user_id = i.user_id
+                  and p.created_at = (i.r->>'created_at')::timestamptz
+         )
+        returning user_id
+    ),
+    counts as (
+        select user_id, count(*) as added
+          from inserted
+         group by user_id
+    )
+    update users u
+       set predictions_count = coalesce(u.predictions_count, 0) + c.added,
+           updated_at = now()
+      from counts c
+     where u.id = c.user_id
+    returning u.*;
+end;
+$$;
+
+-- Счетчики для админ-панели бота. Все агрегаты считаются здесь, поэтому
+-- ответ занимает несколько сотен байт при любом размере таблиц.
+-- predictions_by_day - число предсказаний за каждый из последних 7 дней.
+create or replace function admin_stats()
+returns json
+language sql
+stable
+as $$
+    select json_build_object(
+        'total_users', (select count(*) from users),
+        'premium_users', (select count(*) from users where subscription_type <> 'free'),
+        'active_subscriptions', (select count(*)
+                                   from users
+                                  where subscription_type <> 'free'
+                                    and coalesce(is_active, true)
+                                    and subscription_end > now()),
+        'total_predictions', (select count(*) from predictions),
+        'predictions_sum', (select coalesce(sum(predictions_count), 0) from users),
+        'total_income', (select coalesce(sum(total_spent), 0) from users),
+        'open_tickets', (select count(*) from support_tickets where status = 'open'),
+        'promo_total', (select count(*) from promo_codes),
+        'promo_active', (select count(*) from promo_codes where is_active),
+        'promo_used', (select count(*) from promo_codes where used_count > 0),
+        'promo_uses', (select coalesce(sum(used_count), 0) from promo_codes),
+        'predictions_by_day', (select coalesce(json_object_agg(day, added), '{}'::json)
+                                 from (select created_at::date as day, count(*) as added
+                                         from predictions
+                                        where created_at >= current_date - 6
+                                        group by 1) as days)
+    );
+$$;
+
+-- Учет активаций промокодов: один пользователь активирует код не больше одного раза.
+create table if not exists promo_redemptions (
+    id bigserial primary key,
+    promo_id bigint not null references promo_codes (id),
+    user_id bigint not null references users (id),
+    created_at timestamptz not null default now(),
+    unique (promo_id, user_id)
+);
+
+-- Активация промокода одной транзакцией: проверка активности, срока и лимита,
+-- учет активации, увеличение used_count и подписка пользователя.
+-- select ... for update блокирует строку промокода, поэтому параллельные
+-- активации многоразового кода не превышают max_uses.
+-- status: ok, not_found, inactive, expired, exhausted, no_user, already_used.
+create or replace function redeem_promo(p_code text, p_telegram_id bigint)
+returns json
+language plpgsql
+as $$
+declare
+    v_promo promo_codes%rowtype;
+    v_user users%rowtype;
+    v_was_active boolean;
+    v_was_premium boolean;
+begin
+    select * into v_promo from promo_codes where code = upper(p_code) for update;
+
+    if not found then
+        return json_build_object('status', 'not_found');
+    end if;
+    if not coalesce(v_promo.is_active, true) then
+        return json_build_object('status', 'inactive');
+    end if;
+    if v_promo.expires_at is not null and v_promo.expires_at < now() then
+        return json_build_object('status', 'expired');
+    end if;
+    if coalesce(v_promo.used_count, 0) >= coalesce(v_promo.max_uses, 1) then
+        return json_build_object('status', 'exhausted');
+    end if;
+
+    select * into v_user from users where telegram_id = p_telegram_id for update;
+    if not found then
+        return json_build_object('status', 'no_user');
+    end if;
+
+    insert into promo_redemptions (promo_id, user_id)
+    values (v_promo.id, v_user.id)
+    on conflict do nothing;
+    if not found then
+        return json_build_object('status', 'already_used');
+    end if;
+
+    update promo_codes
+       set used_count = coalesce(used_count, 0) + 1,
+           is_active = coalesce(used_count, 0) + 1 < coalesce(max_uses, 1),
+           updated_at = now()
+     where id = v_promo.id
+    returning * into v_promo;
+
+    v_was_premium := coalesce(v_user.subscription_type, 'free') <> 'free';
+    v_was_active := v_was_premium and coalesce(v_user.is_active, true) and v_user.subscription_end > now();
+
+    update users
+       set subscription_type = coalesce(v_promo.subscription_type, 'premium'),
+           subscription_start = now(),
+           subscription_end = now() + make_interval(days => coalesce(v_promo.days, 30)),
+           is_active = true,
+           updated_at = now()
+     where id = v_user.id
+    returning * into v_user;
+
+    return json_build_object(
+        'status', 'ok',
+        'user', row_to_json(v_user),
+        'promo', row_to_json(v_promo),
+        'was_active', v_was_active,
+        'was_premium', v_was_premium
+    );
+end;
+$$;
+
+-- on_conflict=telegram_id в get_or_create_user требует уникального индекса.
+-- Имя совпадает с именем ограничения unique по умолчанию, поэтому при
+-- существующем ограничении команда ничего не делает.
+create unique index if not exists users_telegram_id_key on users (telegram_id);
+
+-- Состояние пользователя для обработки апдейта бота одним запросом: создает
+-- пользователя, если его еще нет, и возвращает запись вместе с признаком
+-- активной подписки, остатком бесплатных предсказаний (null - без ограничений)
+-- и датой окончания подписки в формате ДД.ММ.ГГГГ.
+create or replace function session_bootstrap(p_user jsonb, p_free_limit int)
+returns json
+language plpgsql
+as $$
+declare
+    v_user users;
+    v_created boolean;
+    v_active boolean;
+begin
+    insert into users (telegram_id, username, first_name, last_name, language_code,
+                       predictions_count, total_spent, subscription_type, is_active, created_at)
+    values ((p_user->>'telegram_id')::bigint,
+            coalesce(p_user->>'username', ''),
+            coalesce(p_user->>'first_name', ''),
+            coalesce(p_user->>'last_name', ''),
+            coalesce(p_user->>'language_code', 'ru'),
+            0, 0, 'free', true,
+            coalesce((p_user->>'created_at')::timestamptz, now()))
+    on conflict (telegram_id) do nothing
+    returning * into v_user;
+
+    v_created := found;
+    if not v_created then
+        select * into v_user from users where telegram_id = (p_user->>'telegram_id')::bigint;
+    end if;
+
+    v_active := coalesce(v_user.subscription_type, 'free') <> 'free'
+                and coalesce(v_user.is_active, true)
+                and coalesce(v_user.subscription_end > now(), false);
+
+    return json_build_object(
+        'user', row_to_json(v_user),
+        'created', v_created,
+        'has_subscription', v_active,
+        'remaining_predictions', case when v_active then null
+                                      else greatest(0, p_free_limit - coalesce(v_user.predictions_count, 0)) end,
+        'subscription_end', to_char(v_user.subscription_end at time zone 'UTC', 'DD.MM.YYYY')
+    );
+end;
+$$;
+-- История предсказаний: predictions?users.telegram_id=eq.<id> с users!inner()
+-- сортируется по (created_at desc, id desc) и листается курсором по этой паре,
+-- поэтому страница читается из индекса без сортировки и без offset.
+create index if not exists predictions_user_id_created_at_idx on predictions (user_id, created_at desc, id desc);
+
+-- updated_at промокодов ставит база: по нему индекс промокодов бота дочитывает
+-- созданные и измененные коды, и часы клиентов на отметку не влияют.
+alter table promo_codes alter column updated_at set default now();
+
+create or replace function promo_codes_touch()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists promo_codes_touch on promo_codes;
+create trigger promo_codes_touch
+before insert or update on promo_codes
+for each row execute function promo_codes_touch();
+
+create index if not exists promo_codes_updated_at_idx on promo_codes (updated_at);
\ No newline at end of file
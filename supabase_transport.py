@@ -0,0 +1,237 @@
+import contextvars
+import random
+import threading
+import logging
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from config import (
+    SUPABASE_POOL_CONNECTIONS, SUPABASE_POOL_MAXSIZE, SUPABASE_MAX_RETRIES,
+    SUPABASE_BACKOFF_FACTOR, SUPABASE_BACKOFF_JITTER, SUPABASE_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+# Статусы, при которых запрос повторяется
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# Повтор по таймауту чтения и 5xx только для идемпотентных методов:
+# повторный POST мог бы создать дубликат записи
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PATCH', 'DELETE'])
+
+# Сжатие ответов PostgREST
+ACCEPT_ENCODING = 'gzip, deflate'
+
+# Обработчик бота, от имени которого идут запросы к Supabase; задачи наследуют метку
+traffic_label = contextvars.ContextVar('traffic_label', default='other')
+
+
+class ConnectionStats:
+    """Счетчики переиспользования соединений пула"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.retries = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_new_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self) -> dict:
+        """Текущие значения счетчиков"""
+        with self._lock:
+            reused = max(0, self.requests - self.new_connections)
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': reused,
+                'hit_rate': reused / self.requests if self.requests else 0.0,
+                'retries': self.retries
+            }
+
+
+class TrafficStats:
+    """Объем обмена с Supabase по обработчикам бота.
+
+    sent - тело запроса, received - ответ в том виде, в каком пришел по сети
+    (после gzip), decoded - ответ после распаковки.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handlers = {}
+
+    def record(self, sent: int, received: int, decoded: int, label: str = None):
+        label = label or traffic_label.get()
+        with self._lock:
+            counters = self._handlers.setdefault(label, {'requests': 0, 'sent': 0, 'received': 0, 'decoded': 0})
+            counters['requests'] += 1
+            counters['sent'] += sent
+            counters['received'] += received
+            counters['decoded'] += decoded
+
+    def snapshot(self) -> dict:
+        """{обработчик: счетчики}, по убыванию принятых байт"""
+        with self._lock:
+            ordered = sorted(self._handlers.items(), key=lambda item: item[1]['received'], reverse=True)
+            return {label: dict(counters) for label, counters in ordered}
+
+
+def _counting_pool(base, stats: ConnectionStats):
+    """Класс пула urllib3, который считает выдачи соединений и новые подключения"""
+
+    class CountingPool(base):
+        def _get_conn(self, timeout=None):
+            stats.record_request()
+            return super()._get_conn(timeout)
+
+        def _new_conn(self):
+            stats.record_new_connection()
+            return super()._new_conn()
+
+    return CountingPool
+
+
+def _counting_retry(stats: ConnectionStats):
+    """Класс Retry, который считает выполненные повторы"""
+
+    class CountingRetry(Retry):
+        def increment(self, *args, **kwargs):
+            new_retry = super().increment(*args, **kwargs)
+            stats.record_retry()
+            return new_retry
+
+    return CountingRetry
+
+
+class _CountingAdapter(HTTPAdapter):
+    def __init__(self, stats: ConnectionStats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool(HTTPConnectionPool, self.stats),
+            'https': _counting_pool(HTTPSConnectionPool, self.stats)
+        }
+
+
+def backoff_delay(attempt: int, backoff_factor: float = SUPABASE_BACKOFF_FACTOR,
+                  jitter: float = SUPABASE_BACKOFF_JITTER) -> float:
+    """Экспоненциальная задержка перед повтором со случайным разбросом"""
+    return backoff_factor * (2 ** attempt) + random.uniform(0, jitter)
+
+
+class SupabaseTransport:
+    """Общий HTTP-транспорт к Supabase REST API.
+
+    Один requests.Session с ограниченным пулом keep-alive соединений на хост,
+    поэтому повторные запросы не проходят заново TCP+TLS рукопожатие.
+    Таймауты и ответы 5xx повторяются с экспоненциальной задержкой и разбросом.
+    """
+
+    def __init__(self, pool_connections: int = SUPABASE_POOL_CONNECTIONS,
+                 pool_maxsize: int = SUPABASE_POOL_MAXSIZE, max_retries: int = SUPABASE_MAX_RETRIES,
+                 backoff_factor: float = SUPABASE_BACKOFF_FACTOR, backoff_jitter: float = SUPABASE_BACKOFF_JITTER,
+                 timeout: float = SUPABASE_TIMEOUT):
+        self.timeout = timeout
+        self.stats = ConnectionStats()
+
+        retry = _counting_retry(self.stats)(
+            total=max_retries,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=IDEMPOTENT_METHODS,
+            backoff_factor=backoff_factor,
+            backoff_jitter=backoff_jitter,
+            raise_on_status=False,
+            respect_retry_after_header=True
+        )
+
+        # pool_block=True ограничивает число соединений на хост вместо открытия лишних
+        adapter = _CountingAdapter(
+            self.stats,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry,
+            pool_block=True
+        )
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> requests.Response:
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', url, **kwargs)
+
+    def get_stats(self) -> dict:
+        """Счетчики попаданий и промахов пула соединений"""
+        return self.stats.snapshot()
+
+    def close(self):
+        self.session.close()
+
+
+def create_trace_config(stats: ConnectionStats) -> aiohttp.TraceConfig:
+    """TraceConfig для aiohttp, который ведет те же счетчики, что и SupabaseTransport"""
+
+    async def on_request_start(session, context, params):
+        stats.record_request()
+
+    async def on_connection_create_end(session, context, params):
+        stats.record_new_connection()
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    return trace_config
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> SupabaseTransport:
+    """Возвращает общий для процесса транспорт"""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = SupabaseTransport()
+            logger.info("✅ Создан общий пул соединений Supabase")
+        return _transport
+
+
+def format_stats(stats: dict) -> str:
+    """Короткая строка со счетчиками пула для логов и отчетов"""
+    return (
+        f"запросов {stats['requests']}, новых соединений {stats['new_connections']}, "
+        f"переиспользовано {stats['reused_connections']} ({stats['hit_rate'] * 100:.0f}%), "
+        f"повторов {stats['retries']}"
+    )
\ No newline at end of file
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from async_database_manager import AsyncDatabaseManager
+from postgrest_stub import PostgrestStub
+from sqlite_database import SQLiteDatabase
+
+THREADS = 8
+PER_THREAD = 50
+TELEGRAM_ID = 555000111
+
+
+class FakeUser:
+    def __init__(self):
+        self.id = TELEGRAM_ID
+        self.username = "atomic_test"
+        self.first_name = "Atomic"
+        self.last_name = "Test"
+        self.language_code = "ru"
+
+
+def test_sqlite_counters():
+    print(f"1. SQLite: {THREADS} потоков x {PER_THREAD} предсказаний и платежей...")
+
+    path = os.path.join(tempfile.mkdtemp(), "atomic_test.db")
+    db = SQLiteDatabase(path)
+    db.create_user({'telegram_id': TELEGRAM_ID, 'first_name': 'Atomic', 'predictions_count': 0, 'total_spent': 0})
+
+    def worker(thread_number):
+        for i in range(PER_THREAD):
+            db.record_prediction(TELEGRAM_ID, {'prediction_type': 'personal', 'prediction_text': 'тест'})
+            db.record_payment(TELEGRAM_ID, {'amount': 1, 'payment_id': f'{thread_number}-{i}'})
+        db.close()
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(worker, range(THREADS)))
+
+    expected = THREADS * PER_THREAD
+    user = db.get_user(TELEGRAM_ID)
+    rows = db._connect().execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+
+    print(f"   predictions_count={user['predictions_count']}, "
+          f"total_spent={user['total_spent']}, строк predictions={rows}, ожидалось {expected}")
+    assert user['predictions_count'] == expected
+    assert user['total_spent'] == expected
+    assert rows == expected
+
+
+def test_rpc_counters():
+    asyncio.run(_rpc_counters())
+
+
+async def _rpc_counters():
+    total = THREADS * PER_THREAD
+    print(f"2. PostgREST RPC: {total} одновременных save_prediction через очередь...")
+
+    stub = PostgrestStub(latency=0.005).start()
+    db = AsyncDatabaseManager(base_url=stub.base_url)
+    # Журналы очереди - во временной папке, а не в корне репозитория
+    journal_dir = tempfile.mkdtemp()
+    db.prediction_queue.spill_path = os.path.join(journal_dir, "pending_predictions.jsonl")
+    db.prediction_queue.dead_letter_path = os.path.join(journal_dir, "failed_predictions.jsonl")
+
+    try:
+        await db.get_or_create_user(FakeUser())
+        results = await asyncio.gather(*(
+            db.save_prediction(TELEGRAM_ID, 'personal', 'Atomic', '', '01.01.2000', 'Козерог', ['Маг'], 'тест')
+            for _ in range(total)
+        ))
+        await db.prediction_queue.flush()
+
+        user = stub.tables['users'][0]
+        rows = len(stub.tables.get('predictions', []))
+        print(f"   predictions_count={user['predictions_count']}, "
+              f"строк predictions={rows}, запросов к API={stub.requests_count}")
+        assert all(results)
+        assert user['predictions_count'] == total
+        assert rows == total
+
+    finally:
+        await db.close()
+        stub.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+
+    print("🧪 ТЕСТ АТОМАРНЫХ СЧЕТЧИКОВ")
+    print("=" * 50)
+
+    try:
+        test_sqlite_counters()
+        test_rpc_counters()
+    except AssertionError:
+        print("❌ Обнаружены потерянные инкременты")
+        sys.exit(1)
+
+    print("🎉 Потерянных инкрементов нет!")
\ No newline at end of file
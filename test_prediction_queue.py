@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+
+from async_database_manager import AsyncDatabaseManager
+from storage_backends import SQLiteBackend
+
+TELEGRAM_ID = 555000222
+MAX_ATTEMPTS = 2
+
+
+def create_manager(directory: str, batch_size: int = 8) -> AsyncDatabaseManager:
+    """Менеджер на SQLite с журналами во временной папке; фоновая отправка не мешает тесту"""
+    backend = SQLiteBackend(os.path.join(directory, "queue_test.db"))
+    backend.db.create_user({'telegram_id': TELEGRAM_ID, 'first_name': 'Queue', 'predictions_count': 0})
+
+    db = AsyncDatabaseManager(backend=backend)
+    queue = db.prediction_queue
+    queue.spill_path = os.path.join(directory, "pending_predictions.jsonl")
+    queue.dead_letter_path = os.path.join(directory, "failed_predictions.jsonl")
+    queue.batch_size = batch_size
+    queue.flush_interval = 3600
+    queue.max_attempts = MAX_ATTEMPTS
+    return db
+
+
+def make_row(db: AsyncDatabaseManager, number: int, bad: bool = False) -> dict:
+    row = db._build_queued_prediction(TELEGRAM_ID, db._build_prediction_data(
+        None, 'personal', 'Queue', '', '01.01.2000', 'Козерог', ['Маг'], f'тест {number}'
+    ))
+    row['created_at'] = f"2026-01-01T00:00:{number:02d}.000000Z"
+    if bad:
+        # SQLite не может привязать словарь как параметр: база отвергает именно эту строку
+        row['cards_drawn'] = {'bad': number}
+    return row
+
+
+async def flush_until_done(db: AsyncDatabaseManager, rounds: int = 50):
+    for _ in range(rounds):
+        if await db.prediction_queue.flush():
+            return
+    raise AssertionError("Очередь не разобрана")
+
+
+def read_lines(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check_written(db: AsyncDatabaseManager, expected: int):
+    conn = db.backend.db._connect()
+    rows = conn.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+    count = db.backend.db.get_user(TELEGRAM_ID)['predictions_count']
+    print(f"   строк predictions={rows}, predictions_count={count}, ожидалось {expected}")
+    assert rows == expected
+    assert count == expected
+
+
+def test_single_bad_row():
+    asyncio.run(_single_bad_row())
+
+
+async def _single_bad_row():
+    print("1. Единственная строка, которую база не принимает...")
+    directory = tempfile.mkdtemp()
+    db = create_manager(directory)
+    queue = db.prediction_queue
+
+    try:
+        await db.start()
+        await queue.enqueue(make_row(db, 1, bad=True))
+        await flush_until_done(db)
+
+        check_written(db, 0)
+        assert queue.dead_rows == 1
+        assert not queue.failing
+        assert len(read_lines(queue.dead_letter_path)) == 1
+        assert read_lines(queue.spill_path) == []
+
+    finally:
+        await db.close()
+
+
+def test_bad_row_in_batch():
+    asyncio.run(_bad_row_in_batch())
+
+
+async def _bad_row_in_batch():
+    print("2. Строка с ошибкой в середине пакета...")
+    directory = tempfile.mkdtemp()
+    db = create_manager(directory)
+    queue = db.prediction_queue
+
+    try:
+        await db.start()
+        for number in range(20):
+            await queue.enqueue(make_row(db, number, bad=number == 5))
+        await flush_until_done(db)
+
+        check_written(db, 19)
+        dead = read_lines(queue.dead_letter_path)
+        assert [row['prediction_text'] for row in dead] == ['тест 5']
+        assert read_lines(queue.spill_path) == []
+
+    finally:
+        await db.close()
+
+
+def test_unreachable_database():
+    asyncio.run(_unreachable_database())
+
+
+async def _unreachable_database():
+    print("3. База недоступна: строки ждут, а не уходят в файл ошибок...")
+    directory = tempfile.mkdtemp()
+    db = create_manager(directory)
+    queue = db.prediction_queue
+
+    async def unavailable(*args, **kwargs):
+        return None
+
+    try:
+        await db.start()
+        await queue.enqueue(make_row(db, 1))
+
+        request = db.backend.request
+        db.backend.request = unavailable
+        for _ in range(MAX_ATTEMPTS * 3):
+            assert not await queue.flush()
+        assert queue.dead_rows == 0
+        assert queue.failing
+
+        db.backend.request = request
+        await flush_until_done(db)
+        check_written(db, 1)
+
+    finally:
+        await db.close()
+
+
+def test_journal_replay():
+    asyncio.run(_journal_replay())
+
+
+async def _journal_replay():
+    print("4. Строки из журнала прошлого запуска...")
+    directory = tempfile.mkdtemp()
+    db = create_manager(directory)
+    queue = db.prediction_queue
+
+    with open(queue.spill_path, 'w', encoding='utf-8') as f:
+        for number in range(3):
+            f.write(json.dumps(make_row(db, number), ensure_ascii=False) + '\n')
+
+    try:
+        await db.start()
+        await flush_until_done(db)
+
+        check_written(db, 3)
+        assert read_lines(queue.spill_path) == []
+
+    finally:
+        await db.close()
+
+
+def test_flush_on_close():
+    asyncio.run(_flush_on_close())
+
+
+async def _flush_on_close():
+    print("5. Остаток буфера при остановке...")
+    directory = tempfile.mkdtemp()
+    db = create_manager(directory, batch_size=100)
+    queue = db.prediction_queue
+
+    await db.start()
+    for number in range(5):
+        await queue.enqueue(make_row(db, number))
+    assert len(read_lines(queue.spill_path)) == 5
+
+    await db.close()
+
+    check_written(db, 5)
+    assert read_lines(queue.spill_path) == []
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.CRITICAL)
+
+    print("🧪 ТЕСТ ОЧЕРЕДИ ЗАПИСИ ПРЕДСКАЗАНИЙ")
+    print("=" * 50)
+
+    try:
+        test_single_bad_row()
+        test_bad_row_in_batch()
+        test_unreachable_database()
+        test_journal_replay()
+        test_flush_on_close()
+    except AssertionError:
+        print("❌ Очередь потеряла или задержала предсказания")
+        sys.exit(1)
+
+    print("🎉 Очередь предсказаний работает!")
\ No newline at end of file
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import sys
+from datetime import datetime, timedelta
+
+from async_database_manager import AsyncDatabaseManager
+from postgrest_stub import PostgrestStub
+from promo_index import PromoCodeIndex
+
+TELEGRAM_ID = 555000333
+REFRESH_INTERVAL = 60
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def stamp(seconds_ago: float = 0) -> str:
+    return (datetime.utcnow() - timedelta(seconds=seconds_ago)).isoformat() + 'Z'
+
+
+def add_promo(stub: PostgrestStub, code: str, updated_at: str = None, **fields) -> dict:
+    """Строка промокода прямо в таблице заглушки, с updated_at, какой поставила бы база"""
+    promo = stub.insert('promo_codes', {
+        'code': code, 'days': 30, 'max_uses': 1, 'used_count': 0, 'is_active': True, **fields
+    })
+    if updated_at:
+        promo['updated_at'] = updated_at
+    return promo
+
+
+class Fixture:
+    """Заглушка PostgREST, менеджер с подсчетом вызовов redeem_promo_code и индекс на поддельных часах"""
+
+    def __init__(self, **index_options):
+        self.stub = PostgrestStub(latency=0).start()
+        self.stub.insert('users', {'telegram_id': TELEGRAM_ID, 'first_name': 'Promo', 'subscription_type': 'free'})
+        self.db = AsyncDatabaseManager(base_url=self.stub.base_url)
+        self.clock = FakeClock()
+        self.index = PromoCodeIndex(self.db, refresh_interval=REFRESH_INTERVAL, clock=self.clock, **index_options)
+
+        self.redeem_calls = 0
+        redeem = self.db.redeem_promo_code
+
+        async def counted(*args, **kwargs):
+            self.redeem_calls += 1
+            return await redeem(*args, **kwargs)
+
+        self.db.redeem_promo_code = counted
+
+    async def close(self):
+        await self.db.close()
+        self.stub.stop()
+
+
+def test_unknown_code():
+    asyncio.run(_unknown_code())
+
+
+async def _unknown_code():
+    print("1. Неизвестный код отклоняется без запроса к базе...")
+    fixture = Fixture()
+    try:
+        add_promo(fixture.stub, 'KNOWN1', stamp())
+        await fixture.index.refresh()
+
+        status = await fixture.index.redeem(TELEGRAM_ID, 'missing1')
+        print(f"   статус={status}, вызовов redeem_promo_code={fixture.redeem_calls}")
+        assert status == 'unknown'
+        assert fixture.redeem_calls == 0
+
+        assert await fixture.index.redeem(TELEGRAM_ID, 'known1') == 'ok'
+        assert fixture.redeem_calls == 1
+
+    finally:
+        await fixture.close()
+
+
+def test_deactivated_by_refresh():
+    asyncio.run(_deactivated_by_refresh())
+
+
+async def _deactivated_by_refresh():
+    print("2. Код, выключенный в базе, уходит из индекса при обновлении...")
+    fixture = Fixture()
+    try:
+        promo = add_promo(fixture.stub, 'OFF1', stamp())
+        await fixture.index.refresh()
+        assert fixture.index.is_known('OFF1')
+
+        # Изменение в обход бота: событий нет, узнать о нем можно только из refresh
+        promo.update(is_active=False, updated_at=stamp())
+        await fixture.index.refresh()
+
+        print(f"   is_known={fixture.index.is_known('OFF1')}, размер индекса={fixture.index.get_stats()['size']}")
+        assert not fixture.index.is_known('OFF1')
+
+    finally:
+        await fixture.close()
+
+
+def test_late_commit_window():
+    asyncio.run(_late_commit_window())
+
+
+async def _late_commit_window():
+    print("3. Строка, закоммиченная позже водяного знака, попадает в окно дочитывания...")
+    fixture = Fixture()
+    try:
+        add_promo(fixture.stub, 'FIRST1', stamp())
+        await fixture.index.refresh()
+
+        # updated_at ставится в начале транзакции: строка видна позже, чем ее отметка
+        add_promo(fixture.stub, 'LATE1', stamp(REFRESH_INTERVAL / 2))
+        add_promo(fixture.stub, 'ANCIENT1', stamp(REFRESH_INTERVAL * 10))
+        await fixture.index.refresh()
+
+        late, ancient = fixture.index.is_known('LATE1'), fixture.index.is_known('ANCIENT1')
+        print(f"   LATE1={late}, ANCIENT1 за окном={ancient}, водяной знак={fixture.index.watermark}")
+        assert late
+        assert not ancient
+
+    finally:
+        await fixture.close()
+
+
+def test_rate_limit():
+    asyncio.run(_rate_limit())
+
+
+async def _rate_limit():
+    print("4. Лимит попыток ввода кода одним пользователем...")
+    fixture = Fixture(attempts_limit=3, attempts_window=60)
+    try:
+        await fixture.index.refresh()
+
+        statuses = [await fixture.index.redeem(TELEGRAM_ID, f'guess{i}') for i in range(4)]
+        print(f"   статусы={statuses}")
+        assert statuses == ['unknown', 'unknown', 'unknown', 'rate_limited']
+
+        fixture.clock.now += 61
+        assert await fixture.index.redeem(TELEGRAM_ID, 'guess5') == 'unknown'
+        assert fixture.redeem_calls == 0
+
+    finally:
+        await fixture.close()
+
+
+def test_negative_cache():
+    asyncio.run(_negative_cache())
+
+
+async def _negative_cache():
+    print("5. Код, отвергнутый базой, запоминается на negative_ttl секунд...")
+    fixture = Fixture(negative_ttl=30, attempts_limit=100)
+    try:
+        # Индекс не загружен: все коды проверяет база
+        add_promo(fixture.stub, 'USED1', stamp(), used_count=1)
+
+        first = await fixture.index.redeem(TELEGRAM_ID, 'USED1')
+        second = await fixture.index.redeem(TELEGRAM_ID, 'USED1')
+        calls_within_ttl = fixture.redeem_calls
+
+        fixture.clock.now += 31
+        third = await fixture.index.redeem(TELEGRAM_ID, 'USED1')
+
+        print(f"   статусы={[first, second, third]}, вызовов redeem_promo_code={fixture.redeem_calls}")
+        assert [first, second, third] == ['exhausted', 'unknown', 'exhausted']
+        assert calls_within_ttl == 1
+        assert fixture.redeem_calls == 2
+
+    finally:
+        await fixture.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.CRITICAL)
+
+    print("🧪 ТЕСТ ИНДЕКСА ПРОМОКОДОВ")
+    print("=" * 50)
+
+    try:
+        test_unknown_code()
+        test_deactivated_by_refresh()
+        test_late_commit_window()
+        test_rate_limit()
+        test_negative_cache()
+    except AssertionError:
+        print("❌ Индекс промокодов пропускает или теряет коды")
+        sys.exit(1)
+
+    print("🎉 Индекс промокодов работает!")
\ No newline at end of file
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from async_database_manager import AsyncDatabaseManager
+from sqlite_database import SQLiteDatabase
+from storage_backends import SQLiteBackend
+
+THREADS = 16
+USERS = 200
+ATTEMPTS_PER_USER = 3
+MAX_USES = 50
+CODE = "STRESS50"
+
+
+def create_fixture(db: SQLiteDatabase):
+    with db._transaction() as conn:
+        conn.executemany(
+            "INSERT INTO users (telegram_id, first_name, subscription_type) VALUES (?, ?, 'free')",
+            ((700000 + i, f"User{i}") for i in range(USERS))
+        )
+        conn.execute(
+            "INSERT INTO promo_codes (code, days, max_uses, used_count, is_active) VALUES (?, 30, ?, 0, 1)",
+            (CODE, MAX_USES)
+        )
+
+
+def check_invariants(db: SQLiteDatabase, successes: int):
+    conn = db._connect()
+    promo = conn.execute("SELECT * FROM promo_codes WHERE code = ?", (CODE,)).fetchone()
+    redemptions = conn.execute("SELECT COUNT(*), COUNT(DISTINCT user_id) FROM promo_redemptions").fetchone()
+    premium = conn.execute("SELECT COUNT(*) FROM users WHERE subscription_type = 'premium'").fetchone()[0]
+
+    print(f"   успешных активаций={successes}, used_count={promo['used_count']}, "
+          f"is_active={bool(promo['is_active'])}, записей активаций={redemptions[0]} "
+          f"(пользователей {redemptions[1]}), premium={premium}, лимит {MAX_USES}")
+    assert successes == MAX_USES
+    assert promo['used_count'] == MAX_USES
+    assert not promo['is_active']
+    assert redemptions[0] == redemptions[1] == MAX_USES
+    assert premium == MAX_USES
+
+
+def test_sqlite_threads():
+    total = USERS * ATTEMPTS_PER_USER
+    print(f"1. SQLite: {THREADS} потоков, {total} активаций кода на {MAX_USES} использований...")
+
+    path = os.path.join(tempfile.mkdtemp(), "promo_test.db")
+    db = SQLiteDatabase(path)
+    create_fixture(db)
+
+    def worker(thread_number):
+        statuses = []
+        for attempt in range(thread_number, total, THREADS):
+            statuses.append(db.redeem_promo(CODE, 700000 + attempt % USERS)['status'])
+        db.close()
+        return statuses
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        statuses = [status for chunk in pool.map(worker, range(THREADS)) for status in chunk]
+
+    print(f"   статусы: {', '.join(f'{s}={statuses.count(s)}' for s in sorted(set(statuses)))}")
+    check_invariants(db, statuses.count('ok'))
+
+
+def test_manager_concurrent():
+    asyncio.run(_manager_concurrent())
+
+
+async def _manager_concurrent():
+    total = USERS * ATTEMPTS_PER_USER
+    print(f"2. AsyncDatabaseManager + SQLiteBackend: {total} одновременных use_promo_code...")
+
+    path = os.path.join(tempfile.mkdtemp(), "promo_test.db")
+    backend = SQLiteBackend(path)
+    create_fixture(backend.db)
+
+    db = AsyncDatabaseManager(backend=backend)
+    events = []
+    db.add_listener(lambda event, **data: events.append(event))
+
+    try:
+        results = await asyncio.gather(*(
+            db.use_promo_code(CODE.lower(), 700000 + attempt % USERS) for attempt in range(total)
+        ))
+        check_invariants(backend.db, sum(results))
+        print(f"   событий promo_used={events.count('promo_used')}")
+        assert events.count('promo_used') == MAX_USES
+
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.CRITICAL)
+
+    print("🧪 СТРЕСС-ТЕСТ АКТИВАЦИИ ПРОМОКОДОВ")
+    print("=" * 50)
+
+    try:
+        test_sqlite_threads()
+        test_manager_concurrent()
+    except AssertionError:
+        print("❌ Промокод активирован сверх лимита")
+        sys.exit(1)
+
+    print("🎉 Лимит промокода не превышен!")
\ No newline at end of file
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+
+from async_database_manager import AsyncDatabaseManager
+from database_manager import PROMO_BATCH_HEADERS
+from storage_backends import SQLiteBackend
+
+OWNER_ID = 555000444
+OTHER_ID = 555000555
+PREDICTIONS = 12
+PAGE_SIZE = 5
+
+
+def create_manager() -> AsyncDatabaseManager:
+    """Менеджер на SQLite: два пользователя, у владельца предсказания с повторяющимся created_at"""
+    backend = SQLiteBackend(os.path.join(tempfile.mkdtemp(), "filters_test.db"))
+    db = backend.db
+    owner = db.create_user({'telegram_id': OWNER_ID, 'first_name': 'Owner'})
+    other = db.create_user({'telegram_id': OTHER_ID, 'first_name': 'Other'})
+
+    with db._transaction() as conn:
+        for number in range(PREDICTIONS):
+            # По три предсказания на секунду: порядок внутри секунды задает только id
+            conn.execute(
+                "INSERT INTO predictions (user_id, user_name, cards_drawn, created_at) VALUES (?, ?, '[]', ?)",
+                (owner['id'], 'Owner', f"2026-01-01T00:00:{number // 3:02d}.000000Z")
+            )
+            conn.execute(
+                "INSERT INTO predictions (user_id, user_name, cards_drawn, created_at) VALUES (?, ?, '[]', ?)",
+                (other['id'], 'Other', f"2026-01-01T00:00:{number // 3:02d}.000000Z")
+            )
+
+    return AsyncDatabaseManager(backend=backend)
+
+
+def test_embedded_filter():
+    print("1. Фильтр связанной таблицы users.telegram_id при users!inner()...")
+    db = create_manager()
+    params = db._build_history_params(OWNER_ID, PREDICTIONS)
+
+    rows = db.backend.db.select('predictions', params)
+    names = {row['user_name'] for row in rows}
+    print(f"   строк={len(rows)}, колонки={sorted(rows[0])}")
+    assert len(rows) == PREDICTIONS
+    assert names == {'Owner'}
+    # users!inner() только фильтрует и колонок не добавляет
+    assert 'users' not in rows[0]
+
+    assert db.backend.db.select('predictions', {**params, 'users.telegram_id': 'eq.1'}) == []
+
+
+def test_keyset_paging():
+    print("2. Курсор or=(created_at.lt.\"...\",id.lt...) при одинаковом created_at...")
+    db = create_manager()
+    sqlite = db.backend.db
+
+    everything = sqlite.select('predictions', db._build_history_params(OWNER_ID, PREDICTIONS))
+    expected = [row['id'] for row in sorted(everything, key=lambda row: (row['created_at'], row['id']), reverse=True)]
+    assert [row['id'] for row in everything] == expected
+
+    # К старым записям страница за страницей
+    seen, cursor = [], None
+    while True:
+        rows = sqlite.select('predictions', db._build_history_params(OWNER_ID, PAGE_SIZE, before=cursor))
+        page = db._parse_history_page(rows, PAGE_SIZE, before=cursor)
+        seen.extend(prediction['id'] for prediction in page['predictions'])
+        if not page['older']:
+            break
+        cursor = page['older']
+
+    # И обратно к новым от последней страницы
+    back, cursor = [], (everything[-1]['created_at'], everything[-1]['id'])
+    while cursor:
+        rows = sqlite.select('predictions', db._build_history_params(OWNER_ID, PAGE_SIZE, after=cursor))
+        page = db._parse_history_page(rows, PAGE_SIZE, after=cursor)
+        back = [prediction['id'] for prediction in page['predictions']] + back
+        cursor = page['newer']
+
+    print(f"   к старым={seen}, к новым={back}")
+    assert seen == expected
+    assert back == expected[:-1]
+
+
+def test_ignore_duplicates():
+    asyncio.run(_ignore_duplicates())
+
+
+async def _ignore_duplicates():
+    print("3. on_conflict с Prefer: resolution=ignore-duplicates...")
+    db = create_manager()
+    backend = db.backend
+    params = db._build_promo_batch_params()
+
+    first = await backend.request('promo_codes', 'POST', [{'code': 'DUP1'}, {'code': 'DUP2'}], params, PROMO_BATCH_HEADERS)
+    second = await backend.request(
+        'promo_codes', 'POST', [{'code': 'DUP2', 'days': 99}, {'code': 'DUP3'}], params, PROMO_BATCH_HEADERS
+    )
+    print(f"   первая вставка={first}, вторая={second}")
+    assert first == [{'code': 'DUP1'}, {'code': 'DUP2'}]
+    # Конфликтующая строка пропущена, не изменена и в ответ не попала
+    assert second == [{'code': 'DUP3'}]
+    assert backend.db.select('promo_codes', {'code': 'eq.DUP2'})[0]['days'] == 30
+
+    # Без ignore-duplicates конфликт - ошибка запроса, как в PostgREST
+    assert await backend.request('promo_codes', 'POST', [{'code': 'DUP1'}], params) is None
+    # return=minimal - успех без тела ответа
+    assert await backend.request('promo_codes', 'POST', {'code': 'DUP4'}, headers={'Prefer': 'return=minimal'}) is True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.CRITICAL)
+
+    print("🧪 ТЕСТ ФИЛЬТРОВ POSTGREST В SQLITE")
+    print("=" * 50)
+
+    try:
+        test_embedded_filter()
+        test_keyset_paging()
+        test_ignore_duplicates()
+    except AssertionError:
+        print("❌ Запросы PostgREST переводятся в SQL неверно")
+        sys.exit(1)
+
+    print("🎉 Фильтры PostgREST работают в SQLite!")
\ No newline at end of file
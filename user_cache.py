@@ -0,0 +1,181 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from config import USER_CACHE_TTL, USER_CACHE_MAX_SIZE, USER_CACHE_MAX_BYTES
+
+
+class UserRecord:
+    """Компактная запись пользователя в кэше.
+
+    Хранит только колонки таблицы users в __slots__ вместо полного JSON-словаря
+    PostgREST, поэтому на каждую запись не тратится память под хэш-таблицу.
+    """
+
+    FIELDS = (
+        'id', 'telegram_id', 'username', 'first_name', 'last_name', 'language_code',
+        'predictions_count', 'total_spent', 'subscription_type', 'subscription_start',
+        'subscription_end', 'is_active', 'created_at', 'updated_at'
+    )
+
+    __slots__ = FIELDS + ('stored_at', 'size')
+
+    def __init__(self, row: dict, stored_at: float):
+        for field in self.FIELDS:
+            setattr(self, field, row.get(field))
+        self.stored_at = stored_at
+        self.size = self._estimate_size()
+
+    def update(self, fields: dict):
+        for field, value in fields.items():
+            if field in self.FIELDS:
+                setattr(self, field, value)
+        self.size = self._estimate_size()
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def _estimate_size(self) -> int:
+        """Примерный объем записи в байтах вместе со значениями колонок"""
+        return sys.getsizeof(self) + sum(sys.getsizeof(getattr(self, field)) for field in self.FIELDS)
+
+
+class UserCache:
+    """Кэш записей таблицы users по telegram_id с TTL и вытеснением по LRU.
+
+    Размер ограничен и числом записей, и примерным объемом памяти. Успешные PATCH
+    сразу пишутся в кэш (write-through), а TTL ограничивает, насколько устаревшими
+    могут быть данные, измененные вне этого процесса: скриптами fix_subscriptions.py,
+    debug_subscription.py или другим инстансом бота.
+    """
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_size: int = USER_CACHE_MAX_SIZE,
+                 max_bytes: int = USER_CACHE_MAX_BYTES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self._clock = clock
+
+        # telegram_id -> UserRecord, от самой давно использованной к самой свежей
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes_used = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.write_throughs = 0
+        self._served_age_total = 0.0
+        self.max_served_age = 0.0
+
+    def get(self, telegram_id):
+        """Запись пользователя или None, если ее нет или истек TTL"""
+        key = int(telegram_id)
+
+        with self._lock:
+            record = self._entries.get(key)
+            if record is None:
+                self.misses += 1
+                return None
+
+            age = self._clock() - record.stored_at
+            if age > self.ttl:
+                self._remove(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._served_age_total += age
+            self.max_served_age = max(self.max_served_age, age)
+
+            # Новый словарь, чтобы вызывающий код не менял кэш в обход write-through
+            return record.to_dict()
+
+    def put(self, user: dict, write_through: bool = False):
+        """Сохраняет свежую запись пользователя, полученную из базы"""
+        if not user or user.get('telegram_id') is None:
+            return
+
+        key = int(user['telegram_id'])
+        record = UserRecord(user, self._clock())
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = record
+            self.bytes_used += record.size
+            if write_through:
+                self.write_throughs += 1
+
+            self._evict()
+
+    def update(self, telegram_id, fields: dict):
+        """Применяет к закэшированной записи поля, успешно записанные в базу"""
+        key = int(telegram_id)
+
+        with self._lock:
+            record = self._entries.get(key)
+            if record is None:
+                return
+
+            self.bytes_used -= record.size
+            record.update(fields)
+            self.bytes_used += record.size
+            self.write_throughs += 1
+
+            self._evict()
+
+    def increment(self, telegram_id, field: str, delta=1):
+        """Увеличивает числовое поле закэшированной записи, если она есть"""
+        with self._lock:
+            record = self._entries.get(int(telegram_id))
+            if record is not None:
+                setattr(record, field, (getattr(record, field) or 0) + delta)
+
+    def invalidate(self, telegram_id):
+        """Удаляет запись пользователя из кэша"""
+        with self._lock:
+            self._remove(int(telegram_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes_used = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key: int):
+        record = self._entries.pop(key, None)
+        if record is not None:
+            self.bytes_used -= record.size
+
+    def _evict(self):
+        """Вытесняет самые давно использованные записи сверх лимитов"""
+        while self._entries and (len(self._entries) > self.max_size or self.bytes_used > self.max_bytes):
+            _, record = self._entries.popitem(last=False)
+            self.bytes_used -= record.size
+            self.evictions += 1
+
+    def get_stats(self) -> dict:
+        """Счетчики попаданий, вытеснений и устаревания отданных из кэша записей"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'bytes_used': self.bytes_used,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'write_throughs': self.write_throughs,
+                'avg_staleness': self._served_age_total / self.hits if self.hits else 0.0,
+                'max_staleness': self.max_served_age
+            }
\ No newline at end of file